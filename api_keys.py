@@ -0,0 +1,258 @@
+# api_keys.py
+import asyncio
+import hashlib
+import hmac
+import logging
+import math
+import sys
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from config.config import settings, ApiKeyConfig
+from metrics import API_KEY_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+
+def hash_api_key(key: str) -> str:
+    """Empreinte SHA-256 (hex) d'une clé : seule forme sous laquelle les clés sont configurées et gardées."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class TokenBucket:
+    """Seau à jetons : burst requêtes d'affilée au plus, rechargé de rate jetons par seconde."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """Prend un jeton : 0 si accordé, sinon secondes d'attente avant le prochain jeton."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def headers(self) -> Dict[str, str]:
+        # En-têtes RateLimit-* (draft IETF httpapi-ratelimit-headers) : Reset = secondes avant le seau plein
+        return {
+            "RateLimit-Limit": str(self.burst),
+            "RateLimit-Remaining": str(int(self.tokens)),
+            "RateLimit-Reset": str(math.ceil((self.burst - self.tokens) / self.rate)),
+            "RateLimit-Policy": f"{self.burst};w={math.ceil(self.burst / self.rate)}",
+        }
+
+
+class ApiClient:
+    """Client identifié par sa clé : seau de requêtes, requêtes en cours et appels SpiderFoot simultanés."""
+
+    __slots__ = ("name", "digest", "bucket", "max_concurrent", "in_flight", "max_upstream", "profile", "_upstream")
+
+    def __init__(
+        self, name: str, digest: str, rate: float, burst: int, max_concurrent: int, max_upstream: int, profile: bool = False
+    ):
+        self.name = name
+        self.digest = digest
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.max_upstream = max_upstream
+        # Clé autorisée à demander un profil CPU (X-Profile) et à lire les profils (/debug/profiles)
+        self.profile = profile
+        self._upstream: Optional[asyncio.Semaphore] = None
+
+    @property
+    def upstream(self) -> Optional[asyncio.Semaphore]:
+        # Créé à la première utilisation, dans la boucle asyncio du serveur
+        if self._upstream is None and self.max_upstream > 0:
+            self._upstream = asyncio.Semaphore(self.max_upstream)
+        return self._upstream
+
+    def release(self):
+        self.in_flight -= 1
+
+
+# Client de la requête en cours, pour limiter ses appels à SpiderFoot (voir upstream_slot)
+current_client: ContextVar[Optional[ApiClient]] = ContextVar("current_client", default=None)
+
+
+class Keyring:
+    """
+    Clés API acceptées, chargées une fois au démarrage, gardées sous forme d'empreinte SHA-256.
+    La clé reçue est hachée puis cherchée par son empreinte : la durée de la recherche ne dépend
+    pas des caractères de la clé, et l'empreinte trouvée est confirmée par hmac.compare_digest.
+    """
+
+    def __init__(self, clients: List[ApiClient]):
+        self._clients: Dict[str, ApiClient] = {client.digest: client for client in clients}
+
+    @classmethod
+    def from_settings(cls, s) -> "Keyring":
+        configs: List[ApiKeyConfig] = list(s.api_keys)
+        if s.spiderfoot_api_key:
+            # Clé unique historique (SPIDERFOOT_API_KEY) : sans limite, comme avant l'arrivée des clés
+            # multiples, sauf pour les limites API_KEY_* définies explicitement (variable d'environnement)
+            explicit = s.model_fields_set
+            configs.append(ApiKeyConfig(
+                name="default",
+                key_sha256=hash_api_key(s.spiderfoot_api_key),
+                rate=s.api_key_rate if "api_key_rate" in explicit else 0,
+                max_concurrent=s.api_key_max_concurrent if "api_key_max_concurrent" in explicit else 0,
+                max_upstream=s.api_key_max_upstream if "api_key_max_upstream" in explicit else 0,
+            ))
+        clients = [
+            ApiClient(
+                config.name,
+                config.key_sha256.lower(),
+                rate=config.rate if config.rate is not None else s.api_key_rate,
+                burst=config.burst if config.burst is not None else s.api_key_burst,
+                max_concurrent=config.max_concurrent if config.max_concurrent is not None else s.api_key_max_concurrent,
+                max_upstream=config.max_upstream if config.max_upstream is not None else s.api_key_max_upstream,
+                profile=config.profile,
+            )
+            for config in configs
+        ]
+        if not clients:
+            logger.warning("no API key configured (SPIDERFOOT_API_KEY / API_KEYS): every request will be rejected")
+        return cls(clients)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def lookup(self, key: str) -> Optional[ApiClient]:
+        digest = hash_api_key(key)
+        client = self._clients.get(digest)
+        if client is None or not hmac.compare_digest(client.digest, digest):
+            return None
+        return client
+
+    def admit(self, client: ApiClient, state) -> Dict[str, str]:
+        """
+        Applique les limites de la clé à une requête et renvoie ses en-têtes RateLimit-*.
+        Lève HTTPException 429 si le seau est vide ou si la clé a trop de requêtes en cours.
+        En cas de succès, le créneau est noté dans state et libéré par RateLimitMiddleware.
+        """
+        headers: Dict[str, str] = {}
+        if client.bucket is not None:
+            wait = client.bucket.take(time.monotonic())
+            headers = client.bucket.headers()
+            if wait:
+                API_KEY_REJECTIONS.inc((client.name, "rate"))
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Limite de requêtes atteinte pour la clé {client.name}",
+                    headers={**headers, "Retry-After": str(math.ceil(wait))},
+                )
+        if client.max_concurrent and client.in_flight >= client.max_concurrent:
+            API_KEY_REJECTIONS.inc((client.name, "concurrency"))
+            raise HTTPException(
+                status_code=429,
+                detail=f"Trop de requêtes simultanées pour la clé {client.name} (maximum {client.max_concurrent})",
+                headers={**headers, "Retry-After": "1"},
+            )
+        client.in_flight += 1
+        state.api_client = client
+        state.rate_limit = headers
+        current_client.set(client)
+        return headers
+
+
+@asynccontextmanager
+async def upstream_slot():
+    """Créneau d'appel SpiderFoot du client de la requête en cours (sans limite hors requête, ex : tâches de fond)."""
+    client = current_client.get()
+    semaphore = client.upstream if client is not None else None
+    if semaphore is None:
+        yield
+        return
+    async with semaphore:
+        yield
+
+
+async def hold_upstream_slot() -> Callable[[], None]:
+    """
+    Comme upstream_slot, pour une réponse SpiderFoot lue en flux : le créneau est pris ici et
+    gardé jusqu'à l'appel de la fonction renvoyée (à la fermeture du flux ; appels suivants sans effet).
+    """
+    client = current_client.get()
+    semaphore = client.upstream if client is not None else None
+    if semaphore is None:
+        return lambda: None
+    await semaphore.acquire()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            semaphore.release()
+
+    return release
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI : ajoute les en-têtes RateLimit-* notés par Keyring.admit à la réponse
+    (y compris aux Response renvoyées directement par les endpoints) et libère le créneau
+    de concurrence de la clé une fois le dernier morceau de la réponse envoyé (ou le client
+    déconnecté) : un export en flux occupe son créneau jusqu'au bout. Seul le flux SSE
+    (text/event-stream) le libère dès ses en-têtes : un client qui suit un scan pendant des
+    heures n'occupe pas un créneau.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+
+        def release():
+            client = state.pop("api_client", None)
+            if client is not None:
+                client.release()
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = state.get("rate_limit")
+                if headers and message["status"] != 429:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()
+                    ]
+                content_type = next(
+                    (value for name, value in message.get("headers", []) if name.lower() == b"content-type"), b""
+                )
+                if content_type.startswith(b"text/event-stream"):
+                    release()
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Dernier morceau : les tâches de fond de la réponse ne gardent pas le créneau
+                release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            release()
+
+
+# Instance globale partagée par les endpoints
+keyring = Keyring.from_settings(settings)
+
+
+if __name__ == "__main__":
+    # Empreinte à mettre dans API_KEYS : python api_keys.py <clé>
+    for argument in sys.argv[1:]:
+        print(hash_api_key(argument))
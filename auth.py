@@ -2,6 +2,7 @@
 import secrets
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from tracing import Span
 from config.config import settings  # Importez vos paramètres comme dans votre code existant
 
 # Initialiser le schéma HTTP Basic
@@ -12,6 +13,11 @@ def authenticate_basic_auth(credentials: HTTPBasicCredentials = Depends(security
     Vérifie les identifiants HTTP Basic Auth de manière sécurisée contre les attaques temporelles.
     Les noms d'utilisateur et mots de passe sont chargés depuis les variables d'environnement.
     """
+    with Span("basic_auth"):
+        return _check_credentials(credentials)
+
+
+def _check_credentials(credentials: HTTPBasicCredentials) -> str:
     # Récupération des identifiants depuis vos settings (qui lisent le .env)
     correct_username = settings.v_username
     correct_password = settings.v_password
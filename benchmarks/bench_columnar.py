@@ -0,0 +1,103 @@
+# benchmarks/bench_columnar.py
+"""
+Benchmark des formats d'export pour l'analyse : taille du fichier, temps de conversion depuis
+l'export JSON et temps de chargement côté analyste (json, csv, parquet, arrow) pour compter
+les événements par type. Chaque fichier converti est relu et comparé à l'export JSON
+(nombre d'événements par type) : une différence arrête le benchmark.
+
+    python benchmarks/bench_columnar.py [--sizes 10000,100000,1000000] [--repeat 3] [--chunk-rows 65536]
+
+Parquet et Arrow ne sont mesurés que si le module pyarrow est installé. Un petit --chunk-rows
+vérifie l'aller-retour sur plusieurs blocs (dictionnaires complétés d'un bloc à l'autre).
+"""
+import argparse
+import collections
+import csv
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_serialization import make_export  # noqa: E402
+from columnar_export import ColumnarExport, available_formats, pyarrow  # noqa: E402
+from serialization import dumps  # noqa: E402
+
+SCANS = [("BENCH", "bench", "example.com")]
+
+
+def best(fn, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def convert(json_path: str, fmt: str, path: str, chunk_rows: int):
+    builder = ColumnarExport(fmt, path, SCANS, chunk_rows)
+    with open(json_path, "rb") as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                break
+            builder.feed(chunk)
+    builder.close()
+
+
+def load_json(path: str) -> dict:
+    with open(path, "rb") as f:
+        return collections.Counter(event["event_type"] for event in json.load(f))
+
+
+def load_csv(path: str) -> dict:
+    with open(path, newline="", encoding="utf-8") as f:
+        return collections.Counter(row["event_type"] for row in csv.DictReader(f))
+
+
+def count_types(table) -> dict:
+    # Dictionnaires différents d'un bloc à l'autre : décodés en chaînes avant de compter
+    counts = pyarrow.compute.value_counts(table.column("event_type").cast(pyarrow.string()))
+    return collections.Counter({item["values"]: item["counts"] for item in counts.to_pylist()})
+
+
+def load_parquet(path: str) -> dict:
+    # Une seule colonne lue : les autres ne sont ni décompressées ni décodées
+    return count_types(pyarrow.parquet.read_table(path, columns=["event_type"]))
+
+
+def load_arrow(path: str) -> dict:
+    # Memory map : les colonnes sont lues dans le cache de pages, sans copie
+    with pyarrow.memory_map(path) as source:
+        return count_types(pyarrow.ipc.open_stream(source).read_all())
+
+
+LOADERS = {"json": load_json, "csv": load_csv, "parquet": load_parquet, "arrow": load_arrow}
+
+
+def run(sizes, repeat: int, chunk_rows: int):
+    formats = available_formats()
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            json_path = os.path.join(directory, f"export_{size}.json")
+            with open(json_path, "wb") as f:
+                f.write(dumps(make_export(size)))
+
+            print(f"\n{size} événements")
+            print(f"  {'format':<10} {'octets':>12} {'conversion ms':>14} {'chargement ms':>14}")
+            print(f"  {'json':<10} {os.path.getsize(json_path):12d} {'-':>14} {best(lambda: load_json(json_path), repeat) * 1e3:14.1f}")
+            expected = load_json(json_path)
+            for fmt in formats:
+                path = os.path.join(directory, f"export_{size}.{fmt}")
+                converted = best(lambda: convert(json_path, fmt, path, chunk_rows), repeat)
+                if LOADERS[fmt](path) != expected:
+                    sys.exit(f"{fmt}: le fichier relu ne correspond pas à l'export JSON ({size} événements)")
+                loaded = best(lambda: LOADERS[fmt](path), repeat)
+                print(f"  {fmt:<10} {os.path.getsize(path):12d} {converted * 1e3:14.1f} {loaded * 1e3:14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="nombres d'événements par export, séparés par des virgules")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-rows", type=int, default=65536, help="lignes par bloc (row group, record batch)")
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(",")], args.repeat, args.chunk_rows)
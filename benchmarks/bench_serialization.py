@@ -0,0 +1,104 @@
+# benchmarks/bench_serialization.py
+"""
+Benchmark de sérialisation des exports : temps d'encodage et taille de la réponse
+/scanexportjsonmulti selon l'encodeur (chemin par défaut de FastAPI, json indenté,
+orjson, recopie des octets de l'export, MessagePack) puis selon la compression
+(gzip, zstd) appliquée au JSON compact.
+
+    python benchmarks/bench_serialization.py [--sizes 1000,10000,100000] [--repeat 5]
+
+MessagePack et zstd ne sont mesurés que si les modules msgpack / zstandard sont installés.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from benchmarks.fake_spiderfoot import EVENT_TYPES, MODULES  # noqa: E402
+from compression import zstandard  # noqa: E402
+from serialization import dumps, msgpack  # noqa: E402
+
+
+def make_export(events: int) -> list:
+    # Même forme que les exports SpiderFoot (et que le serveur factice)
+    rng = random.Random(events)
+    last_seen = time.strftime("%Y-%m-%d %H:%M:%S")
+    export = []
+    for index in range(events):
+        event_type = rng.choice(EVENT_TYPES)
+        export.append({
+            "data": f"{event_type.lower()}-{index}.example.com",
+            "event_type": event_type,
+            "module": rng.choice(MODULES),
+            "source_data": "example.com",
+            "false_positive": 0,
+            "last_seen": last_seen,
+            "scan_name": "bench",
+            "scan_target": "example.com",
+        })
+    return export
+
+
+def envelope(data: list) -> dict:
+    return {"status": "success", "scan_ids": ["BENCH"], "file": "bench.json", "event_count": len(data), "data": data}
+
+
+def best(fn, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def run(sizes, repeat: int):
+    for size in sizes:
+        data = make_export(size)
+        raw = dumps(data)  # export tel que reçu de SpiderFoot
+        head = dumps({k: v for k, v in envelope([]).items() if k != "data"})[:-1]
+
+        encoders = [
+            # JSONResponse de FastAPI : jsonable_encoder puis json.dumps compact
+            ("fastapi default", lambda: json.dumps(
+                jsonable_encoder(envelope(data)), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()),
+            ("json indent=2", lambda: json.dumps(envelope(data), ensure_ascii=False, indent=2).encode()),
+            ("orjson", lambda: dumps(envelope(data))),
+            ("orjson + raw export", lambda: head + b',"data":' + raw + b"}"),
+        ]
+        if msgpack is not None:
+            encoders.append(("msgpack", lambda: msgpack.packb(envelope(data), use_bin_type=True)))
+
+        print(f"\n{size} événements")
+        print(f"  {'encodeur':<22} {'ms':>9} {'octets':>12}")
+        for name, fn in encoders:
+            elapsed = best(fn, repeat)
+            print(f"  {name:<22} {elapsed * 1e3:9.2f} {len(fn()):12d}")
+
+        body = dumps(envelope(data))
+        codecs = [
+            ("identity", lambda: body),
+            ("gzip -1", lambda: gzip.compress(body, 1)),
+            ("gzip -6", lambda: gzip.compress(body, 6)),
+        ]
+        if zstandard is not None:
+            for level in (1, 3):
+                compressor = zstandard.ZstdCompressor(level=level)
+                codecs.append((f"zstd -{level}", lambda c=compressor: c.compress(body)))
+
+        print(f"  {'compression':<22} {'ms':>9} {'octets':>12} {'ratio':>7}")
+        for name, fn in codecs:
+            elapsed = best(fn, repeat)
+            compressed = len(fn())
+            print(f"  {name:<22} {elapsed * 1e3:9.2f} {compressed:12d} {len(body) / compressed:7.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="nombres d'événements par export, séparés par des virgules")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(",")], args.repeat)
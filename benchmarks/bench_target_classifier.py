@@ -0,0 +1,95 @@
+# benchmarks/bench_target_classifier.py
+"""
+Micro-benchmark de validation.detect_target_type : compare le classifieur compilé
+(une alternance + mémo LRU) à l'implémentation d'origine, et vérifie que les deux
+donnent exactement le même résultat.
+
+    python benchmarks/bench_target_classifier.py [--number 20000]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import classify_many, classify_target, detect_target_type  # noqa: E402
+
+
+def legacy_detect_target_type(req: str):
+    # Version d'origine : dictionnaire reconstruit et re.match successifs à chaque appel
+    input_str = req
+
+    patterns = {
+        "ip_address": r"^(?:\d{1,3}\.){3}\d{1,3}$",
+        "cidr": r"^(?:\d{1,3}\.){3}\d{1,3}/\d{1,2}$",
+        "domain": r"^(?!http)(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}$",
+        "subdomain": r"^(?!http)(?:[a-zA-Z0-9-]+\.){2,}[a-zA-Z]{2,}$",
+        "email": r"^[\w\.-]+@[\w\.-]+\.\w+$",
+        "phone_number": r"^\+?\d{7,15}$",
+        "asn": r"^AS\d+$",
+        "bitcoin_address": r"^[13][a-km-zA-HJ-NP-Z1-9]{25,34}$",
+        "username": r"^@?[a-zA-Z0-9_]{3,30}$",
+        "person_name": r"^[A-ZÀ-Ý][a-zà-ÿ']+(?:[\s'-][A-ZÀ-Ý][a-zà-ÿ']+)+$",
+        "hostname": r"^(?!http)(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}$"
+    }
+
+    for target_type, pattern in patterns.items():
+        if re.match(pattern, input_str):
+            return {"target_type": target_type, "input": input_str}
+
+    return {"target_type": "unknown", "input": input_str}
+
+
+TARGETS = [
+    "8.8.8.8", "192.168.1.0/24", "example.com", "www.sub.example.co.uk", "john.doe@example.com",
+    "+33612345678", "AS15169", "1BoatSLRHtKNngkdXEeobR76b3LETJpeK", "@johndoe", "john_doe",
+    "Jean-Pierre Dupont", "Élodie Martin", "http://example.com", "httpbin.org", "999.999.999.999",
+    "not a target!", "ab", "xn--bcher-kva.example", "AS", "12345678901234567890",
+]
+
+
+def check_equivalence(targets):
+    for target in targets:
+        expected = legacy_detect_target_type(target)
+        got = detect_target_type(target)
+        if got != expected:
+            raise AssertionError(f"{target!r}: {got} != {expected}")
+
+
+def run(number: int):
+    check_equivalence(TARGETS)
+    calls = number * len(TARGETS)
+
+    def legacy():
+        for target in TARGETS:
+            legacy_detect_target_type(target)
+
+    def compiled_cold():
+        classify_target.cache_clear()
+        for target in TARGETS:
+            detect_target_type(target)
+
+    def compiled_warm():
+        for target in TARGETS:
+            detect_target_type(target)
+
+    def batch():
+        classify_many(TARGETS)
+
+    print(f"{len(TARGETS)} cibles x {number} répétitions")
+    for name, fn in [
+        ("legacy", legacy),
+        ("compiled (sans mémo)", compiled_cold),
+        ("compiled (mémo LRU)", compiled_warm),
+        ("classify_many", batch),
+    ]:
+        elapsed = timeit.timeit(fn, number=number)
+        print(f"  {name:<22} {elapsed / calls * 1e9:8.0f} ns/cible")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    run(parser.parse_args().number)
@@ -0,0 +1,275 @@
+# benchmarks/fake_spiderfoot.py
+"""
+Serveur SpiderFoot factice pour les tests de charge : implémente /startscan, /scanstatus,
+/stopscan, /scanlist et /scanexportjsonmulti avec l'authentification Digest, une latence,
+un taux d'erreur et une taille d'export configurables. Les scans passent à FINISHED
+après --scan-duration secondes.
+
+    python benchmarks/fake_spiderfoot.py --port 5001 --latency 0.02 --error-rate 0.01 --events-per-scan 5000
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import secrets
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+REALM = "spiderfoot"
+EVENT_TYPES = ["IP_ADDRESS", "INTERNET_NAME", "DOMAIN_NAME", "EMAILADDR", "TCP_PORT_OPEN", "MALICIOUS_IPADDR", "RAW_DNS_RECORDS"]
+MODULES = ["sfp_dnsresolve", "sfp_whois", "sfp_portscan_tcp", "sfp_email", "sfp_virustotal"]
+
+
+@dataclass
+class FakeConfig:
+    username: str = "admin"
+    password: str = "admin"
+    auth: bool = True
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    events_per_scan: int = 1000
+    scan_duration: float = 5.0
+    chunk_events: int = 500
+
+
+@dataclass
+class FakeScan:
+    scan_id: str
+    name: str
+    target: str
+    created: float = field(default_factory=time.time)
+    ended: Optional[float] = None
+    status: str = "RUNNING"
+
+
+class DigestAuthenticator:
+    """Digest MD5, qop=auth, comme le serveur CherryPy de SpiderFoot. Nonces signés, sans état."""
+
+    def __init__(self, username: str, password: str):
+        self._ha1 = hashlib.md5(f"{username}:{REALM}:{password}".encode()).hexdigest()
+        self._username = username
+        self._secret = secrets.token_bytes(16)
+
+    def _sign(self, stamp: str) -> str:
+        return hmac.new(self._secret, stamp.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def challenge(self) -> Response:
+        stamp = str(int(time.time()))
+        nonce = f"{stamp}.{self._sign(stamp)}"
+        header = f'Digest realm="{REALM}", nonce="{nonce}", qop="auth", algorithm=MD5, opaque="{uuid.uuid4().hex}"'
+        return Response("Unauthorized", status_code=401, headers={"WWW-Authenticate": header})
+
+    def check(self, request: Request) -> bool:
+        header = request.headers.get("authorization", "")
+        if not header.lower().startswith("digest "):
+            return False
+        params = {}
+        for part in _split_header(header[7:]):
+            key, _, value = part.strip().partition("=")
+            params[key.strip().lower()] = value.strip().strip('"')
+        stamp, _, signature = params.get("nonce", "").partition(".")
+        if params.get("username") != self._username or not hmac.compare_digest(signature, self._sign(stamp)):
+            return False
+        uri = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        if params.get("uri") != uri:
+            return False
+        ha2 = hashlib.md5(f"{request.method}:{uri}".encode()).hexdigest()
+        expected = hashlib.md5(
+            f"{self._ha1}:{params['nonce']}:{params.get('nc', '')}:{params.get('cnonce', '')}:{params.get('qop', '')}:{ha2}".encode()
+        ).hexdigest()
+        return hmac.compare_digest(expected, params.get("response", ""))
+
+
+def _split_header(value: str):
+    # Découpe sur les virgules hors guillemets
+    part, quoted = [], False
+    for char in value:
+        if char == '"':
+            quoted = not quoted
+        if char == "," and not quoted:
+            yield "".join(part)
+            part = []
+        else:
+            part.append(char)
+    if part:
+        yield "".join(part)
+
+
+class FakeSpiderFoot:
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.scans: Dict[str, FakeScan] = {}
+        self.auth = DigestAuthenticator(config.username, config.password) if config.auth else None
+        self.requests = 0
+
+    def _refresh(self, scan: FakeScan):
+        if scan.status == "RUNNING" and time.time() - scan.created >= self.config.scan_duration:
+            scan.status = "FINISHED"
+            scan.ended = time.time()
+
+    async def _prelude(self, request: Request) -> Optional[Response]:
+        """Authentification, latence simulée et erreurs aléatoires, communes à toutes les routes."""
+        self.requests += 1
+        if self.auth is not None and not self.auth.check(request):
+            return self.auth.challenge()
+        if self.config.latency or self.config.jitter:
+            await asyncio.sleep(max(self.config.latency + random.uniform(-self.config.jitter, self.config.jitter), 0.0))
+        if self.config.error_rate and random.random() < self.config.error_rate:
+            return JSONResponse({"error": {"http_status": "500", "message": "Simulated failure"}}, status_code=500)
+        return None
+
+    async def start_scan(self, request: Request) -> Response:
+        error = await self._prelude(request)
+        if error is not None:
+            return error
+        form = parse_qs((await request.body()).decode())
+        name = form.get("scanname", [""])[0]
+        target = form.get("scantarget", [""])[0]
+        if not name or not target:
+            return JSONResponse(["ERROR", "Incorrect usage: scan name or target was not specified."])
+        scan = FakeScan(uuid.uuid4().hex[:16].upper(), name, target)
+        self.scans[scan.scan_id] = scan
+        return JSONResponse(["SUCCESS", scan.scan_id])
+
+    async def scan_status(self, request: Request) -> Response:
+        error = await self._prelude(request)
+        if error is not None:
+            return error
+        scan = self.scans.get(request.query_params.get("id", ""))
+        if scan is None:
+            return JSONResponse({"error": {"http_status": "404", "message": "Scan ID not found."}}, status_code=404)
+        self._refresh(scan)
+        return JSONResponse(self._status_row(scan))
+
+    async def stop_scan(self, request: Request) -> Response:
+        error = await self._prelude(request)
+        if error is not None:
+            return error
+        for scan_id in request.query_params.get("id", "").split(","):
+            scan = self.scans.get(scan_id)
+            if scan is None:
+                return JSONResponse({"error": {"http_status": "404", "message": "Scan does not exist"}}, status_code=404)
+            self._refresh(scan)
+            if scan.status == "RUNNING":
+                scan.status = "ABORTED"
+                scan.ended = time.time()
+        return JSONResponse("")
+
+    async def scan_list(self, request: Request) -> Response:
+        error = await self._prelude(request)
+        if error is not None:
+            return error
+        rows = []
+        for scan in self.scans.values():
+            self._refresh(scan)
+            name, target, created, started, ended, status, risk = self._status_row(scan)
+            rows.append([scan.scan_id, name, target, created, started, ended, status, self.config.events_per_scan, risk])
+        return JSONResponse(rows)
+
+    async def export_multi(self, request: Request) -> Response:
+        error = await self._prelude(request)
+        if error is not None:
+            return error
+        scans = [self.scans.get(scan_id) for scan_id in request.query_params.get("ids", "").split(",")]
+        if not all(scans):
+            return JSONResponse({"error": {"http_status": "404", "message": "Scan not found."}}, status_code=404)
+        return StreamingResponse(self._export_chunks(scans), media_type="application/json")
+
+    async def _export_chunks(self, scans):
+        yield b"["
+        first = True
+        for scan in scans:
+            # Génération déterministe : le même scan produit toujours le même export
+            rng = random.Random(scan.scan_id)
+            batch = []
+            for index in range(self.config.events_per_scan):
+                event_type = rng.choice(EVENT_TYPES)
+                batch.append(json.dumps({
+                    "data": f"{event_type.lower()}-{index}.{scan.target}",
+                    "event_type": event_type,
+                    "module": rng.choice(MODULES),
+                    "source_data": scan.target,
+                    "false_positive": 0,
+                    "last_seen": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(scan.created)),
+                    "scan_name": scan.name,
+                    "scan_target": scan.target,
+                }))
+                if len(batch) >= self.config.chunk_events:
+                    yield (("" if first else ",") + ",".join(batch)).encode()
+                    first, batch = False, []
+                    await asyncio.sleep(0)
+            if batch:
+                yield (("" if first else ",") + ",".join(batch)).encode()
+                first = False
+        yield b"]"
+
+    def _status_row(self, scan: FakeScan) -> list:
+        fmt = "%Y-%m-%d %H:%M:%S"
+        return [
+            scan.name,
+            scan.target,
+            time.strftime(fmt, time.localtime(scan.created)),
+            time.strftime(fmt, time.localtime(scan.created)),
+            time.strftime(fmt, time.localtime(scan.ended)) if scan.ended else "Not yet",
+            scan.status,
+            {"HIGH": 0, "MEDIUM": 0, "LOW": 0, "INFO": self.config.events_per_scan},
+        ]
+
+
+def create_app(config: FakeConfig) -> Starlette:
+    fake = FakeSpiderFoot(config)
+    app = Starlette(routes=[
+        Route("/startscan", fake.start_scan, methods=["POST"]),
+        Route("/scanstatus", fake.scan_status, methods=["GET"]),
+        Route("/stopscan", fake.stop_scan, methods=["GET"]),
+        Route("/scanlist", fake.scan_list, methods=["GET"]),
+        Route("/scanexportjsonmulti", fake.export_multi, methods=["GET"]),
+    ])
+    app.state.fake = fake
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serveur SpiderFoot factice")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--no-auth", action="store_true", help="désactive l'authentification Digest")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence ajoutée à chaque requête (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="variation uniforme de la latence (secondes)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="proportion de réponses 500 (0-1)")
+    parser.add_argument("--events-per-scan", type=int, default=1000, help="nombre d'événements exportés par scan")
+    parser.add_argument("--scan-duration", type=float, default=5.0, help="secondes avant qu'un scan passe à FINISHED")
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        username=args.username,
+        password=args.password,
+        auth=not args.no_auth,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        events_per_scan=args.events_per_scan,
+        scan_duration=args.scan_duration,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
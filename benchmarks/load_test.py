@@ -0,0 +1,357 @@
+# benchmarks/load_test.py
+"""
+Test de charge du wrapper contre le SpiderFoot factice (benchmarks/fake_spiderfoot.py).
+Lance les deux serveurs en sous-processus, amorce quelques scans, puis soumet chaque route
+de main.py à plusieurs niveaux de concurrence. Rapporte le débit, les latences p50/p99,
+le taux d'erreur et le pic de RSS du wrapper, et enregistre les résultats en JSON pour
+comparer les exécutions suivantes.
+
+    python benchmarks/load_test.py --concurrency 1,10,50 --duration 10
+    python benchmarks/load_test.py --scenarios scan_status,export --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+API_KEY = "load-test-key"
+
+
+@dataclass
+class Result:
+    scenario: str
+    concurrency: int
+    requests: int
+    errors: int
+    duration: float
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    peak_rss_mb: Optional[float]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class RssProbe:
+    """Pic de RSS d'un processus (Linux) : VmHWM, remis à zéro avant chaque scénario via clear_refs."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+
+    def reset(self):
+        try:
+            with open(f"/proc/{self.pid}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+    def peak_mb(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            return None
+        return None
+
+
+class Servers:
+    """SpiderFoot factice + wrapper (uvicorn), dans un répertoire de travail temporaire."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="sf-load-")
+        self.fake_port = free_port()
+        self.wrapper_port = free_port()
+        self.processes: List[subprocess.Popen] = []
+
+    def start(self):
+        fake_cmd = [
+            sys.executable, os.path.join(ROOT, "benchmarks", "fake_spiderfoot.py"),
+            "--port", str(self.fake_port),
+            "--latency", str(self.args.latency),
+            "--jitter", str(self.args.jitter),
+            "--error-rate", str(self.args.error_rate),
+            "--events-per-scan", str(self.args.events_per_scan),
+            "--scan-duration", str(self.args.scan_duration),
+        ]
+        env = {
+            **os.environ,
+            "SPIDERFOOT_API_KEY": API_KEY,
+            "SPIDERFOOT_BASE_URL": f"http://127.0.0.1:{self.fake_port}",
+            "USER_NAME": "admin",
+            "PASSWORD": "admin",
+            "V_USERNAME": "docs",
+            "V_PASSWORD": "docs",
+        }
+        for item in self.args.wrapper_env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        wrapper_cmd = [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--app-dir", ROOT,
+            "--port", str(self.wrapper_port),
+            "--log-level", "warning",
+        ]
+        self.processes.append(subprocess.Popen(fake_cmd, cwd=self.workdir))
+        self.processes.append(subprocess.Popen(wrapper_cmd, cwd=self.workdir, env=env, stderr=subprocess.DEVNULL if self.args.quiet else None))
+
+    @property
+    def wrapper_pid(self) -> int:
+        return self.processes[1].pid
+
+    async def wait_ready(self, client: httpx.AsyncClient, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/scan/queue")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if any(process.poll() is not None for process in self.processes):
+                raise RuntimeError("un serveur s'est arrêté au démarrage")
+            await asyncio.sleep(0.2)
+        raise RuntimeError("le wrapper n'a pas démarré")
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class Fixtures:
+    """Scans créés avant les mesures et partagés par les scénarios."""
+
+    def __init__(self):
+        self.finished: List[str] = []
+        self.counter = 0
+
+    def next_id(self) -> str:
+        self.counter += 1
+        return self.finished[self.counter % len(self.finished)]
+
+    def scan_body(self) -> dict:
+        self.counter += 1
+        return {"scan_name": f"load-{self.counter}", "target": f"host{self.counter}.example.com", "modules": "sfp_dnsresolve"}
+
+
+async def seed(client: httpx.AsyncClient, fixtures: Fixtures, count: int, scan_duration: float):
+    for index in range(count):
+        response = await client.post("/scan", json={"scan_name": f"seed-{index}", "target": f"seed{index}.example.com", "modules": "sfp_dnsresolve"})
+        response.raise_for_status()
+        body = response.json()
+        if body.get("status") != "success":
+            raise RuntimeError(f"amorçage impossible (file d'attente ?) : {body}")
+        fixtures.finished.append(body["spiderfoot_response"][1])
+    await asyncio.sleep(scan_duration + 0.5)
+    # Premier export de chaque scan : remplit le cache d'export et le stockage d'événements
+    for scan_id in fixtures.finished:
+        await client.get("/scanexportjsonmulti", params={"ids": scan_id})
+
+
+async def read_first_sse_event(client: httpx.AsyncClient, scan_id: str) -> httpx.Response:
+    async with client.stream("GET", f"/scanstatus/{scan_id}/stream") as response:
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                break
+    return response
+
+
+def scenarios(fixtures: Fixtures) -> Dict[str, Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]]:
+    return {
+        "scan_start": lambda c: c.post("/scan", json=fixtures.scan_body()),
+        "scan_batch": lambda c: c.post("/scan/batch", json=[fixtures.scan_body() for _ in range(10)]),
+        "scan_queue": lambda c: c.get("/scan/queue"),
+        "scan_status": lambda c: c.post(f"/scanstatus/{fixtures.next_id()}"),
+        "scan_status_stream": lambda c: read_first_sse_event(c, fixtures.next_id()),
+        "stop_scan": lambda c: c.get(f"/stopscan/{fixtures.next_id()}"),
+        "scan_list": lambda c: c.get("/scanlist"),
+        "export": lambda c: c.get("/scanexportjsonmulti", params={"ids": fixtures.next_id()}),
+        "export_stream": lambda c: c.get("/scanexportjsonmulti", params={"ids": fixtures.next_id(), "stream": "ndjson"}),
+        "export_delta": lambda c: c.get("/scanexportjsonmulti", params={"ids": fixtures.next_id(), "delta": "true"}),
+        "events": lambda c: c.get("/events", params={"scan_ids": fixtures.next_id(), "type": "IP_ADDRESS"}),
+        "events_summary": lambda c: c.get("/events/summary", params={"scan_ids": fixtures.next_id()}),
+        "metrics": lambda c: c.get("/metrics"),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    call: Callable[[httpx.AsyncClient], Awaitable[httpx.Response]],
+    concurrency: int,
+    duration: float,
+    probe: RssProbe,
+) -> Result:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await call(client)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    probe.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return Result(
+        scenario=name,
+        concurrency=concurrency,
+        requests=len(latencies),
+        errors=errors,
+        duration=round(elapsed, 3),
+        throughput=round(len(latencies) / elapsed, 1),
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 2),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+        max_ms=round(max(latencies, default=0.0) * 1000, 2),
+        peak_rss_mb=probe.peak_mb(),
+    )
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: List[Result], baseline: Optional[dict]):
+    previous = {}
+    if baseline:
+        previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    header = f"{'scenario':<20}{'conc':>5}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'rss MB':>9}"
+    if previous:
+        header += f"{'Δ req/s':>10}{'Δ p99':>10}"
+    print(header)
+    for r in results:
+        line = f"{r.scenario:<20}{r.concurrency:>5}{r.throughput:>10.1f}{r.p50_ms:>10.2f}{r.p99_ms:>10.2f}{r.errors:>8}{r.peak_rss_mb or 0:>9.1f}"
+        old = previous.get((r.scenario, r.concurrency))
+        if old:
+            line += f"{_delta(r.throughput, old['throughput']):>10}{_delta(r.p99_ms, old['p99_ms']):>10}"
+        print(line)
+
+
+def _delta(new: float, old: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+async def main(args: argparse.Namespace) -> int:
+    servers = Servers(args)
+    servers.start()
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 10, max_keepalive_connections=max(args.concurrency) + 10)
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{servers.wrapper_port}",
+            headers={"X-API-Key": API_KEY},
+            limits=limits,
+            timeout=args.timeout,
+        ) as client:
+            await servers.wait_ready(client)
+            fixtures = Fixtures()
+            await seed(client, fixtures, args.seed_scans, args.scan_duration)
+
+            available = scenarios(fixtures)
+            selected = args.scenarios or list(available)
+            unknown = [name for name in selected if name not in available]
+            if unknown:
+                print(f"scénarios inconnus : {unknown} (disponibles : {list(available)})")
+                return 2
+
+            probe = RssProbe(servers.wrapper_pid)
+            results = []
+            for name in selected:
+                for concurrency in args.concurrency:
+                    result = await run_scenario(client, name, available[name], concurrency, args.duration, probe)
+                    results.append(result)
+                    print(f"{name} x{concurrency}: {result.throughput} req/s, p99 {result.p99_ms} ms, {result.errors} errors")
+    finally:
+        servers.stop()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "options": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+        },
+        "results": [asdict(result) for result in results],
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print()
+    print_results(results, baseline)
+    print(f"\nrésultats enregistrés dans {output}")
+    return 0
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Test de charge du wrapper SpiderFoot")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 10, 50],
+                        help="niveaux de concurrence, séparés par des virgules")
+    parser.add_argument("--duration", type=float, default=10.0, help="durée de chaque mesure (secondes)")
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=None, help="sous-ensemble de scénarios")
+    parser.add_argument("--seed-scans", type=int, default=5, help="scans créés avant les mesures")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--latency", type=float, default=0.01, help="latence du SpiderFoot factice (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--events-per-scan", type=int, default=2000)
+    parser.add_argument("--scan-duration", type=float, default=1.0)
+    parser.add_argument("--wrapper-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="variable d'environnement supplémentaire pour le wrapper (répétable)")
+    parser.add_argument("--output", help="fichier JSON de résultats (par défaut benchmarks/results/load_<date>.json)")
+    parser.add_argument("--compare", help="résultats JSON d'une exécution précédente à comparer")
+    parser.add_argument("--quiet", action="store_true", help="masque les logs du wrapper")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,192 @@
+# columnar_export.py
+import csv
+import io
+import logging
+import os
+import secrets
+from typing import Dict, List, Optional, Tuple
+
+from event_store import ScanAttributor, event_identity
+from export_stream import JSONArraySplitter
+from serialization import loads
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # formats Parquet et Arrow optionnels : pip install pyarrow
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Colonnes du fichier, dans l'ordre ; les valeurs très répétées sont encodées par dictionnaire
+COLUMNS = ("scan_id", "event_type", "module", "data", "source_data", "confidence", "false_positive", "last_seen")
+DICTIONARY_COLUMNS = ("scan_id", "event_type", "module")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def available_formats() -> Tuple[str, ...]:
+    return ("csv", "parquet", "arrow") if pyarrow is not None else ("csv",)
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _schema():
+    dictionary = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return pyarrow.schema([
+        ("scan_id", dictionary),
+        ("event_type", dictionary),
+        ("module", dictionary),
+        ("data", pyarrow.string()),
+        ("source_data", pyarrow.string()),
+        ("confidence", pyarrow.int16()),
+        ("false_positive", pyarrow.bool_()),
+        ("last_seen", pyarrow.timestamp("s")),
+    ])
+
+
+class ColumnarExport:
+    """
+    Convertit un export SpiderFoot (tableau JSON lu en flux) en fichier colonnaire plat :
+    csv, parquet ou arrow (format stream IPC, lisible par memory map sans copie).
+    Les lignes sont accumulées colonne par colonne et écrites par blocs de chunk_rows
+    (un row group Parquet, un record batch Arrow) : la mémoire reste bornée quelle que soit
+    la taille de l'export. scan_id, event_type et module sont encodés par dictionnaire
+    (index entiers + valeurs distinctes, dictionnaire complété d'un bloc à l'autre).
+    Méthodes synchrones : les appeler via run_in_threadpool depuis les endpoints.
+    """
+
+    def __init__(self, fmt: str, path: str, scans: List[tuple], chunk_rows: int = 65536):
+        if fmt not in available_formats():
+            raise ValueError(f"format must be in [{', '.join(available_formats())}]")
+        self.fmt = fmt
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        # Nom temporaire propre à cette conversion : deux requêtes simultanées n'écrivent pas le même fichier
+        self._tmp_path = f"{path}.{secrets.token_hex(4)}.part"
+        self._splitter = JSONArraySplitter()
+        self._attributor = ScanAttributor(scans)
+        # Valeur -> index, et valeurs dans l'ordre des index (dictionnaire cumulé)
+        self._codes: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARY_COLUMNS}
+        self._values: Dict[str, List[str]] = {name: [] for name in self._codes}
+        self._columns: Dict[str, list] = {name: [] for name in COLUMNS}
+        self._file = open(self._tmp_path, "wb")
+        self._writer = None
+        if fmt == "csv":
+            self._text = io.TextIOWrapper(self._file, encoding="utf-8", newline="")
+            self._csv = csv.writer(self._text)
+            self._csv.writerow(COLUMNS)
+
+    def _code(self, column: str, value) -> int:
+        value = "" if value is None else str(value)
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self._values[column].append(value)
+        return code
+
+    def feed(self, chunk: bytes):
+        columns = self._columns
+        for item in self._splitter.feed(chunk):
+            event = loads(item)
+            event_type, data = event_identity(event)
+            columns["scan_id"].append(self._code("scan_id", self._attributor.scan_for(event)))
+            columns["event_type"].append(self._code("event_type", event_type))
+            columns["module"].append(self._code("module", event.get("module")))
+            columns["data"].append(data)
+            columns["source_data"].append(event.get("source_data"))
+            columns["confidence"].append(_int(event.get("confidence")))
+            columns["false_positive"].append(bool(_int(event.get("false_positive"))))
+            columns["last_seen"].append(event.get("last_seen"))
+            if len(columns["data"]) >= self.chunk_rows:
+                self._flush()
+
+    def _flush(self):
+        columns = self._columns
+        count = len(columns["data"])
+        if not count:
+            return
+        if self.fmt == "csv":
+            decoded = [
+                [self._values[name][code] for code in columns[name]] if name in self._codes else columns[name]
+                for name in COLUMNS
+            ]
+            self._csv.writerows(zip(*decoded))
+        else:
+            self._write_batch()
+        self.rows += count
+        # Vidées sur place : feed garde une référence sur les colonnes pendant la lecture d'un chunk
+        for values in columns.values():
+            values.clear()
+
+    def _write_batch(self):
+        schema = _schema()
+        arrays = []
+        for field in schema:
+            values = self._columns[field.name]
+            if field.name in self._codes:
+                arrays.append(pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(values, pyarrow.int32()), pyarrow.array(self._values[field.name], pyarrow.string())
+                ))
+            elif field.name == "last_seen":
+                arrays.append(pyarrow.compute.strptime(
+                    pyarrow.array(values, pyarrow.string()), format=TIMESTAMP_FORMAT, unit="s", error_is_null=True
+                ))
+            else:
+                arrays.append(pyarrow.array(values, field.type))
+        batch = pyarrow.record_batch(arrays, schema=schema)
+        if self._writer is None:
+            if self.fmt == "parquet":
+                self._writer = pyarrow.parquet.ParquetWriter(self._file, schema, compression="zstd")
+            else:
+                # Format stream plutôt que fichier : le format fichier interdit les deltas de dictionnaire
+                # d'un bloc à l'autre. Non compressé : se lit par memory map, sans copie ni décodage.
+                self._writer = pyarrow.ipc.new_stream(
+                    self._file, schema, options=pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+                )
+        if self.fmt == "parquet":
+            self._writer.write_batch(batch, row_group_size=len(batch))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self) -> int:
+        """Écrit le dernier bloc, renomme le fichier à sa place et renvoie le nombre de lignes."""
+        try:
+            self._flush()
+            if self.fmt == "csv":
+                self._text.close()
+            else:
+                if self._writer is None:
+                    # Export vide : fichier valide réduit au schéma
+                    self._write_batch()
+                self._writer.close()
+        finally:
+            self._close_file()
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"columnar export written to {self.path} ({self.fmt}, {self.rows} rows)")
+        return self.rows
+
+    def abort(self):
+        self._close_file()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def _close_file(self):
+        if self.fmt == "csv" and not self._text.closed:
+            self._text.close()
+        if not self._file.closed:
+            self._file.close()
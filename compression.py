@@ -0,0 +1,173 @@
+# compression.py
+import zlib
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+
+from serialization import parse_accept
+
+try:
+    import zstandard
+except ImportError:  # zstd optionnel : pip install zstandard
+    zstandard = None
+
+# Types de contenu compressés (text/event-stream est exclu : chaque événement doit partir tout de suite)
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/javascript",
+}
+
+# Au-delà, la compression d'un morceau part dans le pool de threads (zlib et zstd libèrent le GIL)
+THREAD_THRESHOLD = 256 * 1024
+
+
+def supported_encodings():
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Meilleur codage accepté par le client (q le plus haut, zstd avant gzip à égalité), ou None."""
+    accepted = parse_accept(accept_encoding)
+    best, best_quality = None, 0.0
+    for name in supported_encodings():
+        quality = accepted.get(name, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/event-stream":
+        return False
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware:
+    """
+    Compression gzip ou zstd négociée via Accept-Encoding, réponses en flux comprises.
+    ASGI pur (et non GZipMiddleware de Starlette, limité à gzip) : les flux sont compressés
+    au fil de l'eau, sans mise en tampon de la réponse entière.
+    Les corps de moins de minimum_size octets sont envoyés tels quels.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "zstd": zstd_level}
+
+    def _encoder(self, name: str):
+        if name == "zstd":
+            return ZstdEncoder(self.levels["zstd"])
+        return GzipEncoder(self.levels["gzip"])
+
+    @staticmethod
+    async def _compress(encoder, body: bytes, final: bool) -> bytes:
+        def run():
+            data = encoder.compress(body)
+            return data + encoder.finish() if final else data
+
+        # Un export de plusieurs Mo bloquerait la boucle asyncio pendant des dizaines de ms
+        if len(body) >= THREAD_THRESHOLD:
+            return await anyio.to_thread.run_sync(run)
+        return run()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, encoder, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                # Accept-Ranges : les plages demandées portent sur les octets non compressés
+                if (
+                    message["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or "accept-ranges" in headers
+                    or not _compressible(headers)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Envoi différé : la décision dépend de la taille du premier morceau
+                    start = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = self._encoder(encoding)
+                headers["Content-Encoding"] = encoder.name
+                # La représentation compressée n'est plus identique octet pour octet
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    compressed = await self._compress(encoder, body, final=True)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send(start)
+
+            data = await self._compress(encoder, body, final=not more_body)
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
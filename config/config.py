@@ -1,15 +1,142 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
 
+class SpiderFootBackend(BaseModel):
+    """Une instance SpiderFoot du pool (chacune a ses propres identifiants Digest)."""
+    name: Optional[str] = None
+    base_url: str
+    user_name: str
+    password: str
+
+
+class ApiKeyConfig(BaseModel):
+    """Une clé API acceptée : empreinte SHA-256 (hex) de la clé, jamais la clé elle-même.
+    Limites non renseignées : valeurs par défaut api_key_*."""
+    name: str
+    key_sha256: str
+    rate: Optional[float] = None
+    burst: Optional[int] = None
+    max_concurrent: Optional[int] = None
+    max_upstream: Optional[int] = None
+    # Profils CPU à la demande (en-tête X-Profile) et accès à /debug/profiles
+    profile: bool = False
+
+
 class Settings(BaseSettings):
-    spiderfoot_api_key: str
+    # Clé API unique historique (clé "default") ; vide si toutes les clés sont dans api_keys
+    spiderfoot_api_key: str = ""
     spiderfoot_base_url: str
-    user_name: str 
+    user_name: str
     password: str
-    
+
     v_username: str
     v_password: str
 
+    # Clés API (JSON : [{"name", "key_sha256", "rate", "burst", "max_concurrent", "max_upstream"}, ...]),
+    # empreinte obtenue avec python api_keys.py <clé>. Limites par clé : requêtes par seconde
+    # (0 = illimité) et rafale, requêtes en cours et appels SpiderFoot simultanés (0 = illimité)
+    api_keys: List[ApiKeyConfig] = []
+    api_key_rate: float = 20.0
+    api_key_burst: int = 40
+    api_key_max_concurrent: int = 50
+    api_key_max_upstream: int = 20
+
+    # Pool de connexions vers SpiderFoot
+    spiderfoot_max_connections: int = 100
+    spiderfoot_max_keepalive: int = 20
+    spiderfoot_timeout: float = 30.0
+    spiderfoot_connect_timeout: float = 5.0
+
+    # Pool d'instances SpiderFoot (JSON : [{"name", "base_url", "user_name", "password"}, ...]).
+    # Vide : une seule instance, décrite par spiderfoot_base_url / user_name / password.
+    spiderfoot_backends: List[SpiderFootBackend] = []
+    # Âge maximum (secondes) de la charge des instances avant de router un nouveau scan
+    spiderfoot_load_refresh: float = 30.0
+
+    # Résilience des appels SpiderFoot : réessais des lectures idempotentes (nombre total de
+    # tentatives, backoff exponentiel avec gigue), disjoncteur (échecs consécutifs avant ouverture,
+    # 0 = désactivé ; durée d'ouverture) et délai avant une requête de couverture sur /scanstatus (0 = désactivé)
+    spiderfoot_retry_attempts: int = 3
+    spiderfoot_retry_base_delay: float = 0.2
+    spiderfoot_retry_max_delay: float = 2.0
+    circuit_failure_threshold: int = 5
+    circuit_recovery_time: float = 30.0
+    spiderfoot_hedge_delay: float = 0.0
+
+    # Nombre maximum de /startscan simultanés pour POST /scan/batch
+    scan_batch_concurrency: int = 20
+
+    # Appels /scanstatus simultanés vers SpiderFoot pour POST /scanstatus/batch
+    status_batch_concurrency: int = 100
+
+    # Surveillance des statuts de scan (intervalle de polling et keep-alive SSE, en secondes)
+    status_poll_interval: float = 5.0
+    status_stream_heartbeat: float = 15.0
+
+    # Cache mémoire de /scanlist (fraîcheur, puis durée pendant laquelle la valeur périmée reste servie)
+    scanlist_cache_ttl: float = 5.0
+    scanlist_stale_ttl: float = 30.0
+
+    # Cache disque des exports de scans terminés
+    export_cache_dir: str = "scan_exports_json/cache"
+    export_cache_max_bytes: int = 1024 * 1024 * 1024  # 1 Go
+    export_cache_max_age: int = 7 * 24 * 3600  # secondes depuis le dernier accès (0 = illimité)
+
+    # Exports en tâche de fond (POST /exports) : workers simultanés, conservation des jobs terminés
+    # (secondes après la fin, fichier compris) et nombre maximum de jobs conservés
+    export_jobs_dir: str = "scan_exports_json/jobs"
+    export_jobs_workers: int = 2
+    export_jobs_ttl: float = 3600.0
+    export_jobs_max: int = 1000
+
+    # Exports colonnaires (format=csv|parquet|arrow) : lignes par bloc écrit (row group Parquet, batch Arrow)
+    columnar_chunk_rows: int = 65536
+
+    # Export incrémental : nombre de scans suivis en mémoire, et durée de conservation après la fin du scan
+    delta_max_scans: int = 200
+    delta_completed_ttl: float = 3600.0
+
+    # Différences entre scans (/scandiff) gardées en mémoire pour les paires de scans terminés
+    scandiff_cache_size: int = 256
+
+    # Stockage local indexé des événements exportés (SQLite)
+    event_store_enabled: bool = True
+    event_store_path: str = "scan_exports_json/events.sqlite3"
+    # Entités dédupliquées (type, valeur) entre scans, et conservation des événements bruts
+    # (false : seules les entités sont stockées, le stockage ne croît qu'avec les nouvelles découvertes)
+    event_store_entities: bool = True
+    event_store_raw_events: bool = True
+
+    # File d'admission des scans : nombre maximum de scans actifs par instance SpiderFoot (0 = pas de file),
+    # intervalle de vérification des scans en cours, vieillissement (secondes d'attente valant un
+    # niveau de priorité) et durée de scan supposée tant qu'aucun scan n'est terminé
+    scheduler_max_running: int = 0
+    scheduler_poll_interval: float = 10.0
+    scheduler_aging_seconds: float = 300.0
+    scheduler_default_scan_duration: float = 1800.0
+
+    # Métriques Prometheus (/metrics) : middleware de mesure des requêtes
+    metrics_enabled: bool = True
+
+    # Traçage des phases de chaque requête (en-tête Server-Timing) ; journal JSON des requêtes
+    # plus lentes que tracing_log_min_ms (0 = toutes)
+    tracing_enabled: bool = True
+    tracing_log_min_ms: float = 1000.0
+
+    # Profils CPU (cProfile) : part des requêtes profilées au hasard (0 = seulement X-Profile),
+    # nombre de profils gardés en mémoire (0 = profilage désactivé)
+    profiling_sample_rate: float = 0.0
+    profiling_max_profiles: int = 20
+
+    # Compression des réponses négociée via Accept-Encoding (zstd si le module zstandard est installé)
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    gzip_level: int = 6
+    zstd_level: int = 3
+
     class Config:
         env_file = ".env"  # lire le fichier .env automatiquement
 
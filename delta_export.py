@@ -0,0 +1,154 @@
+# delta_export.py
+import base64
+import hashlib
+import json
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from config.config import settings
+from event_store import ScanAttributor
+from export_stream import JSONArraySplitter
+
+logger = logging.getLogger(__name__)
+
+
+class ScanWatermark:
+    """
+    Événements déjà vus d'un scan : empreinte de l'événement -> numéro de séquence.
+    Le numéro est attribué la première fois que le wrapper voit l'événement, ce qui donne
+    un ordre stable même si SpiderFoot ne trie pas son export par date.
+    generation identifie ce filigrane : un filigrane évincé puis recréé repart de 1 avec une
+    autre génération, ce qui invalide les séquences des curseurs émis avant.
+    """
+
+    __slots__ = ("seen", "next_seq", "generation", "completed_at", "touched_at")
+
+    def __init__(self):
+        self.seen: Dict[int, int] = {}
+        self.generation = secrets.token_hex(4)
+        self.next_seq = 1
+        self.completed_at: Optional[float] = None
+        self.touched_at = time.monotonic()
+
+    def sequence(self, digest: int) -> int:
+        seq = self.seen.get(digest)
+        if seq is None:
+            seq = self.next_seq
+            self.seen[digest] = seq
+            self.next_seq += 1
+        return seq
+
+    @property
+    def high_water(self) -> int:
+        return self.next_seq - 1
+
+
+class DeltaTracker:
+    """
+    Filigranes par scan pour l'export incrémental des scans en cours.
+    Le curseur rendu au client contient, pour chaque scan, la génération du filigrane et le
+    dernier numéro de séquence reçu ; il est préfixé par l'époque du processus pour détecter
+    un redémarrage (l'état étant en mémoire, un curseur d'une autre époque déclenche un renvoi
+    complet). Un scan dont le filigrane a été évincé ou a expiré depuis est renvoyé en entier.
+    """
+
+    def __init__(self, max_scans: int, completed_ttl: float):
+        self.epoch = secrets.token_hex(4)
+        self.max_scans = max_scans
+        self.completed_ttl = completed_ttl
+        self._scans: "OrderedDict[str, ScanWatermark]" = OrderedDict()
+
+    def decode_cursor(self, cursor: Optional[str]) -> Tuple[Dict[str, Tuple[str, int]], bool]:
+        """
+        Retourne ({scan: (génération, séquence reçue)}, reset) ; reset si le curseur ne vient
+        pas de ce processus ou n'est pas lisible.
+        """
+        if not cursor:
+            return {}, False
+        epoch, _, payload = cursor.partition(":")
+        if epoch != self.epoch:
+            return {}, True
+        try:
+            marks = json.loads(base64.urlsafe_b64decode(payload.encode("ascii") + b"=" * (-len(payload) % 4)))
+            return {str(scan_id): (str(generation), int(seq)) for scan_id, (generation, seq) in marks.items()}, False
+        except (ValueError, TypeError, AttributeError):
+            return {}, True
+
+    def encode_cursor(self, marks: Dict[str, list]) -> str:
+        payload = base64.urlsafe_b64encode(json.dumps(marks, separators=(",", ":")).encode("utf-8"))
+        return f"{self.epoch}:{payload.decode('ascii').rstrip('=')}"
+
+    def watermark(self, scan_id: str) -> ScanWatermark:
+        self._expire()
+        mark = self._scans.get(scan_id)
+        if mark is None:
+            mark = self._scans[scan_id] = ScanWatermark()
+        self._scans.move_to_end(scan_id)
+        mark.touched_at = time.monotonic()
+        while len(self._scans) > self.max_scans:
+            evicted, _ = self._scans.popitem(last=False)
+            logger.info(f"delta tracker: watermark of scan {evicted} evicted")
+        return mark
+
+    def mark_complete(self, scan_id: str):
+        mark = self._scans.get(scan_id)
+        if mark is not None and mark.completed_at is None:
+            mark.completed_at = time.monotonic()
+
+    def _expire(self):
+        now = time.monotonic()
+        for scan_id in [
+            scan_id for scan_id, mark in self._scans.items()
+            if mark.completed_at is not None and now - mark.completed_at > self.completed_ttl
+        ]:
+            del self._scans[scan_id]
+
+    async def collect(
+        self,
+        chunks: AsyncIterator[bytes],
+        scans: List[Tuple[str, Optional[str], Optional[str]]],
+        cursor: Optional[str],
+    ) -> Tuple[List[dict], str, bool]:
+        """
+        Parcourt un export (flux de chunks) et ne garde que les événements postérieurs au curseur.
+        Retourne (nouveaux événements, nouveau curseur, reset).
+        """
+        received, reset = self.decode_cursor(cursor)
+        marks = {scan_id: self.watermark(scan_id) for scan_id, _, _ in scans}
+        # Séquence de départ par scan : 0 si le client ne l'a jamais reçu, ou si son filigrane
+        # a été recréé depuis le curseur (éviction, expiration) : il est alors renvoyé en entier
+        since: Dict[str, int] = {}
+        for scan_id, mark in marks.items():
+            generation, seq = received.get(scan_id, (mark.generation, 0))
+            if generation == mark.generation:
+                since[scan_id] = seq
+            else:
+                since[scan_id] = 0
+                reset = True
+                logger.info(f"delta tracker: watermark of scan {scan_id} recreated, full resend")
+        attributor = ScanAttributor(scans)
+        splitter = JSONArraySplitter()
+        events = []
+
+        async for chunk in chunks:
+            for item in splitter.feed(chunk):
+                event = json.loads(item)
+                scan_id = attributor.scan_for(event)
+                if scan_id is None:
+                    continue
+                digest = int.from_bytes(hashlib.blake2b(item, digest_size=8).digest(), "big")
+                if marks[scan_id].sequence(digest) > since[scan_id]:
+                    events.append(event)
+
+        new_cursor = self.encode_cursor({scan_id: [mark.generation, mark.high_water] for scan_id, mark in marks.items()})
+        return events, new_cursor, reset
+
+
+# Instance globale partagée par les endpoints
+delta_tracker = DeltaTracker(
+    max_scans=settings.delta_max_scans,
+    completed_ttl=settings.delta_completed_ttl,
+)
@@ -0,0 +1,545 @@
+# event_store.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config.config import settings
+from export_stream import JSONArraySplitter
+from serialization import loads
+from validation import TYPE_CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    scan_id TEXT,
+    scan_name TEXT,
+    scan_target TEXT,
+    event_type TEXT NOT NULL,
+    module TEXT,
+    data TEXT,
+    source_data TEXT,
+    false_positive INTEGER,
+    last_seen TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_scan_type ON events (scan_id, event_type);
+CREATE INDEX IF NOT EXISTS idx_events_type ON events (event_type);
+CREATE INDEX IF NOT EXISTS idx_events_module ON events (module);
+CREATE INDEX IF NOT EXISTS idx_events_data ON events (data);
+CREATE TABLE IF NOT EXISTS scans (
+    scan_id TEXT PRIMARY KEY,
+    scan_name TEXT,
+    scan_target TEXT,
+    event_count INTEGER,
+    ingested_at REAL
+);
+CREATE TABLE IF NOT EXISTS event_types (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scan_refs (
+    id INTEGER PRIMARY KEY,
+    scan_id TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entities (
+    hash INTEGER PRIMARY KEY,
+    type_id INTEGER NOT NULL,
+    data TEXT,
+    scans BLOB NOT NULL,
+    scan_count INTEGER NOT NULL,
+    first_scan INTEGER NOT NULL,
+    last_scan INTEGER NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entities_first_scan ON entities (first_scan, hash);
+CREATE TABLE IF NOT EXISTS entity_scans (
+    scan_ref INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    PRIMARY KEY (scan_ref, hash)
+) WITHOUT ROWID;
+"""
+
+INSERT_BATCH = 5000
+# Nombre maximal de paramètres par requête SELECT ... IN (...)
+LOOKUP_BATCH = 500
+
+
+def entity_hash(event_type: str, data: Optional[str]) -> int:
+    """Identifiant d'une entité : hash 64 bits signé (clé INTEGER de SQLite) du couple (type, valeur)."""
+    digest = hashlib.blake2b(f"{event_type}\x00{data or ''}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _refs(blob: bytes) -> array:
+    # Liste compacte des scans d'une entité : entiers non signés de 32 bits (ids de scan_refs)
+    refs = array("I")
+    refs.frombytes(blob)
+    return refs
+
+
+def normalize_event_type(value: str) -> str:
+    """Accepte aussi bien MALICIOUS_IPADDR que type_MALICIOUS_IPADDR (noms de TYPESLIST)."""
+    return value[len("type_"):] if value.startswith("type_") else value
+
+
+def event_identity(event: dict) -> Tuple[str, Optional[str]]:
+    """Identité d'une entité : (type normalisé, valeur en texte) d'un événement exporté."""
+    return normalize_event_type(str(event.get("event_type") or event.get("type") or "")), _as_text(event.get("data"))
+
+
+class ScanAttributor:
+    """
+    Retrouve le scan d'origine de chaque événement d'un export multi-scans.
+    SpiderFoot n'exporte que scan_name/scan_target, mais émet les scans dans l'ordre des ids :
+    on avance dans la liste des scans demandés quand le couple (nom, cible) change.
+    Deux scans consécutifs de même nom et même cible restent indiscernables (attribués au premier).
+    """
+
+    def __init__(self, scans: List[Tuple[str, Optional[str], Optional[str]]]):
+        self._scans = scans
+        self._current = 0
+
+    def scan_for(self, event: dict) -> Optional[str]:
+        if len(self._scans) == 1:
+            return self._scans[0][0]
+        pair = (event.get("scan_name"), event.get("scan_target"))
+        count = len(self._scans)
+        for offset in range(count):
+            index = (self._current + offset) % count
+            scan_id, name, target = self._scans[index]
+            if (name, target) == pair:
+                self._current = index
+                return scan_id
+        return None
+
+
+class EventStore:
+    """
+    Stockage local (SQLite) des événements exportés, indexé par scan, type d'événement,
+    module et valeur, pour interroger les résultats sans retélécharger l'export complet.
+    Les fonctions sont synchrones : les appeler via run_in_threadpool depuis les endpoints.
+    """
+
+    def __init__(self, path: str, entities: bool = True, raw_events: bool = True):
+        self.path = path
+        self.entities = entities
+        self.raw_events = raw_events
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # Chaînes internées : nom de type <-> id, scan_id <-> id (tables event_types et scan_refs)
+        self._type_ids: Dict[str, int] = {}
+        self._type_names: Dict[int, str] = {}
+        self._scan_refs: Dict[str, int] = {}
+        self._scan_ids: Dict[int, str] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def init(self):
+        with self._write_lock:
+            conn = self._connection()
+            conn.executescript(SCHEMA)
+            self._link_entity_scans(conn)
+            self._load_interned(conn)
+
+    @staticmethod
+    def _link_entity_scans(conn: sqlite3.Connection):
+        """Base créée avant la table entity_scans : liens scan -> entité reconstruits une fois depuis les listes compactes."""
+        if conn.execute("SELECT 1 FROM entity_scans LIMIT 1").fetchone() or not conn.execute("SELECT 1 FROM entities LIMIT 1").fetchone():
+            return
+        started = time.perf_counter()
+        with conn:
+            links = ((ref, row[0]) for row in conn.execute("SELECT hash, scans FROM entities") for ref in _refs(row[1]))
+            conn.executemany("INSERT OR IGNORE INTO entity_scans (scan_ref, hash) VALUES (?, ?)", links)
+        logger.info(f"event store: entity scan links rebuilt in {time.perf_counter() - started:.2f}s")
+
+    def _load_interned(self, conn: sqlite3.Connection):
+        for mapping in (self._type_ids, self._type_names, self._scan_refs, self._scan_ids):
+            mapping.clear()
+        for row in conn.execute("SELECT id, name FROM event_types"):
+            self._remember_type(row["id"], row["name"])
+        for row in conn.execute("SELECT id, scan_id FROM scan_refs"):
+            self._remember_scan(row["id"], row["scan_id"])
+
+    def _remember_type(self, type_id: int, name: str):
+        name = sys.intern(name)
+        self._type_ids[name] = type_id
+        self._type_names[type_id] = name
+
+    def _remember_scan(self, ref: int, scan_id: str):
+        self._scan_refs[scan_id] = ref
+        self._scan_ids[ref] = scan_id
+
+    def _type_id(self, conn: sqlite3.Connection, name: str) -> int:
+        type_id = self._type_ids.get(name)
+        if type_id is None:
+            conn.execute("INSERT OR IGNORE INTO event_types (name) VALUES (?)", (name,))
+            type_id = conn.execute("SELECT id FROM event_types WHERE name = ?", (name,)).fetchone()[0]
+            self._remember_type(type_id, name)
+        return type_id
+
+    def _scan_ref(self, conn: sqlite3.Connection, scan_id: str) -> int:
+        # Attribués dans l'ordre de première ingestion : sert d'ordre chronologique des scans
+        ref = self._scan_refs.get(scan_id)
+        if ref is None:
+            conn.execute("INSERT OR IGNORE INTO scan_refs (scan_id) VALUES (?)", (scan_id,))
+            ref = conn.execute("SELECT id FROM scan_refs WHERE scan_id = ?", (scan_id,)).fetchone()[0]
+            self._remember_scan(ref, scan_id)
+        return ref
+
+    def ingest(self, events: Iterable[dict], scans: List[Tuple[str, Optional[str], Optional[str]]]) -> int:
+        """
+        Remplace les événements des scans donnés ([(scan_id, nom, cible)]) par ceux de l'export.
+        Un export couvre tous les événements de chaque scan, on peut donc réécrire scan par scan.
+        """
+        conn = self._connection()
+        started = time.perf_counter()
+
+        with self._write_lock:
+            try:
+                counts = self._ingest(conn, events, scans)
+            except BaseException:
+                # Transaction annulée : les ids internés pendant l'ingestion n'existent plus en base
+                self._load_interned(conn)
+                raise
+
+        unattributed = counts.pop(None, 0)
+        if unattributed:
+            logger.warning(f"event store: {unattributed} events without a matching scan were skipped")
+        total = sum(counts.values())
+        logger.info(f"event store: {total} events ingested for {len(scans)} scans in {time.perf_counter() - started:.2f}s")
+        return total
+
+    def _ingest(
+        self,
+        conn: sqlite3.Connection,
+        events: Iterable[dict],
+        scans: List[Tuple[str, Optional[str], Optional[str]]],
+    ) -> Dict[Optional[str], int]:
+        """Corps de ingest, dans une transaction : nombre d'événements par scan (None = non attribués)."""
+        attributor = ScanAttributor(scans)
+        counts: Dict[Optional[str], int] = {}
+        names: Dict[str, Tuple[Optional[str], Optional[str]]] = {scan_id: (name, target) for scan_id, name, target in scans}
+        with conn:
+            conn.executemany("DELETE FROM events WHERE scan_id = ?", [(scan_id,) for scan_id, _, _ in scans])
+            refs = {scan_id: self._scan_ref(conn, scan_id) for scan_id, _, _ in scans} if self.entities else {}
+            # hash -> [type_id, valeur, refs des scans, premier vu, dernier vu], dédupliqué dans l'export
+            sightings: Dict[int, list] = {}
+            batch = []
+            for event in events:
+                scan_id = attributor.scan_for(event)
+                counts[scan_id] = counts.get(scan_id, 0) + 1
+                if scan_id is None:
+                    continue
+                event_type, data = event_identity(event)
+                last_seen = event.get("last_seen")
+                if self.entities:
+                    key = entity_hash(event_type, data)
+                    sighting = sightings.get(key)
+                    if sighting is None:
+                        sightings[key] = [self._type_id(conn, event_type), data, {refs[scan_id]}, last_seen, last_seen]
+                    else:
+                        sighting[2].add(refs[scan_id])
+                        if last_seen and (sighting[3] is None or last_seen < sighting[3]):
+                            sighting[3] = last_seen
+                        if last_seen and (sighting[4] is None or last_seen > sighting[4]):
+                            sighting[4] = last_seen
+                if not self.raw_events:
+                    continue
+                batch.append((
+                    scan_id,
+                    event.get("scan_name"),
+                    event.get("scan_target"),
+                    event_type,
+                    event.get("module"),
+                    data,
+                    _as_text(event.get("source_data")),
+                    int(bool(event.get("false_positive"))),
+                    last_seen,
+                ))
+                if len(batch) >= INSERT_BATCH:
+                    self._insert(conn, batch)
+                    batch = []
+            if batch:
+                self._insert(conn, batch)
+            if sightings:
+                self._merge_entities(conn, sightings)
+
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO scans (scan_id, scan_name, scan_target, event_count, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                [(scan_id, names[scan_id][0], names[scan_id][1], counts.get(scan_id, 0), now) for scan_id in names],
+            )
+        return counts
+
+    def ingest_file(self, path: str, scans: List[Tuple[str, Optional[str], Optional[str]]]) -> int:
+        """Ingestion d'un export écrit sur disque, lu par morceaux (mémoire constante)."""
+        def events():
+            splitter = JSONArraySplitter()
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(64 * 1024)
+                    if not chunk:
+                        break
+                    for item in splitter.feed(chunk):
+                        yield loads(item)
+
+        return self.ingest(events(), scans)
+
+    @staticmethod
+    def _merge_entities(conn: sqlite3.Connection, sightings: Dict[int, list]):
+        """Fusionne les entités vues dans un export avec celles déjà connues (une ligne par entité)."""
+        # Ordre des clés : parcours et insertions séquentiels dans le B-tree des entités
+        keys = sorted(sightings)
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            chunk = keys[start:start + LOOKUP_BATCH]
+            existing = {
+                row["hash"]: row
+                for row in conn.execute(
+                    f"SELECT hash, scans, first_seen, last_seen FROM entities WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+            }
+            rows, links = [], []
+            for key in chunk:
+                type_id, data, seen_in, first_seen, last_seen = sightings[key]
+                row = existing.get(key)
+                if row is None:
+                    refs = array("I", sorted(seen_in))
+                    links.extend((ref, key) for ref in refs)
+                else:
+                    # Réingestion d'un scan (export d'un scan en cours) : ses refs y sont déjà
+                    refs = _refs(row["scans"])
+                    known = set(refs)
+                    added = sorted(ref for ref in seen_in if ref not in known)
+                    refs.extend(added)
+                    links.extend((ref, key) for ref in added)
+                    if row["first_seen"] and (first_seen is None or row["first_seen"] < first_seen):
+                        first_seen = row["first_seen"]
+                    if row["last_seen"] and (last_seen is None or row["last_seen"] > last_seen):
+                        last_seen = row["last_seen"]
+                rows.append((key, type_id, data, refs.tobytes(), len(refs), min(refs), max(refs), first_seen, last_seen))
+            # Upsert plutôt que REPLACE : une entité déjà connue est mise à jour sur place (pas de suppression + insertion)
+            conn.executemany(
+                "INSERT INTO entities (hash, type_id, data, scans, scan_count, first_scan, last_scan, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (hash) DO UPDATE SET "
+                "scans = excluded.scans, scan_count = excluded.scan_count, first_scan = excluded.first_scan, "
+                "last_scan = excluded.last_scan, first_seen = excluded.first_seen, last_seen = excluded.last_seen",
+                rows,
+            )
+            # Index scan -> entités : filtres par scan sans parcourir toute la table des entités
+            conn.executemany("INSERT OR IGNORE INTO entity_scans (scan_ref, hash) VALUES (?, ?)", links)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, batch: list):
+        conn.executemany(
+            "INSERT INTO events (scan_id, scan_name, scan_target, event_type, module, data, source_data, false_positive, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+
+    def query(
+        self,
+        scan_ids: Optional[List[str]] = None,
+        event_types: Optional[List[str]] = None,
+        module: Optional[str] = None,
+        data: Optional[str] = None,
+        include_false_positives: bool = True,
+        limit: int = 100,
+        cursor: int = 0,
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        Événements filtrés, paginés par curseur (id du dernier événement renvoyé).
+        Un type terminé par * est un préfixe (ex : MALICIOUS_*).
+        """
+        where, params = ["id > ?"], [cursor]
+        if scan_ids:
+            where.append(f"scan_id IN ({','.join('?' * len(scan_ids))})")
+            params.extend(scan_ids)
+        if event_types:
+            clauses = []
+            exact = [t for t in event_types if not t.endswith("*")]
+            if exact:
+                clauses.append(f"event_type IN ({','.join('?' * len(exact))})")
+                params.extend(exact)
+            for prefix in (t[:-1] for t in event_types if t.endswith("*")):
+                # Borne haute du préfixe : reste un parcours d'index (contrairement à LIKE)
+                clauses.append("(event_type >= ? AND event_type < ?)")
+                params.extend([prefix, prefix + "\uffff"])
+            where.append(f"({' OR '.join(clauses)})")
+        if module:
+            where.append("module = ?")
+            params.append(module)
+        if data is not None:
+            where.append("data = ?")
+            params.append(data)
+        if not include_false_positives:
+            where.append("false_positive = 0")
+
+        sql = (
+            "SELECT id, scan_id, scan_name, scan_target, event_type, module, data, source_data, false_positive, last_seen "
+            f"FROM events WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+        )
+        params.append(limit)
+        rows = [dict(row) for row in self._connection().execute(sql, params)]
+        next_cursor = rows[-1]["id"] if len(rows) == limit else None
+        return rows, next_cursor
+
+    def summary(self, scan_ids: Optional[List[str]] = None) -> List[dict]:
+        """Nombre d'événements par scan et par type."""
+        sql = "SELECT scan_id, event_type, COUNT(*) AS count FROM events"
+        params: list = []
+        if scan_ids:
+            sql += f" WHERE scan_id IN ({','.join('?' * len(scan_ids))})"
+            params.extend(scan_ids)
+        sql += " GROUP BY scan_id, event_type ORDER BY scan_id, count DESC"
+        return [dict(row) for row in self._connection().execute(sql, params)]
+
+    def scans(self) -> List[dict]:
+        return [dict(row) for row in self._connection().execute("SELECT * FROM scans ORDER BY ingested_at DESC")]
+
+    def _entity_filters(
+        self,
+        scan_ids: Optional[List[str]],
+        event_types: Optional[List[str]],
+        new_since: Optional[str],
+    ) -> Optional[Tuple[List[str], list]]:
+        """Clauses WHERE des requêtes d'entités, ou None si un scan demandé est inconnu (aucun résultat)."""
+        where, params = [], []
+        if scan_ids:
+            refs = [self._scan_refs.get(scan_id) for scan_id in scan_ids]
+            refs = [ref for ref in refs if ref is not None]
+            if not refs:
+                return None
+            # Parcours de la clé (scan_ref, hash) de entity_scans : coût proportionnel aux entités de ces scans
+            where.append(f"hash IN (SELECT hash FROM entity_scans WHERE scan_ref IN ({','.join('?' * len(refs))}))")
+            params.extend(refs)
+        if event_types:
+            type_ids = set()
+            for name in event_types:
+                if name.endswith("*"):
+                    type_ids.update(type_id for type_name, type_id in self._type_ids.items() if type_name.startswith(name[:-1]))
+                elif name in self._type_ids:
+                    type_ids.add(self._type_ids[name])
+            if not type_ids:
+                return None
+            where.append(f"type_id IN ({','.join('?' * len(type_ids))})")
+            params.extend(sorted(type_ids))
+        if new_since is not None:
+            ref = self._scan_refs.get(new_since)
+            if ref is None:
+                return None
+            # Sous-requête sur l'index (first_scan, hash) : sinon ORDER BY hash fait parcourir toute la table
+            where.append("hash IN (SELECT hash FROM entities WHERE first_scan > ?)")
+            params.append(ref)
+        return where, params
+
+    def query_entities(
+        self,
+        scan_ids: Optional[List[str]] = None,
+        event_types: Optional[List[str]] = None,
+        new_since: Optional[str] = None,
+        data: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[int] = None,
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        Entités dédupliquées, paginées par curseur (hash de la dernière entité renvoyée).
+        new_since : seulement les entités découvertes par des scans ingérés après ce scan.
+        """
+        filters = self._entity_filters(scan_ids, event_types, new_since)
+        if filters is None:
+            return [], None
+        where, params = filters
+        if data is not None:
+            where.append("data = ?")
+            params.append(data)
+        if cursor is not None:
+            where.append("hash > ?")
+            params.append(cursor)
+        sql = (
+            "SELECT hash, type_id, data, scans, scan_count, first_scan, last_scan, first_seen, last_seen FROM entities"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY hash LIMIT ?"
+        )
+        params.append(limit)
+        entities = [
+            {
+                "id": row["hash"],
+                "event_type": self._type_names.get(row["type_id"]),
+                "data": row["data"],
+                "scan_count": row["scan_count"],
+                "scans": [self._scan_ids.get(ref) for ref in _refs(row["scans"])],
+                "first_scan": self._scan_ids.get(row["first_scan"]),
+                "last_scan": self._scan_ids.get(row["last_scan"]),
+                "first_seen": row["first_seen"],
+                "last_seen": row["last_seen"],
+            }
+            for row in self._connection().execute(sql, params)
+        ]
+        next_cursor = entities[-1]["id"] if len(entities) == limit else None
+        return entities, next_cursor
+
+    def entity_summary(
+        self,
+        scan_ids: Optional[List[str]] = None,
+        event_types: Optional[List[str]] = None,
+        new_since: Optional[str] = None,
+    ) -> dict:
+        """Nombre d'entités par type, et d'entités découvertes par chaque scan (premier scan où elles apparaissent)."""
+        filters = self._entity_filters(scan_ids, event_types, new_since)
+        if filters is None:
+            return {"entity_count": 0, "by_type": {}, "new_by_scan": {}}
+        where, params = filters
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        conn = self._connection()
+        by_type = {
+            self._type_names.get(row[0]): row[1]
+            for row in conn.execute(f"SELECT type_id, COUNT(*) FROM entities{clause} GROUP BY type_id ORDER BY 2 DESC", params)
+        }
+        new_by_scan = {
+            self._scan_ids.get(row[0]): row[1]
+            for row in conn.execute(f"SELECT first_scan, COUNT(*) FROM entities{clause} GROUP BY first_scan ORDER BY first_scan", params)
+        }
+        return {"entity_count": sum(by_type.values()), "by_type": by_type, "new_by_scan": new_by_scan}
+
+
+def expand_event_types(types: Optional[List[str]], category: Optional[str]) -> Optional[List[str]]:
+    """Types demandés (noms SpiderFoot, type_*, préfixes *) complétés par une catégorie de TYPE_CATEGORIES."""
+    result = [normalize_event_type(t) for t in types or []]
+    if category:
+        if category not in TYPE_CATEGORIES:
+            raise ValueError(f"category must be in [{list(TYPE_CATEGORIES.keys())}]")
+        result.extend(normalize_event_type(t) for t in TYPE_CATEGORIES[category])
+    return result or None
+
+
+def _as_text(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+# Instance globale partagée par les endpoints
+event_store = EventStore(
+    settings.event_store_path,
+    entities=settings.event_store_entities,
+    raw_events=settings.event_store_raw_events,
+)
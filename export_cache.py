@@ -0,0 +1,288 @@
+# export_cache.py
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    path: str
+    etag: str
+    last_modified: float
+    size: int
+    event_count: int
+    ids: List[str] = field(default_factory=list)
+    # Taille des fichiers dérivés (csv, parquet...), relue sur le disque : hors du fichier meta
+    derived_size: int = 0
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": formatdate(self.last_modified, usegmt=True),
+            "Cache-Control": "private, max-age=0, must-revalidate",
+        }
+
+    def to_meta(self) -> dict:
+        return {
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "size": self.size,
+            "event_count": self.event_count,
+            "ids": self.ids,
+        }
+
+
+# Extensions des fichiers dérivés d'un export (voir columnar_export.py)
+DERIVED_FORMATS = ("csv", "parquet", "arrow")
+# Fichier temporaire d'une écriture dans le cache ({clé}.{extension}.<suffixe>.part)
+PART_FILE = re.compile(r"^[0-9a-f]{64}\.(json|meta\.json|csv|parquet|arrow)\.[0-9a-f]+\.part$")
+# Un fichier temporaire non modifié depuis ce délai est abandonné (arrêt ou requête annulée avant le renommage)
+STALE_PART_SECONDS = 600
+
+
+def make_etag(digest: str) -> str:
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """If-None-Match (liste d'ETags ou *) contre un ETag, en comparaison faible (RFC 9110) : le préfixe W/ est ignoré."""
+    if not if_none_match or not etag:
+        return False
+    etag = etag[2:] if etag.startswith("W/") else etag
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+
+def not_modified(request_headers, entry: CacheEntry) -> bool:
+    """Évalue If-None-Match (prioritaire) puis If-Modified-Since contre une entrée du cache."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(if_none_match, entry.etag)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(entry.last_modified) <= since
+    return False
+
+
+class ExportCache:
+    """
+    Cache disque des exports multi-scans, adressé par l'ensemble trié des ids de scan.
+    Seuls les exports dont tous les scans sont terminés y entrent (leurs résultats ne
+    changent plus). Budget en taille et en âge, éviction LRU ; les fichiers dérivés d'une
+    entrée (conversions colonnaires) comptent dans sa taille et partent avec elle.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._total_bytes = 0
+        self._loaded = False
+
+    @staticmethod
+    def key_for(ids: List[str]) -> str:
+        return hashlib.sha256(",".join(sorted(set(ids))).encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def derived_path(self, key: str, fmt: str) -> str:
+        """Fichier dérivé de l'export (ex : conversion csv / parquet), supprimé avec l'entrée."""
+        return os.path.join(self.directory, f"{key}.{fmt}")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.meta.json")
+
+    def load(self):
+        """Reconstruit l'index LRU depuis le disque (date d'accès = mtime du fichier meta)."""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        names = os.listdir(self.directory)
+        for name in names:
+            if not name.endswith(".meta.json"):
+                continue
+            key = name[: -len(".meta.json")]
+            entry = self._read_entry(key)
+            if entry is not None:
+                found.append((os.path.getmtime(self._meta_path(key)), entry))
+        # Fichiers dérivés d'une entrée disparue (évincée pendant la conversion) : jamais servis
+        for name in names:
+            key, _, fmt = name.partition(".")
+            if fmt in DERIVED_FORMATS and not os.path.exists(self._meta_path(key)):
+                self._unlink(os.path.join(self.directory, name))
+        # Fichiers temporaires abandonnés : hors du budget, ils ne seraient jamais supprimés. Les écritures
+        # en cours (autre worker) modifient leur fichier en continu et ne sont pas touchées.
+        cutoff = time.time() - STALE_PART_SECONDS
+        for name in names:
+            if PART_FILE.match(name):
+                path = os.path.join(self.directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        logger.info(f"export cache: stale temporary file removed: {name}")
+                except OSError:
+                    pass
+        for accessed, entry in sorted(found, key=lambda item: item[0]):
+            self._add(entry, accessed)
+        self._loaded = True
+        # Comme à l'enregistrement, l'entrée la plus récente reste même si elle dépasse seule le budget
+        self._evict(keep=next(reversed(self._entries), None))
+        logger.info(f"export cache loaded: {len(self._entries)} entries, {self._total_bytes} bytes")
+
+    def _read_entry(self, key: str) -> Optional[CacheEntry]:
+        path = self.path_for(key)
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(path):
+            return None
+        entry = CacheEntry(key=key, path=path, **meta)
+        entry.derived_size = self._derived_size(key)
+        return entry
+
+    def _derived_size(self, key: str) -> int:
+        size = 0
+        for fmt in DERIVED_FORMATS:
+            try:
+                size += os.path.getsize(self.derived_path(key, fmt))
+            except OSError:
+                pass
+        return size
+
+    def _add(self, entry: CacheEntry, accessed: float):
+        old = self._entries.pop(entry.key, None)
+        if old is not None:
+            self._total_bytes -= old.size + old.derived_size
+        self._entries[entry.key] = entry
+        self._last_access[entry.key] = accessed
+        self._total_bytes += entry.size + entry.derived_size
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        if not self._loaded:
+            self.load()
+        entry = self._entries.get(key)
+        if entry is None:
+            # Un autre worker a peut-être déjà rempli le cache
+            entry = self._read_entry(key)
+            if entry is None:
+                return None
+            self._add(entry, time.time())
+        now = time.time()
+        if self.max_age and now - self._last_access[key] > self.max_age:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        self._last_access[key] = now
+        try:
+            os.utime(self._meta_path(key), (now, now))
+        except OSError:
+            pass
+        return entry
+
+    def store(self, key: str, ids: List[str], tmp_path: str, digest: str, size: int, event_count: int) -> CacheEntry:
+        """Enregistre un export déjà écrit dans tmp_path (renommé atomiquement dans le cache)."""
+        if not self._loaded:
+            self.load()
+        path = self.path_for(key)
+        os.replace(tmp_path, path)
+        entry = CacheEntry(
+            key=key,
+            path=path,
+            etag=make_etag(digest),
+            last_modified=time.time(),
+            size=size,
+            event_count=event_count,
+            ids=sorted(set(ids)),
+        )
+        # Noms temporaires uniques : deux requêtes peuvent remplir la même clé en même temps
+        meta_tmp = f"{self._meta_path(key)}.{secrets.token_hex(4)}.part"
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump(entry.to_meta(), f)
+        os.replace(meta_tmp, self._meta_path(key))
+        self._add(entry, entry.last_modified)
+        self._evict(keep=key)
+        logger.info(f"export cached: {key} ({size} bytes, {event_count} events)")
+        return entry
+
+    def store_bytes(self, key: str, ids: List[str], content: bytes, event_count: int) -> CacheEntry:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path_for(key)}.{secrets.token_hex(4)}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        digest = hashlib.sha256(content).hexdigest()
+        return self.store(key, ids, tmp_path, digest, len(content), event_count)
+
+    def update_derived(self, key: str):
+        """Recompte les fichiers dérivés d'une entrée (après une conversion) puis applique le budget."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        size = self._derived_size(key)
+        self._total_bytes += size - entry.derived_size
+        entry.derived_size = size
+        # L'entrée vient d'être convertie pour être servie : jamais évincée par son propre recomptage
+        self._evict(keep=key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        self._last_access.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry.size + entry.derived_size
+        derived = [self.derived_path(key, fmt) for fmt in DERIVED_FORMATS]
+        for path in [entry.path, self._meta_path(key)] + derived:
+            self._unlink(path)
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self, keep: Optional[str] = None):
+        """
+        Applique les budgets d'âge et de taille, sans toucher à keep (entrée que l'appelant va servir).
+        Une entrée en cours d'envoi peut être évincée : ses fichiers sont lus par des descripteurs
+        ouverts avant la réponse (iter_file, ranged_file_response), que la suppression n'interrompt pas.
+        """
+        now = time.time()
+        if self.max_age:
+            for key in [k for k, accessed in self._last_access.items() if now - accessed > self.max_age and k != keep]:
+                self._remove(key)
+        while self.max_bytes and self._total_bytes > self.max_bytes:
+            oldest = next((key for key in self._entries if key != keep), None)
+            if oldest is None:
+                break
+            logger.info(f"export cache eviction: {oldest}")
+            self._remove(oldest)
+
+
+# Instance globale partagée par les endpoints
+export_cache = ExportCache(
+    directory=settings.export_cache_dir,
+    max_bytes=settings.export_cache_max_bytes,
+    max_age=settings.export_cache_max_age,
+)
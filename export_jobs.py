@@ -0,0 +1,348 @@
+# export_jobs.py
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+import secrets
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Fichiers d'un job : export ({id}.json), métadonnées ({id}.meta.json), demande d'annulation
+# ({id}.cancel), et leurs fichiers temporaires ({nom}.<suffixe>.part)
+JOB_FILE = re.compile(r"^[0-9a-f]{32}\.(json|meta\.json|cancel)(\.[0-9a-f]+\.part)?$")
+JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+# Intervalle d'écriture des métadonnées d'un job en cours (progression vue des autres processus)
+META_INTERVAL = 2.0
+
+
+class ExportJobLimitError(Exception):
+    """Trop de jobs d'export conservés : le client doit attendre l'expiration des plus anciens."""
+
+
+class ExportJob:
+    """Export demandé via POST /exports, exécuté en tâche de fond puis téléchargeable jusqu'à expiration."""
+
+    def __init__(self, ids: List[str], directory: str):
+        self.id = uuid.uuid4().hex
+        self.ids = ids
+        self.path = os.path.join(directory, f"{self.id}.json")
+        self.state = "queued"  # queued, running, done, failed, cancelled
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.expires_at: Optional[float] = None
+        # Progression, mise à jour par le producteur au fil de l'écriture
+        self.bytes_written = 0
+        self.total_bytes: Optional[int] = None
+        self.event_count = 0
+        self.etag: Optional[str] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Future] = None
+
+    @classmethod
+    def from_meta(cls, meta: dict, directory: str) -> "ExportJob":
+        """Job relu depuis son fichier {id}.meta.json (créé par un autre processus)."""
+        job = cls(meta["scan_ids"], directory)
+        job.id = meta["job_id"]
+        job.path = os.path.join(directory, f"{job.id}.json")
+        for name in ("state", "created_at", "started_at", "finished_at", "expires_at", "etag", "error"):
+            setattr(job, name, meta.get(name))
+        progress = meta.get("progress") or {}
+        job.bytes_written = progress.get("bytes") or 0
+        job.total_bytes = progress.get("total_bytes")
+        job.event_count = progress.get("events") or 0
+        return job
+
+    @property
+    def meta_path(self) -> str:
+        return f"{self.path[:-len('.json')]}.meta.json"
+
+    @property
+    def cancel_path(self) -> str:
+        return f"{self.path[:-len('.json')]}.cancel"
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "scan_ids": self.ids,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.expires_at,
+            "progress": {
+                "bytes": self.bytes_written,
+                "total_bytes": self.total_bytes,
+                "events": self.event_count,
+                "elapsed_seconds": round(end - self.started_at, 3) if self.started_at else None,
+            },
+            "etag": self.etag,
+            "download_url": f"/exports/{self.id}/download" if self.state == "done" else None,
+            "error": self.error,
+        }
+
+
+class ExportJobManager:
+    """
+    Exports en tâche de fond : POST /exports répond tout de suite avec un job, un pool borné
+    de workers récupère et écrit les exports (au plus workers à la fois, les autres attendent
+    dans la file). Les jobs terminés, et leur fichier, sont supprimés ttl secondes après la fin.
+    Deux demandes des mêmes scans pendant qu'un job est en file ou en cours partagent ce job.
+    Le répertoire peut être partagé par plusieurs processus (workers uvicorn) : l'état de chaque
+    job est écrit dans {id}.meta.json, relu par les autres processus pour le consulter, le lister,
+    le télécharger ou l'annuler (fichier {id}.cancel, pris en compte par le processus qui l'exécute).
+    Seuls les fichiers de job inactifs depuis plus de ttl secondes et inconnus de ce gestionnaire
+    sont supprimés comme orphelins.
+    """
+
+    def __init__(self, directory: str, workers: int, ttl: float, max_jobs: int):
+        self.directory = directory
+        self.workers = workers
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._produce: Optional[Callable[[ExportJob], Awaitable[str]]] = None
+        self._jobs: Dict[str, ExportJob] = {}
+        self._pending: Dict[tuple, ExportJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    async def start(self, produce: Callable[[ExportJob], Awaitable[str]]):
+        """produce(job) écrit l'export dans job.path et renvoie son ETag."""
+        self._produce = produce
+        if self._tasks:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_orphans()
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+        logger.info(f"export jobs started ({self.workers} workers, ttl {self.ttl}s)")
+
+    async def stop(self):
+        if self._tasks:
+            self._stopping = True
+            for job in self._jobs.values():
+                if job.task is not None:
+                    job.task.cancel()
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            logger.info("export jobs stopped")
+
+    def submit(self, ids: List[str]) -> ExportJob:
+        key = tuple(sorted(set(ids)))
+        job = self._pending.get(key)
+        if job is not None:
+            return job
+        self._expire()
+        if len(self._jobs) >= self.max_jobs:
+            raise ExportJobLimitError(f"{len(self._jobs)} jobs d'export conservés (maximum {self.max_jobs})")
+        job = ExportJob(ids, self.directory)
+        self._jobs[job.id] = job
+        self._pending[key] = job
+        self._save(job)
+        self._queue.put_nowait(job)
+        logger.info(f"export job queued: {job.id} ({len(ids)} scans)")
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._load(job_id)
+        elif job.finished and not os.path.exists(job.meta_path):
+            # Supprimé via un autre processus (DELETE /exports/{id})
+            self._remove(job)
+            return None
+        if job is not None and job.expires_at is not None and time.time() >= job.expires_at:
+            self._remove(job)
+            return None
+        return job
+
+    def list(self, limit: int = 100) -> List[dict]:
+        self._expire()
+        jobs = dict(self._jobs)
+        for name in self._list_directory():
+            job_id = name[:-len(".meta.json")] if name.endswith(".meta.json") else None
+            if job_id is not None and JOB_ID.match(job_id) and job_id not in jobs:
+                job = self._load(job_id)
+                if job is not None and (job.expires_at is None or time.time() < job.expires_at):
+                    jobs[job_id] = job
+        ordered = sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)
+        return [job.to_dict() for job in ordered[:limit]]
+
+    def position(self, job: ExportJob) -> Optional[int]:
+        """Nombre de jobs en file devant celui-ci (None pour un job d'un autre processus : file inconnue)."""
+        if job.state != "queued" or job.id not in self._jobs:
+            return None
+        return sum(1 for other in self._jobs.values() if other.state == "queued" and other.created_at < job.created_at)
+
+    def cancel(self, job_id: str) -> Optional[ExportJob]:
+        """Annule un job en file ou en cours ; un job terminé est supprimé avec son fichier."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.finished:
+            self._remove(job)
+        elif job.id not in self._jobs:
+            # Job exécuté par un autre processus : il l'annule en voyant ce fichier
+            _write(job.cancel_path, b"")
+        elif job.state == "queued":
+            # Suppression paresseuse : le job est ignoré quand un worker le sort de la file
+            self._finish(job, "cancelled")
+        elif job.task is not None:
+            job.task.cancel()
+        return job
+
+    def _finish(self, job: ExportJob, state: str, error: Optional[str] = None):
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        job.expires_at = job.finished_at + self.ttl
+        self._pending.pop(tuple(sorted(set(job.ids))), None)
+        if state != "done":
+            _discard(job.path)
+        _discard(job.cancel_path)
+        self._save(job)
+
+    def _remove(self, job: ExportJob):
+        self._jobs.pop(job.id, None)
+        if job.task is not None:
+            job.task.cancel()
+        for path in (job.path, job.meta_path, job.cancel_path):
+            _discard(path)
+
+    def _save(self, job: ExportJob):
+        _write(job.meta_path, json.dumps(job.to_dict()).encode("utf-8"))
+
+    def _load(self, job_id: str) -> Optional[ExportJob]:
+        if not JOB_ID.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{job_id}.meta.json"), "rb") as f:
+                return ExportJob.from_meta(json.load(f), self.directory)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"export jobs: unreadable metadata for {job_id} ({e})")
+            return None
+
+    def _list_directory(self) -> List[str]:
+        try:
+            return os.listdir(self.directory)
+        except OSError as e:
+            logger.warning(f"export jobs: unable to list {self.directory} ({e})")
+            return []
+
+    def _expire(self):
+        now = time.time()
+        for job in [job for job in self._jobs.values() if job.expires_at is not None and now >= job.expires_at]:
+            self._remove(job)
+            logger.info(f"export job expired: {job.id}")
+
+    def _remove_orphans(self):
+        """Fichiers laissés par un processus arrêté (les jobs ne survivent pas à un redémarrage)."""
+        cutoff = time.time() - self.ttl
+        for name in self._list_directory():
+            if not JOB_FILE.match(name) or name.split(".", 1)[0] in self._jobs:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                # ctime : un fichier lié depuis le cache d'exports garde le mtime de l'entrée du cache
+                if max(stat.st_mtime, stat.st_ctime) < cutoff:
+                    os.remove(path)
+                    logger.info(f"export jobs: orphan file removed: {name}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"export jobs: unable to remove {name} ({e})")
+
+    async def _sweeper(self):
+        # Les jobs expirés sont aussi écartés à la lecture ; ici on libère le disque
+        while not self._stopping:
+            await asyncio.sleep(min(max(self.ttl / 2, 1.0), 60.0))
+            self._expire()
+            # Métadonnées des jobs en file réécrites : les autres processus ne les prennent pas pour des orphelins
+            for job in list(self._jobs.values()):
+                if job.state == "queued":
+                    self._save(job)
+            self._remove_orphans()
+
+    async def _worker(self):
+        while not self._stopping:
+            job = await self._queue.get()
+            if job.state != "queued":
+                continue
+            if os.path.exists(job.cancel_path):
+                self._finish(job, "cancelled")
+                continue
+            job.state = "running"
+            job.started_at = time.time()
+            job.task = asyncio.ensure_future(self._produce(job))
+            try:
+                # Progression publiée pour les autres processus ; annulation demandée par l'un d'eux
+                while not (await asyncio.wait({job.task}, timeout=META_INTERVAL))[0]:
+                    self._save(job)
+                    if os.path.exists(job.cancel_path):
+                        job.task.cancel()
+                job.etag = job.task.result()
+                self._finish(job, "done")
+                logger.info(f"export job done: {job.id} ({job.bytes_written} bytes, {job.event_count} events)")
+            except asyncio.CancelledError:
+                self._finish(job, "cancelled")
+                if self._stopping:
+                    raise
+                logger.info(f"export job cancelled: {job.id}")
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+                self._finish(job, "failed", str(detail))
+                logger.warning(f"export job failed: {job.id} ({detail})")
+            finally:
+                job.task = None
+
+
+def _write(path: str, content: bytes):
+    # Nom temporaire propre à cette écriture, puis renommage : un lecteur ne voit jamais un fichier partiel
+    tmp_path = f"{path}.{secrets.token_hex(4)}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"export jobs: unable to write {path} ({e})")
+        _discard(tmp_path)
+
+
+def _discard(path: str):
+    # Fichier du job et fichier temporaire éventuel de StreamingExport ({path}.<suffixe>.part)
+    for candidate in [path] + glob.glob(f"{glob.escape(path)}.*.part"):
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"export jobs: unable to remove {candidate} ({e})")
+
+
+# Instance globale partagée par les endpoints
+export_jobs = ExportJobManager(
+    settings.export_jobs_dir,
+    workers=settings.export_jobs_workers,
+    ttl=settings.export_jobs_ttl,
+    max_jobs=settings.export_jobs_max,
+)
@@ -0,0 +1,262 @@
+# export_stream.py
+import hashlib
+import logging
+import os
+import re
+import secrets
+from typing import AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple
+
+import httpx
+from starlette.responses import Response, StreamingResponse
+
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Caractères structurants d'un document JSON (tout le reste est sauté par la regex)
+_TOKEN = re.compile(rb'[\[\]{}",\\]')
+
+STREAM_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class JSONArraySplitter:
+    """
+    Découpe incrémentalement un tableau JSON en ses éléments de premier niveau.
+    Seul l'élément en cours est gardé en mémoire : la consommation reste constante
+    quelle que soit la taille de l'export.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._seg_start = 0
+        self.count = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        items = []
+        buf = self._buf
+        pos = len(buf)
+        buf += chunk
+
+        # Échappement coupé entre deux chunks : on saute le caractère échappé
+        if self._escape and pos < len(buf):
+            self._escape = False
+            pos += 1
+
+        while True:
+            m = _TOKEN.search(buf, pos)
+            if m is None:
+                break
+            i = m.start()
+            c = buf[i]
+            pos = i + 1
+
+            if self._in_string:
+                if c == 0x5C:  # backslash
+                    if pos < len(buf):
+                        pos += 1
+                    else:
+                        self._escape = True
+                elif c == 0x22:  # guillemet fermant
+                    self._in_string = False
+                continue
+
+            if c == 0x22:
+                self._in_string = True
+            elif c in (0x5B, 0x7B):  # [ {
+                self._depth += 1
+                if self._depth == 1:
+                    self._seg_start = pos
+            elif c in (0x5D, 0x7D):  # ] }
+                if self._depth == 1:
+                    self._emit(buf, i, items)
+                self._depth -= 1
+            elif c == 0x2C and self._depth == 1:  # ,
+                self._emit(buf, i, items)
+                self._seg_start = pos
+
+        # Libérer tout ce qui précède l'élément en cours
+        keep_from = self._seg_start if self._depth >= 1 else len(buf)
+        if keep_from:
+            del buf[:keep_from]
+            self._seg_start = 0
+        return items
+
+    def _emit(self, buf: bytearray, end: int, items: List[bytes]):
+        item = bytes(buf[self._seg_start:end]).strip()
+        if item:
+            items.append(item)
+            self.count += 1
+
+
+class StreamingExport:
+    """
+    Relaie le corps d'un export SpiderFoot chunk par chunk vers le client (tableau JSON
+    ou NDJSON) tout en l'écrivant sur disque dans la même passe.
+    on_complete(tmp_path, sha256, taille, nb_events) permet de déplacer le fichier final
+    ailleurs (ex : cache des exports) ; par défaut il est renommé en file_path.
+    """
+
+    def __init__(
+        self,
+        response: httpx.Response,
+        file_path: str,
+        fmt: str = "json",
+        on_complete: Optional[Callable[[str, str, int, int], None]] = None,
+    ):
+        self.response = response
+        self.file_path = file_path
+        self.fmt = fmt
+        self.on_complete = on_complete
+        self.splitter = JSONArraySplitter()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    @property
+    def event_count(self) -> int:
+        return self.splitter.count
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        # Nom temporaire propre à cet export : deux exports simultanés des mêmes scans n'écrivent pas le même fichier
+        tmp_path = f"{self.file_path}.{secrets.token_hex(4)}.part"
+        completed = False
+        try:
+            with open(tmp_path, "wb") as f:
+                async for chunk in self.response.aiter_bytes():
+                    f.write(chunk)
+                    self.sha256.update(chunk)
+                    self.size += len(chunk)
+                    items = self.splitter.feed(chunk)
+                    if self.fmt == "ndjson":
+                        if items:
+                            yield b"".join(_ndjson_line(item) for item in items)
+                    else:
+                        yield chunk
+            if self.on_complete is not None:
+                self.on_complete(tmp_path, self.sha256.hexdigest(), self.size, self.event_count)
+            else:
+                os.replace(tmp_path, self.file_path)
+            completed = True
+            logger.info(f"export streamed to {self.file_path} ({self.event_count} events)")
+        finally:
+            await self.response.aclose()
+            if not completed:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+
+
+def iter_file(
+    path: str, chunk_size: int = 64 * 1024, start: int = 0, length: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Contenu du fichier par morceaux ; start / length limitent la lecture à une plage d'octets.
+    Le fichier est ouvert dès l'appel, pas à la première lecture : supprimé ensuite (éviction
+    du cache par une autre requête), il reste lisible jusqu'au bout par ce descripteur.
+    """
+    return _iter_open_file(open(path, "rb"), chunk_size, start, length)
+
+
+async def _iter_open_file(f, chunk_size: int, start: int, length: Optional[int]) -> AsyncIterator[bytes]:
+    remaining = length
+    with f:
+        if start:
+            f.seek(start)
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    En-tête Range "bytes=début-fin" -> (début, fin incluse), bornée à la taille du fichier.
+    None si l'en-tête est ignoré (autre unité, plages multiples, syntaxe invalide) : le fichier
+    entier est alors renvoyé. RangeNotSatisfiable si la plage est hors du fichier (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            # Suffixe : les n derniers octets
+            suffix = int(last)
+            if suffix < 0:
+                return None
+            if suffix == 0 or size == 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end < start):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def ranged_file_response(
+    request_headers: Mapping[str, str], path: str, media_type: str, headers: Dict[str, str]
+) -> Response:
+    """
+    Fichier servi en flux avec prise en charge des requêtes Range (une seule plage), pour
+    reprendre un téléchargement interrompu. If-Range est comparé à l'ETag ou au Last-Modified
+    de headers : si le fichier a changé, il est renvoyé en entier.
+    """
+    # Ouvert avant de répondre : taille et contenu restent ceux de ce fichier même s'il est supprimé entre-temps
+    f = open(path, "rb")
+    size = os.fstat(f.fileno()).st_size
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if range_header and (if_range is None or if_range in (headers.get("ETag"), headers.get("Last-Modified"))):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            f.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            return StreamingResponse(
+                _iter_open_file(f, 64 * 1024, start, end - start + 1),
+                status_code=206,
+                media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)},
+            )
+    return StreamingResponse(
+        _iter_open_file(f, 64 * 1024, 0, None), media_type=media_type, headers={**headers, "Content-Length": str(size)}
+    )
+
+
+async def to_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Convertit un flux de tableau JSON en NDJSON, élément par élément."""
+    splitter = JSONArraySplitter()
+    async for chunk in chunks:
+        items = splitter.feed(chunk)
+        if items:
+            yield b"".join(_ndjson_line(item) for item in items)
+
+
+def _ndjson_line(item: bytes) -> bytes:
+    # Un export indenté peut contenir des retours à la ligne : on recompacte l'élément
+    if b"\n" in item or b"\r" in item:
+        item = dumps(loads(item))
+    return item + b"\n"
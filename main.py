@@ -1,17 +1,35 @@
-from fastapi import FastAPI, HTTPException
 from fastapi.security import APIKeyHeader
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import logging
-import os, requests, json
-from fastapi import FastAPI, HTTPException, Query ,Security ,Depends
-from typing import List
-from validation import ScanRequest, TYPESLIST
+import os, httpx, asyncio, functools, math, shutil
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query ,Security ,Depends, Request, Response
+from typing import AsyncIterator, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from validation import ExportRequest, ProfilingSettings, ScanRequest, StatusBatchRequest, plan_scan
 from config.config import settings
-
-from requests.auth import HTTPDigestAuth
+from spiderfoot_client import TERMINAL_STATUSES, scan_state
+from spiderfoot_pool import spiderfoot
+from export_stream import StreamingExport, STREAM_MEDIA_TYPES, iter_file, ranged_file_response, to_ndjson
+from export_cache import export_cache, CacheEntry, etag_matches, make_etag, not_modified
+from export_jobs import ExportJob, ExportJobLimitError, export_jobs
+from status_monitor import status_monitor
+from swr_cache import StaleWhileRevalidateCache
+from event_store import event_store, expand_event_types
+from delta_export import delta_tracker
+from scan_diff import scan_differ
+from columnar_export import ColumnarExport, MEDIA_TYPES as COLUMNAR_MEDIA_TYPES, available_formats
+from scan_scheduler import scan_scheduler
+from resilience import CircuitOpenError
+from metrics import MetricsMiddleware, registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from compression import CompressionMiddleware
+from serialization import FastJSONResponse, envelope_response, loads, negotiated_response
 
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 from auth import authenticate_basic_auth  # Importez la fonction d'auth
+from api_keys import RateLimitMiddleware, keyring
+from tracing import Span, TracingMiddleware
+from profiling import profiler
 
 
 
@@ -27,6 +45,27 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un seul pool de connexions vers SpiderFoot pour toute la durée de vie de l'app
+    await spiderfoot.start()
+    export_cache.load()
+    if settings.event_store_enabled:
+        event_store.init()
+    # Une instance du pool est libérée dès qu'un de ses scans se termine
+    status_monitor.add_listener(spiderfoot.on_scan_status)
+    await status_monitor.start()
+    await scan_scheduler.start(submit_scan)
+    await export_jobs.start(produce_export)
+    try:
+        yield
+    finally:
+        await export_jobs.stop()
+        await scan_scheduler.stop()
+        await status_monitor.stop()
+        await spiderfoot.close()
+
+
 app = FastAPI(
     title="SpiderFoot API Wrapper",
     description="Une API pour interagir avec SpiderFoot via son API REST.",
@@ -34,17 +73,47 @@ app = FastAPI(
     contact= { "name": "Vullify"},
     docs_url=None,  # Désactive la route docs par défaut
     redoc_url=None, # Désactive la route redoc par défaut
+    lifespan=lifespan,
+    # Encodage orjson pour toutes les réponses JSON
+    default_response_class=FastJSONResponse,
 )
 
+# En-têtes RateLimit-* et libération du créneau de la clé API en fin de réponse
+app.add_middleware(RateLimitMiddleware)
+
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.gzip_level,
+        zstd_level=settings.zstd_level,
+    )
+
+# Ajouté après la compression pour mesurer les octets réellement envoyés
+if settings.metrics_enabled:
+    # Nombre, durée et taille des requêtes par route, exposés sur /metrics
+    app.add_middleware(MetricsMiddleware)
+
+# Ajouté en dernier (le plus à l'extérieur) : la trace couvre toute la requête, compression comprise
+if settings.tracing_enabled:
+    # Phases de chaque requête dans Server-Timing, profils CPU à la demande (voir tracing.py)
+    app.add_middleware(TracingMiddleware, profiler=profiler, log_min_ms=settings.tracing_log_min_ms)
 
-API_KEY = settings.spiderfoot_api_key #os.getenv("SPIDERFOOT_API_KEY")
-BASE_URL = settings.spiderfoot_base_url #os.getenv("SPIDERFOOT_BASE_URL")
-username = settings.user_name #os.getenv("USER_NAME")
-password = settings.password #os.getenv("PASSWORD")
 
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    # SpiderFoot jugé indisponible : échec immédiat, le client sait quand réessayer
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
 
-# Si ton SpiderFoot est protégé par authentification HTTPDigest
-AUTH = HTTPDigestAuth(username, password)  # adapte login/pass selon ton cas
+
+# Clés API acceptées : voir api_keys.py (SPIDERFOOT_API_KEY et API_KEYS, stockées hachées)
+
+# L'URL de SpiderFoot et l'authentification HTTPDigest sont portées par le client partagé
+# (voir spiderfoot_client.py)
 
 
 
@@ -52,12 +121,30 @@ AUTH = HTTPDigestAuth(username, password)  # adapte login/pass selon ton cas
 
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False,description="Clé API pour authentification")
 
-def get_api_key(api_key: str = Security(api_key_header)):
+async def get_api_key(request: Request, api_key: str = Security(api_key_header)):
     if not api_key:
         raise HTTPException(status_code=401, detail="Clé API manquante")
-    
-    if api_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Clé API invalide")
+
+    with Span("auth"):
+        client = keyring.lookup(api_key)
+        if client is None:
+            raise HTTPException(status_code=403, detail="Clé API invalide")
+        # Seau de requêtes et requêtes en cours de la clé (429 au-delà)
+        keyring.admit(client, request.state)
+    return client.name
+
+
+async def get_profiling_key(request: Request, api_key: str = Security(get_api_key)):
+    """Clé API autorisée au profilage (profile=true dans API_KEYS)."""
+    if not request.state.api_client.profile:
+        raise HTTPException(status_code=403, detail="Clé API non autorisée pour le profilage")
+    return api_key
+
+
+async def get_event_store_key(api_key: str = Security(get_api_key)):
+    """Clé API des routes de l'event store ; 503 si le stockage est désactivé (tables jamais créées)."""
+    if not settings.event_store_enabled:
+        raise HTTPException(status_code=503, detail="Stockage des événements désactivé (EVENT_STORE_ENABLED=false)")
     return api_key
 
 
@@ -79,82 +166,460 @@ async def get_open_api_endpoint(username: str = Depends(authenticate_basic_auth)
     from main import app
     return app.openapi()
 
+
+def parse_modules(request: ScanRequest) -> List[str]:
+    # Gestion flexible des modules
+    return (
+        request.modules if isinstance(request.modules, list)
+        else request.modules.split(",") if isinstance(request.modules, str) and request.modules.strip()
+        else []
+    )
+
+
+async def submit_scan(request: ScanRequest) -> dict:
+    """Envoie un scan à SpiderFoot (/startscan) et construit la réponse de l'API."""
+    with Span("plan"):
+        plan = plan_scan(request.target, parse_modules(request), request.plan)
+
+    # Préparer les données pour SpiderFoot API
+    payload = {
+        "scanname": request.scan_name,
+        "scantarget": request.target,
+        "usecase": request.use_case,
+        "modulelist": plan.modulelist,
+        "typelist": plan.typelist
+    }
+
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/x-www-form-urlencoded"
+    }
+
+    # Faire la requête POST à SpiderFoot
+    response = await spiderfoot.post("/startscan", data=payload, headers=headers)
+    logger.info("scan started")
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
+
+    logger.info("scan started successfully")
+    scan_list_cache.invalidate()
+
+    return {
+        "status": "success",
+        "scan_name": request.scan_name,
+        "target": request.target,
+        "modules": list(plan.modules),
+        "plan": plan.to_dict(),
+        "spiderfoot_response": response.json()
+    }
+
+
 #endpoint pour lancer un scan
 @app.post("/scan")
-def run_spiderfoot(request: ScanRequest, api_key: str=Security(get_api_key)):
+async def run_spiderfoot(request: ScanRequest, api_key: str=Security(get_api_key)):
     try:
-        
-        # Gestion flexible des modules
-        modules = (
-            request.modules if isinstance(request.modules, list)
-            else request.modules.split(",") if isinstance(request.modules, str) and request.modules.strip()
-            else []
+        # Lancé tout de suite si un créneau est libre, sinon mis en file d'attente
+        return await scan_scheduler.admit(request)
+
+    except CircuitOpenError:
+        raise
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Erreur de requête HTTP: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
+
+
+#endpoint pour lancer plusieurs scans en une requête
+@app.post("/scan/batch")
+async def run_spiderfoot_batch(scans: List[ScanRequest], api_key: str = Security(get_api_key)):
+    """
+    Lance une liste de scans en parallèle (au plus settings.scan_batch_concurrency à la fois),
+    via la file d'admission : au-delà des créneaux libres, les scans sont mis en file.
+    Les doublons (target, modules, use_case, plan) ne sont soumis qu'une fois ; chaque élément
+    reçoit son propre résultat, un échec n'interrompt pas le reste du lot.
+    """
+    semaphore = asyncio.Semaphore(settings.scan_batch_concurrency)
+
+    unique = {}
+    for index, request in enumerate(scans):
+        key = (request.target, tuple(parse_modules(request)), request.use_case, request.plan)
+        unique.setdefault(key, []).append(index)
+
+    async def submit(request: ScanRequest) -> dict:
+        async with semaphore:
+            try:
+                return await scan_scheduler.admit(request)
+            except HTTPException as e:
+                return {"status": "error", "status_code": e.status_code, "detail": e.detail}
+            except CircuitOpenError as e:
+                return {"status": "error", "status_code": 503, "detail": str(e), "retry_after": math.ceil(e.retry_after)}
+            except httpx.HTTPError as e:
+                return {"status": "error", "status_code": 500, "detail": f"Erreur de requête HTTP: {str(e)}"}
+            except Exception as e:
+                return {"status": "error", "status_code": 500, "detail": f"Erreur inattendue: {str(e)}"}
+
+    indexes = list(unique.values())
+    outcomes = await asyncio.gather(*(submit(scans[group[0]]) for group in indexes))
+
+    results = [None] * len(scans)
+    for group, outcome in zip(indexes, outcomes):
+        results[group[0]] = {"index": group[0], **outcome}
+        for duplicate in group[1:]:
+            results[duplicate] = {"index": duplicate, "status": "duplicate", "duplicate_of": group[0]}
+
+    failed = sum(1 for outcome in outcomes if outcome["status"] == "error")
+    logger.info(f"batch scan: {len(indexes)} submitted, {failed} failed, {len(scans) - len(indexes)} duplicates")
+
+    return {
+        "status": "success" if not failed else "partial" if failed < len(indexes) else "error",
+        "submitted": len(indexes),
+        "failed": failed,
+        "duplicates": len(scans) - len(indexes),
+        "results": results
+    }
+
+
+#endpoint pour consulter la file d'attente des scans
+@app.get("/scan/queue")
+async def get_scan_queue(
+    limit: int = Query(100, ge=1, le=1000, description="Nombre maximum de tickets listés (les prochains lancés)"),
+    api_key: str = Security(get_api_key),
+):
+    return scan_scheduler.snapshot(limit)
+
+
+@app.get("/scan/queue/{ticket_id}")
+async def get_scan_ticket(ticket_id: str, api_key: str = Security(get_api_key)):
+    ticket = scan_scheduler.ticket(ticket_id)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail=f"Ticket inconnu: {ticket_id}")
+    return ticket
+
+
+@app.delete("/scan/queue/{ticket_id}")
+async def cancel_scan_ticket(ticket_id: str, api_key: str = Security(get_api_key)):
+    ticket = scan_scheduler.cancel(ticket_id)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail=f"Ticket inconnu: {ticket_id}")
+    if ticket.state != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Le ticket n'est plus en attente (état: {ticket.state})")
+    logger.info(f"scan ticket cancelled: {ticket_id}")
+    return ticket.to_dict()
+
+    
+
+
+async def scan_statuses(ids: List[str]) -> Dict[str, Optional[list]]:
+    """Réponses /scanstatus des scans demandés (partagées avec le moniteur de statuts)."""
+    unique = list(dict.fromkeys(ids))
+    payloads = await asyncio.gather(*(status_monitor.status(scan_id) for scan_id in unique))
+    return dict(zip(unique, payloads))
+
+
+def all_scans_terminal(statuses: Dict[str, Optional[list]]) -> bool:
+    """Vrai si tous les scans sont FINISHED/ABORTED : leur export ne changera plus."""
+    return all(scan_state(payload) in TERMINAL_STATUSES for payload in statuses.values())
+
+
+def scan_descriptions(statuses: Dict[str, Optional[list]]) -> List[tuple]:
+    """[(scan_id, nom, cible)] : /scanstatus renvoie [nom, cible, ...]."""
+    return [
+        (scan_id, payload[0] if payload else None, payload[1] if payload else None)
+        for scan_id, payload in statuses.items()
+    ]
+
+
+# Garde une référence sur les tâches de fond pour qu'elles ne soient pas collectées en cours de route
+background_tasks = set()
+
+
+def schedule_ingest(statuses: Dict[str, Optional[list]], data: Optional[list] = None, path: Optional[str] = None):
+    """Indexe un export dans l'event store local, en tâche de fond (hors du chemin de la réponse)."""
+    if not settings.event_store_enabled:
+        return
+    scans = scan_descriptions(statuses)
+    if data is not None:
+        job = functools.partial(event_store.ingest, data, scans)
+    else:
+        job = functools.partial(event_store.ingest_file, path, scans)
+
+    task = asyncio.ensure_future(run_in_threadpool(job))
+    background_tasks.add(task)
+
+    def done(task):
+        background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"event store ingestion failed: {task.exception()}")
+
+    task.add_done_callback(done)
+
+
+async def delta_export(ids: List[str], cursor: Optional[str], entry: Optional[CacheEntry]) -> dict:
+    """
+    Export incrémental : seuls les événements apparus depuis le curseur du client sont renvoyés,
+    avec un nouveau curseur. complete=True quand tous les scans sont terminés (plus rien à attendre).
+    """
+    # Fichier du cache ouvert avant toute attente : une éviction pendant la lecture ne l'interrompt pas
+    cached = iter_file(entry.path) if entry is not None else None
+    # Le statut est lu avant l'export : un scan déjà terminé ici a un export définitif
+    statuses = await scan_statuses(ids)
+    complete = all_scans_terminal(statuses)
+    scans = scan_descriptions(statuses)
+
+    if cached is not None:
+        events, new_cursor, reset = await delta_tracker.collect(cached, scans, cursor)
+    else:
+        upstream = await spiderfoot.stream(
+            "GET", "/scanexportjsonmulti", params={"ids": ",".join(ids)}, headers={"Accept": "application/json"}
         )
-        
-        # Préparer les données pour SpiderFoot API
-        payload = {
-            "scanname": request.scan_name,
-            "scantarget": request.target,
-            "usecase": request.use_case,
-            "modulelist": ",".join(modules) if modules else "",
-            "typelist": TYPESLIST if not modules else ""
-        }
+        try:
+            if upstream.status_code != 200:
+                await upstream.aread()
+                raise HTTPException(status_code=upstream.status_code, detail=f"Erreur SpiderFoot: {upstream.text}")
+            events, new_cursor, reset = await delta_tracker.collect(upstream.aiter_bytes(), scans, cursor)
+        finally:
+            await upstream.aclose()
 
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        
-        #url ou lancer le scan dans spiderfoot
-        url = f"{BASE_URL}/startscan"
-        
-        # Faire la requête POST à SpiderFoot
-        response = requests.post(url, data=payload, headers=headers, auth=AUTH)
-        logger.info("scan started")
+    if complete:
+        for scan_id in statuses:
+            delta_tracker.mark_complete(scan_id)
+
+    logger.info(f"delta export {ids}: {len(events)} new events (complete={complete}, reset={reset})")
+    return {
+        "status": "success",
+        "scan_ids": ids,
+        "cursor": new_cursor,
+        "complete": complete,
+        "reset": reset,
+        "event_count": len(events),
+        "data": events
+    }
+
+
+def cached_export_response(request: Request, entry: CacheEntry, ids: List[str], fmt: Optional[str]):
+    """Sert un export depuis le cache disque, sans appel à SpiderFoot."""
+    if fmt == "json":
+        return ranged_file_response(
+            request.headers, entry.path, STREAM_MEDIA_TYPES[fmt], {**entry.headers(), "X-Export-File": entry.path}
+        )
+    if fmt == "ndjson":
+        return StreamingResponse(
+            to_ndjson(iter_file(entry.path)),
+            media_type=STREAM_MEDIA_TYPES[fmt],
+            headers={**entry.headers(), "X-Export-File": entry.path},
+        )
 
+    # Le fichier est déjà un tableau JSON : recopié tel quel dans la réponse
+    with open(entry.path, "rb") as f:
+        raw = f.read()
+    envelope = {
+        "status": "success",
+        "scan_ids": ids,
+        "file": entry.path,
+        "event_count": entry.event_count,
+    }
+    return envelope_response(request, envelope, raw, headers=entry.headers())
+
+
+async def stream_export(
+    ids: List[str],
+    joined_ids: str,
+    headers: dict,
+    fmt: str,
+    statuses: Dict[str, Optional[list]],
+    cache_key: Optional[str] = None,
+):
+    """Export en pass-through : mémoire constante quelle que soit la taille de l'export."""
+    response = await spiderfoot.stream("GET", "/scanexportjsonmulti", params={"ids": joined_ids}, headers=headers)
+
+    if response.status_code != 200:
+        await response.aread()
+        await response.aclose()
+        raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
+
+    if cache_key:
+        file_path = export_cache.path_for(cache_key)
+        os.makedirs(export_cache.directory, exist_ok=True)
+    else:
+        output_dir = "scan_exports_json"
+        os.makedirs(output_dir, exist_ok=True)
+        file_name = f"multi_export_{'_'.join(ids)}.json"
+        file_path = os.path.join(output_dir, file_name)
+
+    def on_complete(tmp_path, digest, size, event_count):
+        if cache_key:
+            export_cache.store(cache_key, ids, tmp_path, digest, size, event_count)
+        else:
+            os.replace(tmp_path, file_path)
+        schedule_ingest(statuses, path=file_path)
+
+    return StreamingResponse(
+        StreamingExport(response, file_path, fmt, on_complete=on_complete),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        headers={"X-Export-File": file_path},
+    )
+
+
+async def write_columnar(chunks: AsyncIterator[bytes], path: str, fmt: str, statuses: Dict[str, Optional[list]]) -> int:
+    """Convertit un export lu en flux en fichier colonnaire, bloc par bloc, hors de la boucle asyncio."""
+    builder = await run_in_threadpool(
+        ColumnarExport, fmt, path, scan_descriptions(statuses), settings.columnar_chunk_rows
+    )
+    try:
+        async for chunk in chunks:
+            with Span("columnar"):
+                await run_in_threadpool(builder.feed, chunk)
+        with Span("columnar"):
+            return await run_in_threadpool(builder.close)
+    except BaseException:
+        builder.abort()
+        raise
+
+
+async def columnar_export_response(
+    request: Request, ids: List[str], fmt: str, cache_key: str, entry: Optional[CacheEntry]
+) -> Response:
+    """
+    Export au format colonnaire (csv, parquet, arrow). Pour des scans terminés, le fichier converti
+    est gardé à côté de l'export JSON du cache : les lectures suivantes le servent tel quel
+    (Range compris), sans nouvelle conversion ni appel à SpiderFoot.
+    """
+    headers = {"Content-Disposition": f'attachment; filename="multi_export_{"_".join(ids)}.{fmt}"'}
+    if entry is not None:
+        file_path = export_cache.derived_path(cache_key, fmt)
+        # ETag de l'export JSON suffixé du format : le fichier converti change avec lui
+        headers.update(entry.headers(), ETag=f'{entry.etag[:-1]}-{fmt}"')
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        if not os.path.exists(file_path):
+            # Export JSON ouvert avant toute attente : une éviction pendant la conversion ne l'interrompt pas
+            chunks = iter_file(entry.path)
+            statuses = await scan_statuses(ids)
+            rows = await write_columnar(chunks, file_path, fmt, statuses)
+            export_cache.update_derived(cache_key)
+            logger.info(f"columnar export {cache_key}.{fmt}: {rows} rows converted from cache")
+    else:
+        statuses = await scan_statuses(ids)
+        if not all_scans_terminal(statuses):
+            cache_key = None
+        response = await spiderfoot.stream(
+            "GET", "/scanexportjsonmulti", params={"ids": ",".join(ids)}, headers={"Accept": "application/json"}
+        )
         if response.status_code != 200:
+            await response.aread()
+            await response.aclose()
             raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
-        
-        logger.info("scan started successfully")
 
-        return {
-            "status": "success",
-            "scan_name": request.scan_name,
-            "target": request.target,
-            "modules": modules,
-            "spiderfoot_response": response.json()
-        }
+        # L'export JSON est écrit (et mis en cache) dans la même passe que la conversion
+        if cache_key:
+            os.makedirs(export_cache.directory, exist_ok=True)
+            json_path = export_cache.path_for(cache_key)
+            file_path = export_cache.derived_path(cache_key, fmt)
+        else:
+            os.makedirs("scan_exports_json", exist_ok=True)
+            json_path = os.path.join("scan_exports_json", f"multi_export_{'_'.join(ids)}.json")
+            file_path = f"{json_path[:-len('.json')]}.{fmt}"
 
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Erreur de requête HTTP: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
-    
-    
+        stored: Dict[str, CacheEntry] = {}
+
+        def on_complete(tmp_path, digest, size, event_count):
+            if cache_key:
+                stored["entry"] = export_cache.store(cache_key, ids, tmp_path, digest, size, event_count)
+            else:
+                os.replace(tmp_path, json_path)
+            schedule_ingest(statuses, path=json_path)
+
+        export = StreamingExport(response, json_path, "json", on_complete=on_complete)
+        rows = await write_columnar(export.__aiter__(), file_path, fmt, statuses)
+        if cache_key:
+            export_cache.update_derived(cache_key)
+        logger.info(f"columnar export {file_path}: {rows} rows")
+        if "entry" in stored:
+            headers.update(stored["entry"].headers(), ETag=f'{stored["entry"].etag[:-1]}-{fmt}"')
+
+    headers["X-Export-File"] = file_path
+    return ranged_file_response(request.headers, file_path, COLUMNAR_MEDIA_TYPES[fmt], headers)
 
 
 @app.get("/scanexportjsonmulti")
-def export_multiple_scans(ids: List[str] = Query(...), api_key: str = Security(get_api_key)):
+async def export_multiple_scans(
+    request: Request,
+    ids: List[str] = Query(...),
+    stream: Optional[str] = Query(
+        None,
+        pattern="^(json|ndjson)$",
+        description="Mode streaming : relaie l'export chunk par chunk en tableau JSON (json) ou NDJSON (ndjson)",
+    ),
+    delta: bool = Query(False, description="Export incrémental : uniquement les événements postérieurs au curseur"),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par l'appel delta précédent"),
+    columnar: Optional[str] = Query(
+        None,
+        alias="format",
+        pattern="^(csv|parquet|arrow)$",
+        description="Fichier colonnaire plat pour l'analyse : csv, parquet ou arrow (parquet et arrow nécessitent pyarrow)",
+    ),
+    api_key: str = Security(get_api_key),
+):
+    # Modes de réponse exclusifs : une combinaison est refusée plutôt que tranchée en silence
+    modes = [name for name, value in (("delta", delta), ("format", columnar), ("stream", stream)) if value]
+    if len(modes) > 1:
+        raise HTTPException(status_code=400, detail=f"Options incompatibles : {', '.join(modes)} (une seule à la fois)")
+    if cursor is not None and not delta:
+        raise HTTPException(status_code=400, detail="cursor n'est valable qu'avec delta=true")
+    if columnar and columnar not in available_formats():
+        raise HTTPException(status_code=400, detail=f"Format {columnar} indisponible : installer pyarrow")
     try:
-        # Préparer l'URL avec les IDs
+        # Les exports de scans terminés sont servis depuis le cache disque
+        cache_key = export_cache.key_for(ids)
+        entry = export_cache.get(cache_key)
+        if delta:
+            return negotiated_response(request, await delta_export(ids, cursor, entry))
+        if columnar:
+            return await columnar_export_response(request, ids, columnar, cache_key, entry)
+        if entry is not None:
+            if not_modified(request.headers, entry):
+                return Response(status_code=304, headers=entry.headers())
+            logger.info(f"export served from cache: {cache_key}")
+            return cached_export_response(request, entry, ids, stream)
+
+        statuses = await scan_statuses(ids)
+        if not all_scans_terminal(statuses):
+            cache_key = None
+
+        # Préparer la requête avec les IDs
         joined_ids = ",".join(ids)
-        url = f"{BASE_URL}/scanexportjsonmulti?ids={joined_ids}"
         headers = {"Accept": "application/json"}
 
-        response = requests.get(url, headers=headers, auth=AUTH)
+        if stream:
+            return await stream_export(ids, joined_ids, headers, stream, statuses, cache_key)
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
+        upstream = await spiderfoot.get("/scanexportjsonmulti", params={"ids": joined_ids}, headers=headers)
 
-        data = response.json()
+        if upstream.status_code != 200:
+            raise HTTPException(status_code=upstream.status_code, detail=f"Erreur SpiderFoot: {upstream.text}")
 
-        output_dir = "scan_exports_json"
-        os.makedirs(output_dir, exist_ok=True)
-        file_name = f"multi_export_{'_'.join(ids)}.json"
-        file_path = os.path.join(output_dir, file_name)
+        raw = upstream.content
+        with Span("decode"):
+            data = loads(raw)
+        headers = None
+
+        if cache_key:
+            with Span("disk_write"):
+                entry = export_cache.store_bytes(cache_key, ids, raw, len(data))
+            headers = entry.headers()
+            file_path = entry.path
+        else:
+            output_dir = "scan_exports_json"
+            os.makedirs(output_dir, exist_ok=True)
+            file_name = f"multi_export_{'_'.join(ids)}.json"
+            file_path = os.path.join(output_dir, file_name)
+
+            # Export compact, tel que reçu de SpiderFoot (ni décodage ni indentation)
+            with Span("disk_write"), open(file_path, "wb") as f:
+                f.write(raw)
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        schedule_ingest(statuses, data=data)
 
         #if os.path.exists(file_path):
         #   logger.info("successfully exported ...")
@@ -165,16 +630,18 @@ def export_multiple_scans(ids: List[str] = Query(...), api_key: str = Security(g
         #        headers={"Content-Disposition": f"attachment; filename={file_name}"}
         #    )
             
-        return {
+        envelope = {
             "status": "success",
             "scan_ids": ids,
             "file": file_path,
             "event_count": len(data),
-            "data": data
         }
+        return envelope_response(request, envelope, raw, data=data, headers=headers)
 
 
-    except requests.RequestException as e:
+    except CircuitOpenError:
+        raise
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Erreur HTTP: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
@@ -182,19 +649,221 @@ def export_multiple_scans(ids: List[str] = Query(...), api_key: str = Security(g
     
     
 
-@app.post("/scanstatus/{scan_id}")
-def scan_status(scan_id: str, api_key: str =Security(get_api_key)):
+async def produce_export(job: ExportJob) -> str:
+    """
+    Écrit l'export d'un job dans job.path et renvoie son ETag : copie du cache disque si les
+    scans y sont, sinon export SpiderFoot lu en flux (mémoire constante, progression à jour).
+    """
+    entry = export_cache.get(export_cache.key_for(job.ids))
+    if entry is not None:
+        job.total_bytes = entry.size
+        try:
+            # Lien physique : le fichier du job survit à une éviction du cache
+            os.link(entry.path, job.path)
+        except OSError:
+            await run_in_threadpool(shutil.copyfile, entry.path, job.path)
+        job.bytes_written, job.event_count = entry.size, entry.event_count
+        return entry.etag
+
+    statuses = await scan_statuses(job.ids)
+    response = await spiderfoot.stream(
+        "GET", "/scanexportjsonmulti", params={"ids": ",".join(job.ids)}, headers={"Accept": "application/json"}
+    )
+    if response.status_code != 200:
+        await response.aread()
+        await response.aclose()
+        raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
+
+    length = response.headers.get("content-length")
+    job.total_bytes = int(length) if length and length.isdigit() else None
+    export = StreamingExport(response, job.path, "json")
+    async for _ in export:
+        job.bytes_written, job.event_count = export.size, export.event_count
+    schedule_ingest(statuses, path=job.path)
+    return make_etag(export.sha256.hexdigest())
+
+
+def export_job_response(job: ExportJob) -> dict:
+    info = job.to_dict()
+    if job.state == "queued":
+        info["position"] = export_jobs.position(job)
+    return info
+
+
+#endpoints d'export en tâche de fond : le job est créé tout de suite, l'export est téléchargé une fois prêt
+@app.post("/exports", status_code=202)
+async def create_export_job(request: ExportRequest, response: Response, api_key: str = Security(get_api_key)):
     try:
-        
-        url = f"{BASE_URL}/scanstatus?id={scan_id}"
-        headers = {"Accept": "application/json"}
+        job = export_jobs.submit(request.ids)
+    except ExportJobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    response.headers["Location"] = f"/exports/{job.id}"
+    return export_job_response(job)
+
+
+@app.get("/exports")
+async def list_export_jobs(
+    limit: int = Query(100, ge=1, le=1000, description="Nombre maximum de jobs listés (les plus récents)"),
+    api_key: str = Security(get_api_key),
+):
+    jobs = export_jobs.list(limit)
+    return {"status": "success", "count": len(jobs), "jobs": jobs}
+
+
+@app.get("/exports/{job_id}")
+async def get_export_job(job_id: str, api_key: str = Security(get_api_key)):
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job d'export inconnu ou expiré: {job_id}")
+    return export_job_response(job)
 
-        response = requests.get(url, headers=headers, auth=AUTH)
 
+@app.get("/exports/{job_id}/download")
+async def download_export_job(request: Request, job_id: str, api_key: str = Security(get_api_key)):
+    """Fichier de l'export (tableau JSON), avec prise en charge de Range pour reprendre un téléchargement."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job d'export inconnu ou expiré: {job_id}")
+    if job.state != "done":
+        raise HTTPException(status_code=409, detail=f"L'export n'est pas prêt (état: {job.state})")
+    headers = {
+        "ETag": job.etag,
+        "Content-Disposition": f'attachment; filename="export_{job.id}.json"',
+        "Cache-Control": "private, max-age=0, must-revalidate",
+    }
+    if etag_matches(request.headers.get("if-none-match"), job.etag):
+        return Response(status_code=304, headers=headers)
+    return ranged_file_response(request.headers, job.path, STREAM_MEDIA_TYPES["json"], headers)
+
+
+@app.delete("/exports/{job_id}")
+async def delete_export_job(job_id: str, api_key: str = Security(get_api_key)):
+    job = export_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job d'export inconnu ou expiré: {job_id}")
+    logger.info(f"export job deleted: {job_id} (état: {job.state})")
+    return job.to_dict()
+
+
+async def export_chunks(scan_id: str) -> AsyncIterator[bytes]:
+    """Export d'un scan en flux : depuis le cache disque s'il y est, sinon depuis SpiderFoot."""
+    entry = export_cache.get(export_cache.key_for([scan_id]))
+    if entry is not None:
+        async for chunk in iter_file(entry.path):
+            yield chunk
+        return
+    response = await spiderfoot.stream(
+        "GET", "/scanexportjsonmulti", params={"ids": scan_id}, headers={"Accept": "application/json"}
+    )
+    try:
         if response.status_code != 200:
+            await response.aread()
             raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
+        async for chunk in response.aiter_bytes():
+            yield chunk
+    finally:
+        await response.aclose()
+
 
-        satus_result = [status for status in response.json() if status in ["FINISHED", "RUNNING"]]
+#endpoint des différences entre deux scans (ex : scan de la veille et du jour sur la même cible)
+@app.get("/scandiff")
+async def scan_diff(
+    request: Request,
+    base: str = Query(..., min_length=1, description="Scan de référence"),
+    head: str = Query(..., min_length=1, description="Scan comparé : ajouts et suppressions par rapport à base"),
+    api_key: str = Security(get_api_key),
+):
+    try:
+        result = scan_differ.cached(base, head)
+        if result is None:
+            # Un scan encore en cours peut changer : la différence n'est gardée que pour des scans terminés
+            statuses = await scan_statuses([base, head])
+            result = await scan_differ.diff(base, head, export_chunks, cacheable=all_scans_terminal(statuses))
+        return negotiated_response(request, {"status": "success", **result})
+
+    except CircuitOpenError:
+        raise
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Erreur HTTP: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
+
+
+async def fetch_scan_status(scan_id: str) -> list:
+    """Réponse /scanstatus lue sur SpiderFoot, partagée avec le moniteur de statuts."""
+    headers = {"Accept": "application/json"}
+
+    response = await spiderfoot.get("/scanstatus", params={"id": scan_id}, headers=headers)
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
+
+    with Span("decode"):
+        payload = response.json()
+    status_monitor.observe(scan_id, payload)
+    return payload
+
+
+#endpoint des statuts de plusieurs scans (déclaré avant /scanstatus/{scan_id}, qui capterait "batch")
+@app.post("/scanstatus/batch")
+async def scan_status_batch(request: Request, batch: StatusBatchRequest, api_key: str = Security(get_api_key)):
+    """
+    Statuts de plusieurs scans en une requête : {scan_id: statut SpiderFoot}, erreurs par scan à part.
+    Les appels à SpiderFoot partent en parallèle (au plus settings.status_batch_concurrency à la fois) ;
+    avec cached=true, les statuts déjà connus (scan terminé, ou lu récemment) viennent de la mémoire.
+    """
+    semaphore = asyncio.Semaphore(settings.status_batch_concurrency)
+    statuses: Dict[str, Optional[str]] = {}
+    errors: Dict[str, dict] = {}
+    cached = 0
+
+    async def lookup(scan_id: str):
+        try:
+            async with semaphore:
+                payload = await fetch_scan_status(scan_id)
+            statuses[scan_id] = scan_state(payload)
+        except HTTPException as e:
+            errors[scan_id] = {"status_code": e.status_code, "detail": e.detail}
+        except CircuitOpenError as e:
+            errors[scan_id] = {"status_code": 503, "detail": str(e), "retry_after": math.ceil(e.retry_after)}
+        except httpx.HTTPError as e:
+            errors[scan_id] = {"status_code": 500, "detail": f"Erreur HTTP: {str(e)}"}
+        except Exception as e:
+            errors[scan_id] = {"status_code": 500, "detail": f"Erreur inattendue: {str(e)}"}
+
+    pending = []
+    for scan_id in batch.ids:
+        payload = status_monitor.fresh(scan_id) if batch.cached else None
+        if payload is not None:
+            statuses[scan_id] = scan_state(payload)
+            cached += 1
+        else:
+            pending.append(scan_id)
+    await asyncio.gather(*(lookup(scan_id) for scan_id in pending))
+
+    logger.info(f"batch scan status: {len(batch.ids)} scans, {cached} from memory, {len(errors)} errors")
+    return negotiated_response(request, {
+        "status": "success" if not errors else "partial" if statuses else "error",
+        "count": len(batch.ids),
+        "cached": cached,
+        # Ordre de la requête
+        "statuses": {scan_id: statuses[scan_id] for scan_id in batch.ids if scan_id in statuses},
+        "errors": errors,
+    })
+
+
+@app.post("/scanstatus/{scan_id}")
+async def scan_status(scan_id: str, api_key: str =Security(get_api_key)):
+    try:
+        
+        # Statut déjà lu récemment (par le moniteur ou un autre client) : pas d'appel à SpiderFoot
+        payload = status_monitor.fresh(scan_id)
+        if payload is None:
+            payload = await fetch_scan_status(scan_id)
+
+        satus_result = [status for status in payload if status in ["FINISHED", "RUNNING"]]
         logger.info(f"scan status {satus_result}")
         return {
             "status": "success",
@@ -205,28 +874,44 @@ def scan_status(scan_id: str, api_key: str =Security(get_api_key)):
 
         
 
-    except requests.RequestException as e:
+    except CircuitOpenError:
+        raise
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Erreur HTTP: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
 
 
+@app.get("/scanstatus/{scan_id}/stream")
+async def scan_status_stream(scan_id: str, api_key: str = Security(get_api_key)):
+    """
+    Pousse les changements d'état du scan en Server-Sent Events (event: status).
+    SpiderFoot est interrogé une fois par intervalle pour ce scan, quel que soit le nombre
+    de clients connectés ; le flux se ferme quand le scan est FINISHED ou ABORTED.
+    """
+    return StreamingResponse(
+        status_monitor.events(scan_id, settings.status_stream_heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/stopscan/{scan_id}")
-def stop_scan(scan_id: str, api_key: str = Security(get_api_key)):
+async def stop_scan(scan_id: str, api_key: str = Security(get_api_key)):
     try:
         
        
             
-        url = f"{BASE_URL}/stopscan?id={scan_id}"
         headers = {"Accept": "application/json"}
 
-        response = requests.get(url, headers=headers, auth=AUTH)
+        response = await spiderfoot.get("/stopscan", params={"id": scan_id}, headers=headers)
 
         if response.status_code != 200:
             raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
         
         
         logger.info(f"scan with id :  {scan_id} , is successfully stopped")
+        scan_list_cache.invalidate()
         
         return {
             "status": "success",
@@ -236,37 +921,226 @@ def stop_scan(scan_id: str, api_key: str = Security(get_api_key)):
         }
 
 
-    except requests.RequestException as e:
+    except CircuitOpenError:
+        raise
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Erreur HTTP: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
     
 
 
-@app.get("/scanlist")
-def get_scan_list(api_key: str = Security(get_api_key)):
-    try:
-        url = f"{BASE_URL}/scanlist"
-        headers = {"Accept": "application/json"}
+async def fetch_scan_list() -> list:
+    headers = {"Accept": "application/json"}
 
-        response = requests.get(url, headers=headers, auth=AUTH)
+    response = await spiderfoot.get("/scanlist", headers=headers)
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=f"Erreur SpiderFoot: {response.text}")
 
+    with Span("decode"):
         scans = response.json()
+    logger.info(f"scan list : {len(scans)} scans")
+    return scans
 
-        logger.info(f"scan list :  {scans}")
-        
-        return {
+
+# Liste des scans gardée en mémoire, invalidée quand /scan ou /stopscan changent l'état
+scan_list_cache = StaleWhileRevalidateCache(
+    fetch_scan_list,
+    ttl=settings.scanlist_cache_ttl,
+    stale_ttl=settings.scanlist_stale_ttl,
+    name="scan list cache",
+)
+
+
+@app.get("/scanlist")
+async def get_scan_list(request: Request, api_key: str = Security(get_api_key)):
+    try:
+        scans, cache_state = await scan_list_cache.get()
+
+        return negotiated_response(request, {
             "status": "success",
             "scan_count": len(scans),
             "scans": scans
-        }
+        }, headers={"X-Cache": cache_state})
 
-    except requests.RequestException as e:
+    except CircuitOpenError:
+        raise
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Erreur HTTP: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
 
 
+#endpoint pour interroger les événements exportés (event store local)
+@app.get("/events")
+async def query_events(
+    request: Request,
+    scan_ids: Optional[List[str]] = Query(None, description="Scans à interroger (tous par défaut)"),
+    event_types: Optional[List[str]] = Query(
+        None,
+        alias="type",
+        description="Types d'événement (IP_ADDRESS ou type_IP_ADDRESS), préfixe accepté : MALICIOUS_*",
+    ),
+    category: Optional[str] = Query(None, description="Catégorie de TYPE_CATEGORIES (ip_address, domain...)"),
+    module: Optional[str] = Query(None, description="Module SpiderFoot (sfp_...)"),
+    data: Optional[str] = Query(None, description="Valeur exacte de l'événement"),
+    include_false_positives: bool = Query(True),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: int = Query(0, ge=0, description="Valeur next_cursor de la page précédente"),
+    api_key: str = Depends(get_event_store_key),
+):
+    try:
+        types = expand_event_types(event_types, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with Span("event_store"):
+            events, next_cursor = await run_in_threadpool(
+                event_store.query, scan_ids, types, module, data, include_false_positives, limit, cursor
+            )
+        return negotiated_response(request, {
+            "status": "success",
+            "count": len(events),
+            "next_cursor": next_cursor,
+            "events": events
+        })
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
+
+
+@app.get("/events/summary")
+async def events_summary(
+    request: Request,
+    scan_ids: Optional[List[str]] = Query(None),
+    api_key: str = Depends(get_event_store_key),
+):
+    try:
+        with Span("event_store"):
+            counts = await run_in_threadpool(event_store.summary, scan_ids)
+            scans = await run_in_threadpool(event_store.scans)
+        if scan_ids:
+            scans = [scan for scan in scans if scan["scan_id"] in scan_ids]
+        return negotiated_response(request, {
+            "status": "success",
+            "scans": scans,
+            "counts": counts
+        })
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
+
+
+#endpoint des entités dédupliquées entre scans (une entité = un couple type d'événement / valeur)
+@app.get("/entities")
+async def query_entities(
+    request: Request,
+    scan_ids: Optional[List[str]] = Query(None, description="Entités vues dans au moins un de ces scans"),
+    event_types: Optional[List[str]] = Query(None, alias="type", description="Types d'événement, préfixe accepté : MALICIOUS_*"),
+    category: Optional[str] = Query(None, description="Catégorie de TYPE_CATEGORIES (ip_address, domain...)"),
+    new_since: Optional[str] = Query(None, description="Seulement les entités découvertes après ce scan"),
+    data: Optional[str] = Query(None, description="Valeur exacte de l'entité"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, description="Valeur next_cursor de la page précédente"),
+    api_key: str = Depends(get_event_store_key),
+):
+    try:
+        types = expand_event_types(event_types, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with Span("event_store"):
+            entities, next_cursor = await run_in_threadpool(
+                event_store.query_entities, scan_ids, types, new_since, data, limit, cursor
+            )
+        return negotiated_response(request, {
+            "status": "success",
+            "count": len(entities),
+            "next_cursor": next_cursor,
+            "entities": entities
+        })
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
+
+
+@app.get("/entities/summary")
+async def entities_summary(
+    request: Request,
+    scan_ids: Optional[List[str]] = Query(None),
+    event_types: Optional[List[str]] = Query(None, alias="type"),
+    category: Optional[str] = Query(None),
+    new_since: Optional[str] = Query(None),
+    api_key: str = Depends(get_event_store_key),
+):
+    try:
+        types = expand_event_types(event_types, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with Span("event_store"):
+            summary = await run_in_threadpool(event_store.entity_summary, scan_ids, types, new_since)
+        return negotiated_response(request, {"status": "success", **summary})
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur inattendue: {str(e)}")
+
+
+#endpoint des métriques au format Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(api_key: str = Security(get_api_key)):
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+#endpoints des profils CPU (clés API avec profile=true) : voir profiling.py
+@app.get("/debug/profiles", include_in_schema=False)
+async def list_profiles(api_key: str = Depends(get_profiling_key)):
+    profiles = profiler.list()
+    return {
+        "status": "success",
+        "sample_rate": profiler.sample_rate,
+        "busy": profiler.busy,
+        "count": len(profiles),
+        "profiles": profiles,
+    }
+
+
+@app.put("/debug/profiling", include_in_schema=False)
+async def set_profiling(request: ProfilingSettings, api_key: str = Depends(get_profiling_key)):
+    """Part des requêtes profilées au hasard, modifiable sans redémarrage (perdue au redémarrage)."""
+    profiler.sample_rate = request.sample_rate
+    logger.info(f"profiling sample rate set to {request.sample_rate} by {api_key}")
+    return {"status": "success", "sample_rate": profiler.sample_rate}
+
+
+@app.get("/debug/profiles/{profile_id}", include_in_schema=False)
+async def get_profile(
+    profile_id: str,
+    format: str = Query("pstats", pattern="^(pstats|text)$", description="pstats : fichier binaire (python -m pstats, snakeviz), text : top des fonctions"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$"),
+    limit: int = Query(50, ge=1, le=1000),
+    api_key: str = Depends(get_profiling_key),
+):
+    if profiler.describe(profile_id) is None:
+        raise HTTPException(status_code=404, detail=f"Profil inconnu ou expiré (ou requête encore en cours): {profile_id}")
+    if format == "text":
+        return PlainTextResponse(profiler.text(profile_id, sort, limit))
+    return Response(
+        profiler.pstats_bytes(profile_id),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile_{profile_id}.prof"'},
+    )
+
+
+#endpoint de santé (sans clé API, pour les sondes de load balancer / orchestrateur)
+@app.get("/health")
+async def health():
+    backends = spiderfoot.to_dict()
+    return {
+        "status": "ok" if all(backend["circuit"]["state"] == "closed" for backend in backends) else "degraded",
+        "spiderfoot": {"backends": backends},
+    }
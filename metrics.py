@@ -0,0 +1,280 @@
+# metrics.py
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import anyio.to_thread
+
+# Bornes des histogrammes (secondes pour les durées, octets pour les tailles)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Métrique au format d'exposition texte de Prometheus.
+    Les valeurs sont indexées par le tuple des valeurs d'étiquettes, dans l'ordre de labelnames.
+    Pas de verrou : toutes les mises à jour se font sur la boucle asyncio.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[str]:
+        return ()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Metric):
+    """Jauge mise à jour explicitement, ou calculée à chaque lecture si une fonction est fournie."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Iterable[str] = (),
+        function: Optional[Callable[[], Dict[tuple, float]]] = None,
+    ):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._function = function
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def set(self, value: float, labels: tuple = ()):
+        self._values[labels] = value
+
+    def samples(self) -> Iterable[str]:
+        values = self._function() if self._function is not None else self._values
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [compte par intervalle (non cumulé, dernier = +Inf), somme]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()):
+        item = self._values.get(labels)
+        if item is None:
+            item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        item[0][bisect.bisect_left(self.buckets, value)] += 1
+        item[1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Requêtes reçues par le wrapper (route = modèle de chemin, ex : /scanstatus/{scan_id})
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP, jusqu'au dernier octet de la réponse", ("method", "route")))
+HTTP_REQUEST_SIZE = registry.register(Histogram(
+    "http_request_size_bytes", "Taille du corps des requêtes HTTP", ("method", "route"), SIZE_BUCKETS))
+HTTP_RESPONSE_SIZE = registry.register(Histogram(
+    "http_response_size_bytes", "Taille du corps des réponses HTTP", ("method", "route"), SIZE_BUCKETS))
+HTTP_IN_PROGRESS = registry.register(Gauge(
+    "http_requests_in_progress", "Requêtes HTTP en cours", ("method", "route")))
+
+# Appels à SpiderFoot (backend = instance, path = chemin SpiderFoot, status = code HTTP ou type d'erreur)
+UPSTREAM_REQUESTS = registry.register(Counter(
+    "spiderfoot_requests_total", "Requêtes envoyées à SpiderFoot", ("backend", "method", "path", "status")))
+UPSTREAM_LATENCY = registry.register(Histogram(
+    "spiderfoot_request_duration_seconds", "Durée des requêtes SpiderFoot (jusqu'aux en-têtes pour les flux)", ("backend", "method", "path", "status")))
+UPSTREAM_IN_PROGRESS = registry.register(Gauge(
+    "spiderfoot_requests_in_progress", "Requêtes SpiderFoot en cours", ("backend", "method", "path")))
+UPSTREAM_RETRIES = registry.register(Counter(
+    "spiderfoot_retries_total", "Réessais d'appels SpiderFoot idempotents", ("backend", "method", "path")))
+UPSTREAM_HEDGES = registry.register(Counter(
+    "spiderfoot_hedged_requests_total", "Requêtes de couverture envoyées, et laquelle a répondu en premier", ("path", "winner")))
+
+# Requêtes refusées par clé API (reason = rate : seau vide, concurrency : trop de requêtes en cours)
+API_KEY_REJECTIONS = registry.register(Counter(
+    "api_key_rejections_total", "Requêtes refusées par les limites de la clé API", ("key", "reason")))
+
+# Disjoncteurs suivis : nom du backend -> objet exposant .state
+_breakers: Dict[str, object] = {}
+
+
+def track_breaker(name: str, breaker):
+    _breakers[name] = breaker
+
+
+def _breaker_states() -> Dict[tuple, float]:
+    values = {}
+    for name, breaker in _breakers.items():
+        current = breaker.state
+        for state in ("closed", "open", "half_open"):
+            values[(name, state)] = 1 if state == current else 0
+    return values
+
+
+CIRCUIT_STATE = registry.register(Gauge(
+    "spiderfoot_circuit_state", "État du disjoncteur de chaque backend SpiderFoot (1 = état courant)", ("backend", "state"), _breaker_states))
+
+
+def _threadpool_usage() -> Dict[tuple, float]:
+    # Limiteur par défaut d'anyio, utilisé par run_in_threadpool et les endpoints synchrones
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {("busy",): limiter.borrowed_tokens, ("limit",): limiter.total_tokens, ("waiting",): limiter.statistics().tasks_waiting}
+
+
+THREADPOOL = registry.register(Gauge(
+    "threadpool_threads", "Threads du pool (busy, limit) et tâches en attente d'un thread (waiting)", ("state",), _threadpool_usage))
+
+
+class UpstreamTimer:
+    """Mesure d'un appel à SpiderFoot : with UpstreamTimer(backend, method, path) as timer: ... timer.status = code."""
+
+    __slots__ = ("labels", "status", "_started")
+
+    def __init__(self, backend: str, method: str, path: str):
+        self.labels = (backend, method, path)
+        self.status = "error"
+
+    def __enter__(self) -> "UpstreamTimer":
+        UPSTREAM_IN_PROGRESS.inc(self.labels)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = self.labels + (self.status if exc_type is None else exc_type.__name__,)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - self._started, labels)
+        UPSTREAM_REQUESTS.inc(labels)
+        UPSTREAM_IN_PROGRESS.dec(self.labels)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : nombre, durée, tailles et requêtes en cours par route.
+    ASGI pur (et non BaseHTTPMiddleware) pour ne pas mettre en tampon les réponses en flux.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route(self, scope) -> str:
+        # Équivalent allégé de route.matches() (qui construit aussi les paramètres de chemin)
+        path, method = scope["path"], scope["method"]
+        partial = None
+        for route in scope["app"].router.routes:
+            regex = getattr(route, "path_regex", None)
+            if regex is None or not regex.match(path):
+                continue
+            methods = getattr(route, "methods", None)
+            if not methods or method in methods:
+                return route.path
+            if partial is None:
+                partial = route.path
+        # Chemins inconnus regroupés, pour ne pas créer une série par URL
+        return partial or "<unmatched>"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        labels = (method, self._route(scope))
+        sizes = [0, 0]  # octets reçus, octets envoyés
+        status = ["500"]
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes[0] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            elif message["type"] == "http.response.body":
+                sizes[1] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc(labels)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            HTTP_LATENCY.observe(time.perf_counter() - started, labels)
+            HTTP_REQUESTS.inc(labels + (status[0],))
+            HTTP_REQUEST_SIZE.observe(sizes[0], labels)
+            HTTP_RESPONSE_SIZE.observe(sizes[1], labels)
+            HTTP_IN_PROGRESS.dec(labels)
@@ -0,0 +1,104 @@
+# profiling.py
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from api_keys import keyring
+from config.config import settings
+
+# Requêtes jamais tirées au sort pour un profil (consultation des profils, métriques)
+UNSAMPLED_PREFIXES = ("/debug/", "/metrics")
+
+
+class _Snapshot:
+    """Profil déjà collecté, relu par pstats.Stats (qui vide l'attribut stats de l'objet qu'on lui passe)."""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Profiler:
+    """
+    Profils CPU (cProfile) de requêtes choisies : en-tête X-Profile: 1 envoyé avec une clé API
+    autorisée (profile=true dans API_KEYS), ou part sample_rate des requêtes tirée au sort.
+    cProfile mesure le thread de la boucle asyncio : les autres requêtes servies pendant le profil
+    y apparaissent aussi, le travail fait dans le pool de threads n'y apparaît pas. Un seul profil
+    à la fois ; les max_profiles derniers sont gardés en mémoire.
+    """
+
+    def __init__(self, sample_rate: float, max_profiles: int):
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self._active: Optional[cProfile.Profile] = None
+        self._profiles: "OrderedDict[str, dict]" = OrderedDict()
+
+    @property
+    def busy(self) -> bool:
+        return self._active is not None
+
+    def wanted(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"x-profile" and value.lower() in (b"1", b"true"):
+                # Seules les clés autorisées déclenchent un profil à la demande
+                key = dict(scope["headers"]).get(b"x-api-key", b"").decode("latin-1")
+                client = keyring.lookup(key)
+                return client is not None and client.profile
+        return (
+            self.sample_rate > 0
+            and random.random() < self.sample_rate
+            and not scope["path"].startswith(UNSAMPLED_PREFIXES)
+        )
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if self._active is not None:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif sur ce thread (Python 3.12+)
+            return None
+        self._active = profiler
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile, profile_id: str, info: dict):
+        profiler.disable()
+        self._active = None
+        profiler.create_stats()
+        self._profiles[profile_id] = {"id": profile_id, "created_at": time.time(), **info, "stats": profiler.stats}
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+
+    def list(self) -> List[dict]:
+        return [self.describe(profile_id) for profile_id in reversed(self._profiles)]
+
+    def describe(self, profile_id: str) -> Optional[dict]:
+        profile = self._profiles.get(profile_id)
+        if profile is None:
+            return None
+        return {key: value for key, value in profile.items() if key != "stats"}
+
+    def pstats_bytes(self, profile_id: str) -> Optional[bytes]:
+        """Profil au format de cProfile.dump_stats : python -m pstats, snakeviz..."""
+        profile = self._profiles.get(profile_id)
+        return marshal.dumps(profile["stats"]) if profile is not None else None
+
+    def text(self, profile_id: str, sort: str, limit: int) -> Optional[str]:
+        profile = self._profiles.get(profile_id)
+        if profile is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(_Snapshot(dict(profile["stats"])), stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+# Instance globale partagée par TracingMiddleware et les endpoints /debug/profiles
+profiler = Profiler(sample_rate=settings.profiling_sample_rate, max_profiles=settings.profiling_max_profiles)
@@ -0,0 +1,117 @@
+# resilience.py
+import logging
+import random
+import time
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Réponses de SpiderFoot (ou du proxy devant lui) indiquant une indisponibilité passagère
+RETRYABLE_STATUSES = {502, 503, 504}
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """
+    Appel refusé sans contacter SpiderFoot : le disjoncteur est ouvert.
+    Hérite de httpx.HTTPError pour que les tâches de fond (moniteur, scheduler, caches)
+    le traitent comme une erreur réseau ordinaire.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"SpiderFoot indisponible ({name}), réessayer dans {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """Réessais bornés, backoff exponentiel avec gigue complète (délai tiré entre 0 et le plafond)."""
+
+    def __init__(self, attempts: int, base_delay: float, max_delay: float):
+        self.attempts = max(attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur devant SpiderFoot :
+    - closed : les appels passent, les échecs consécutifs sont comptés ;
+    - open : après failure_threshold échecs, les appels échouent immédiatement pendant recovery_time ;
+    - half_open : ensuite, un seul appel d'essai passe ; son succès referme le circuit, son échec le rouvre.
+    Échec = erreur réseau ou statut de RETRYABLE_STATUSES ; les autres réponses comptent comme succès.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_time: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.recovery_time:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(self.recovery_time - (time.monotonic() - self._opened_at), 1.0)
+
+    def before_call(self) -> bool:
+        """Lève CircuitOpenError si l'appel doit être refusé ; retourne True pour l'appel d'essai (half_open)."""
+        if not self.enabled:
+            return False
+        state = self.state
+        if state == self.OPEN:
+            raise CircuitOpenError(self.name, self.retry_after())
+        if state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.name, 1.0)
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release(self, probe: bool):
+        if probe:
+            self._probe_in_flight = False
+
+    def after_call(self, probe: bool, failure: Optional[str]):
+        self.release(probe)
+        if not self.enabled:
+            return
+        if failure is None:
+            if self._opened_at is not None:
+                logger.info(f"{self.name}: circuit closed")
+            self.failures = 0
+            self._opened_at = None
+            return
+        self.failures += 1
+        self.last_error = failure
+        if probe or (self._opened_at is None and self.failures >= self.failure_threshold):
+            self._opened_at = time.monotonic()
+            logger.warning(f"{self.name}: circuit open for {self.recovery_time:.0f}s after {self.failures} failures ({failure})")
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_after": round(self.retry_after()) if self.state == self.OPEN else 0,
+            "last_error": self.last_error,
+        }
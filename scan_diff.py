@@ -0,0 +1,160 @@
+# scan_diff.py
+import asyncio
+import logging
+import tempfile
+from collections import OrderedDict
+from typing import AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from config.config import settings
+from event_store import entity_hash, event_identity, normalize_event_type
+from export_stream import JSONArraySplitter
+from serialization import loads
+from validation import TYPE_CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+# Type d'événement (sans préfixe type_) -> catégorie de TYPE_CATEGORIES ; les autres vont dans "other"
+CATEGORY_OF_TYPE = {normalize_event_type(t): category for category, types in TYPE_CATEGORIES.items() for t in types}
+OTHER_CATEGORY = "other"
+
+SPOOL_CHUNK = 64 * 1024
+
+
+def _summary(event: dict, event_type: str, data: Optional[str]) -> dict:
+    return {"event_type": event_type, "data": data, "module": event.get("module")}
+
+
+async def _events(chunks: AsyncIterator[bytes], spool: Optional[BinaryIO] = None) -> AsyncIterator[dict]:
+    """Événements d'un export lu en flux, un seul décodé à la fois ; copie brute dans spool si fourni."""
+    splitter = JSONArraySplitter()
+    async for chunk in chunks:
+        if spool is not None:
+            spool.write(chunk)
+        for item in splitter.feed(chunk):
+            yield loads(item)
+
+
+def _spooled_events(spool: BinaryIO) -> Iterator[dict]:
+    splitter = JSONArraySplitter()
+    spool.seek(0)
+    while True:
+        chunk = spool.read(SPOOL_CHUNK)
+        if not chunk:
+            break
+        for item in splitter.feed(chunk):
+            yield loads(item)
+
+
+class ScanDiffer:
+    """
+    Différence entre les exports de deux scans (événements ajoutés / supprimés de base à head).
+    Les deux exports sont lus en flux : seules des empreintes 64 bits par type d'événement
+    restent en mémoire, plus les événements ajoutés et supprimés (le résultat).
+    1. base : empreintes par type, export recopié dans un fichier temporaire ;
+    2. head : une empreinte absente de base est un ajout ; celles de base retrouvées sont retirées ;
+    3. les empreintes de base restantes sont les suppressions, relues depuis le fichier temporaire.
+    Les différences de scans terminés (FINISHED/ABORTED) sont gardées en cache (LRU).
+    """
+
+    def __init__(self, max_cached: int):
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def cached(self, base: str, head: str) -> Optional[dict]:
+        result = self._cache.get((base, head))
+        if result is not None:
+            self._cache.move_to_end((base, head))
+        return result
+
+    async def diff(
+        self,
+        base: str,
+        head: str,
+        open_export: Callable[[str], AsyncIterator[bytes]],
+        cacheable: bool,
+    ) -> dict:
+        """open_export(scan_id) : flux d'octets de l'export (tableau JSON) du scan."""
+        key = (base, head)
+        result = self.cached(base, head)
+        if result is not None:
+            return result
+        # Requêtes simultanées sur la même paire : un seul calcul
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(base, head, open_export))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None))
+        result = await asyncio.shield(task)
+        if cacheable and self.max_cached > 0:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return result
+
+    async def _compute(self, base: str, head: str, open_export: Callable[[str], AsyncIterator[bytes]]) -> dict:
+        base_hashes: Dict[str, Set[int]] = {}
+        kept: Dict[str, Set[int]] = {}
+        added: Dict[str, List[dict]] = {}
+        added_hashes: Set[int] = set()
+        counts = {"base": 0, "head": 0}
+
+        with tempfile.TemporaryFile() as spool:
+            async for event in _events(open_export(base), spool):
+                counts["base"] += 1
+                event_type, data = event_identity(event)
+                base_hashes.setdefault(event_type, set()).add(entity_hash(event_type, data))
+
+            async for event in _events(open_export(head)):
+                counts["head"] += 1
+                event_type, data = event_identity(event)
+                digest = entity_hash(event_type, data)
+                known = base_hashes.get(event_type)
+                if known is not None and digest in known:
+                    known.discard(digest)
+                    kept.setdefault(event_type, set()).add(digest)
+                elif digest not in added_hashes and digest not in kept.get(event_type, ()):
+                    added_hashes.add(digest)
+                    added.setdefault(event_type, []).append(_summary(event, event_type, data))
+
+            # Ce qui reste des empreintes de base n'a pas été retrouvé dans head
+            removed: Dict[str, List[dict]] = {}
+            if any(base_hashes.values()):
+                for event in _spooled_events(spool):
+                    event_type, data = event_identity(event)
+                    missing = base_hashes.get(event_type)
+                    if not missing:
+                        continue
+                    digest = entity_hash(event_type, data)
+                    if digest in missing:
+                        missing.discard(digest)
+                        removed.setdefault(event_type, []).append(_summary(event, event_type, data))
+
+        categories: Dict[str, dict] = {}
+        for changes, side in ((added, "added"), (removed, "removed")):
+            for event_type, events in changes.items():
+                group = categories.setdefault(
+                    CATEGORY_OF_TYPE.get(event_type, OTHER_CATEGORY),
+                    {"added_count": 0, "removed_count": 0, "added": [], "removed": []},
+                )
+                group[f"{side}_count"] += len(events)
+                group[side].extend(events)
+
+        total_added = sum(len(events) for events in added.values())
+        total_removed = sum(len(events) for events in removed.values())
+        logger.info(f"scan diff {base} -> {head}: +{total_added} -{total_removed}")
+        return {
+            "base": base,
+            "head": head,
+            "base_event_count": counts["base"],
+            "head_event_count": counts["head"],
+            "added_count": total_added,
+            "removed_count": total_removed,
+            "unchanged_count": sum(len(hashes) for hashes in kept.values()),
+            "categories": categories,
+        }
+
+
+# Instance globale partagée par les endpoints
+scan_differ = ScanDiffer(max_cached=settings.scandiff_cache_size)
@@ -0,0 +1,360 @@
+# scan_scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from config.config import settings
+from resilience import CircuitOpenError
+from spiderfoot_client import ACTIVE_STATUSES, TERMINAL_STATUSES, scan_state
+from spiderfoot_pool import SpiderFootPool, spiderfoot
+from status_monitor import ScanStatusMonitor, status_monitor
+from validation import Priority, ScanRequest
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_RANK = {Priority.LOW: 0, Priority.NORMAL: 1, Priority.HIGH: 2}
+
+# Vérifications consécutives sans statut (scan supprimé, inconnu de SpiderFoot) avant de libérer le créneau
+MAX_STATUS_MISSES = 3
+
+
+class Ticket:
+    """Demande de scan en attente (ou déjà traitée) dans la file du scheduler."""
+
+    def __init__(self, request: ScanRequest, seq: int, aging_seconds: float):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.seq = seq
+        self.enqueued_at = time.time()
+        self.state = "queued"  # queued, dispatched, failed, cancelled
+        self.scan_id: Optional[str] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        # Vieillissement : chaque aging_seconds d'attente vaut un niveau de priorité. Comme tous les
+        # tickets vieillissent au même rythme, l'ordre relatif ne dépend pas de l'instant présent.
+        rank = PRIORITY_RANK[request.priority]
+        score = rank - self.enqueued_at / aging_seconds if aging_seconds > 0 else rank
+        self.sort_key = (-score, self.enqueued_at, seq)
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return self.sort_key < other.sort_key
+
+    def to_dict(self) -> dict:
+        return {
+            "ticket_id": self.id,
+            "state": self.state,
+            "scan_name": self.request.scan_name,
+            "target": self.request.target,
+            "priority": self.request.priority.value,
+            "enqueued_at": self.enqueued_at,
+            "scan_id": self.scan_id,
+            "error": self.error,
+        }
+
+
+class RunningScan:
+    __slots__ = ("scan_id", "started_at", "max_scan_time", "stop_requested", "misses")
+
+    def __init__(self, scan_id: str, started_at: Optional[float], max_scan_time: Optional[int]):
+        self.scan_id = scan_id
+        self.started_at = started_at
+        self.max_scan_time = max_scan_time
+        self.stop_requested = False
+        self.misses = 0
+
+
+class ScanScheduler:
+    """
+    File d'admission des scans : au plus max_running scans actifs sur SpiderFoot, les autres
+    attendent et sont lancés par priorité puis ancienneté. Les créneaux sont libérés quand le
+    statut du scan (via le moniteur de statuts) devient terminal, ou quand SpiderFoot ne connaît
+    plus le scan. max_running = 0 désactive la file.
+    """
+
+    def __init__(
+        self,
+        client: SpiderFootPool,
+        monitor: ScanStatusMonitor,
+        max_running: int,
+        poll_interval: float,
+        aging_seconds: float,
+        default_duration: float,
+        ticket_ttl: float = 3600.0,
+    ):
+        self._client = client
+        self._monitor = monitor
+        self.max_running = max_running
+        self.poll_interval = poll_interval
+        self.aging_seconds = aging_seconds
+        self.ticket_ttl = ticket_ttl
+        self.avg_duration = default_duration
+        self._submit: Optional[Callable[[ScanRequest], Awaitable[dict]]] = None
+        self._queue: List[Ticket] = []
+        self._tickets: Dict[str, Ticket] = {}
+        self._running: Dict[str, RunningScan] = {}
+        self._reserved = 0
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._dispatches = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_running > 0
+
+    def free_slots(self) -> int:
+        return self.max_running - len(self._running) - self._reserved
+
+    async def start(self, submit: Callable[[ScanRequest], Awaitable[dict]]):
+        self._submit = submit
+        if not self.enabled or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._monitor.add_listener(self._on_status)
+        await self._adopt_running_scans()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"scan scheduler started (max {self.max_running} running scans)")
+
+    async def stop(self):
+        if self._task is not None:
+            # wait_for (Python < 3.12) peut avaler l'annulation : la boucle vérifie aussi ce drapeau
+            self._stopping = True
+            self._wakeup.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("scan scheduler stopped")
+
+    async def _adopt_running_scans(self):
+        """Compte les scans déjà actifs sur SpiderFoot au démarrage (lancés avant nous ou par un autre client)."""
+        try:
+            response = await self._client.get("/scanlist", headers={"Accept": "application/json"})
+            if response.status_code != 200:
+                return
+            for row in response.json():
+                # /scanlist : [id, nom, cible, créé, démarré, terminé, statut, ...]
+                if isinstance(row, list) and len(row) > 6 and row[6] in ACTIVE_STATUSES:
+                    self._running[row[0]] = RunningScan(row[0], None, None)
+            logger.info(f"scan scheduler: {len(self._running)} scans already running")
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"scan scheduler: unable to read running scans ({e})")
+
+    async def admit(self, request: ScanRequest) -> dict:
+        """Lance le scan tout de suite si un créneau est libre et la file vide, sinon le met en file."""
+        if not self.enabled:
+            return await self._submit(request)
+
+        if not self._queue and self.free_slots() > 0:
+            self._reserved += 1
+            try:
+                result = await self._submit(request)
+                self._track(result, request)
+            finally:
+                self._reserved -= 1
+            return result
+
+        ticket = Ticket(request, next(self._seq), self.aging_seconds)
+        self._tickets[ticket.id] = ticket
+        heapq.heappush(self._queue, ticket)
+        self._wakeup.set()
+        position, wait = self.position(ticket.id)
+        logger.info(f"scan queued: {ticket.id} (position {position})")
+        return {
+            "status": "queued",
+            "ticket_id": ticket.id,
+            "scan_name": request.scan_name,
+            "target": request.target,
+            "priority": request.priority.value,
+            "position": position,
+            "estimated_wait_seconds": wait,
+        }
+
+    def cancel(self, ticket_id: str) -> Optional[Ticket]:
+        ticket = self._tickets.get(ticket_id)
+        if ticket is not None and ticket.state == "queued":
+            ticket.state = "cancelled"
+            ticket.finished_at = time.time()
+            # Suppression paresseuse : le ticket est ignoré quand il sort du tas
+        return ticket
+
+    def ticket(self, ticket_id: str) -> Optional[dict]:
+        ticket = self._tickets.get(ticket_id)
+        if ticket is None:
+            return None
+        info = ticket.to_dict()
+        if ticket.state == "queued":
+            info["position"], info["estimated_wait_seconds"] = self.position(ticket_id)
+        elif ticket.state == "dispatched":
+            info["spiderfoot_response"] = ticket.result.get("spiderfoot_response") if ticket.result else None
+        return info
+
+    def _slot_times(self) -> List[float]:
+        """Temps restant estimé avant la libération de chaque créneau, trié."""
+        now = time.monotonic()
+        slots = [
+            max(self.avg_duration - (now - scan.started_at), 0.0) if scan.started_at is not None else self.avg_duration / 2
+            for scan in self._running.values()
+        ]
+        slots += [0.0] * max(self.max_running - len(slots), 0)
+        return sorted(slots)[:self.max_running]
+
+    def _wait(self, position: int, slots: List[float]) -> int:
+        # Chaque créneau se libère au plus tard dans avg_duration : les tickets prennent les
+        # créneaux à tour de rôle, dans l'ordre de libération, puis une durée moyenne par tour.
+        if not slots:
+            return 0
+        return round(slots[position % len(slots)] + (position // len(slots)) * self.avg_duration)
+
+    def position(self, ticket_id: str) -> tuple:
+        ticket = self._tickets.get(ticket_id)
+        if ticket is None or ticket.state != "queued":
+            return None, None
+        # Simple comptage (pas de tri) : l'appel est fait à chaque admission
+        position = sum(1 for other in self._queue if other.state == "queued" and other.sort_key < ticket.sort_key)
+        return position, self._wait(position, self._slot_times())
+
+    def snapshot(self, limit: int = 100) -> dict:
+        queued = [ticket for ticket in self._queue if ticket.state == "queued"]
+        slots = self._slot_times()
+        return {
+            "enabled": self.enabled,
+            "max_running": self.max_running,
+            "running": len(self._running),
+            "running_scan_ids": list(self._running),
+            "avg_scan_duration_seconds": round(self.avg_duration),
+            "queued_total": len(queued),
+            "queued": [
+                {**ticket.to_dict(), "position": position, "estimated_wait_seconds": self._wait(position, slots)}
+                for position, ticket in enumerate(heapq.nsmallest(limit, queued))
+            ],
+        }
+
+    def _track(self, result: dict, request: ScanRequest, ticket: Optional[Ticket] = None):
+        # /startscan répond ["SUCCESS", scan_id]
+        response = result.get("spiderfoot_response")
+        scan_id = response[1] if isinstance(response, list) and len(response) > 1 and response[0] == "SUCCESS" else None
+        if ticket is not None:
+            ticket.scan_id = scan_id
+        if scan_id is None:
+            logger.warning(f"scan scheduler: no scan id in SpiderFoot response {response}, slot not tracked")
+            return
+        self._running[scan_id] = RunningScan(scan_id, time.monotonic(), request.max_scan_time)
+
+    def _release(self, scan_id: str):
+        scan = self._running.pop(scan_id, None)
+        if scan is None:
+            return
+        if scan.started_at is not None:
+            # Moyenne glissante des durées, utilisée pour estimer l'attente
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.monotonic() - scan.started_at)
+        logger.info(f"scan scheduler: slot released by {scan_id}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _on_status(self, scan_id: str, state: Optional[str]):
+        if state in TERMINAL_STATUSES and scan_id in self._running:
+            self._release(scan_id)
+
+    async def _refresh_running(self):
+        async def refresh(scan: RunningScan):
+            try:
+                payload = await self._monitor.status(scan.scan_id)
+                state = scan_state(payload)
+                if state is None:
+                    # Scan supprimé ou inconnu (404, réponse vide) : sans statut il ne deviendrait jamais
+                    # terminal et garderait son créneau. Quelques essais pour ne pas libérer sur une erreur passagère.
+                    scan.misses += 1
+                    if scan.misses >= MAX_STATUS_MISSES:
+                        logger.warning(f"scan scheduler: scan {scan.scan_id} not found on SpiderFoot")
+                        self._release(scan.scan_id)
+                    return
+                scan.misses = 0
+                if state in TERMINAL_STATUSES:
+                    self._release(scan.scan_id)
+                elif (
+                    scan.max_scan_time
+                    and not scan.stop_requested
+                    and time.monotonic() - scan.started_at > scan.max_scan_time
+                ):
+                    scan.stop_requested = True
+                    await self._client.get("/stopscan", params={"id": scan.scan_id}, headers={"Accept": "application/json"})
+                    logger.info(f"scan scheduler: scan {scan.scan_id} stopped after max_scan_time={scan.max_scan_time}s")
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"scan scheduler: status of {scan.scan_id} unavailable ({e})")
+
+        await asyncio.gather(*(refresh(scan) for scan in list(self._running.values())))
+
+    def _expire_tickets(self):
+        now = time.time()
+        for ticket_id in [
+            t.id for t in self._tickets.values()
+            if t.finished_at is not None and now - t.finished_at > self.ticket_ttl
+        ]:
+            del self._tickets[ticket_id]
+
+    async def _dispatch(self, ticket: Ticket):
+        try:
+            result = await self._submit(ticket.request)
+            ticket.state = "dispatched"
+            ticket.result = result
+            self._track(result, ticket.request, ticket)
+            logger.info(f"scan scheduler: ticket {ticket.id} dispatched (scan {ticket.scan_id})")
+        except CircuitOpenError as e:
+            # SpiderFoot indisponible : le ticket garde sa place, nouvel essai au prochain tour
+            logger.warning(f"scan scheduler: ticket {ticket.id} requeued ({e})")
+            heapq.heappush(self._queue, ticket)
+        except HTTPException as e:
+            ticket.state = "failed"
+            ticket.error = str(e.detail)
+        except Exception as e:
+            ticket.state = "failed"
+            ticket.error = f"Erreur inattendue: {str(e)}"
+        finally:
+            self._reserved -= 1
+            if ticket.state != "queued":
+                ticket.finished_at = time.time()
+                self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            await self._refresh_running()
+            self._expire_tickets()
+            # Circuit ouvert sur toutes les instances : inutile de lancer des scans voués à l'échec
+            while self._queue and self.free_slots() > 0 and self._client.available:
+                ticket = heapq.heappop(self._queue)
+                if ticket.state != "queued":
+                    continue
+                self._reserved += 1
+                task = asyncio.ensure_future(self._dispatch(ticket))
+                self._dispatches.add(task)
+                task.add_done_callback(self._dispatches.discard)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Instance globale partagée par les endpoints
+scan_scheduler = ScanScheduler(
+    spiderfoot,
+    status_monitor,
+    # Capacité proportionnelle au nombre d'instances SpiderFoot du pool
+    max_running=settings.scheduler_max_running * len(spiderfoot.backends),
+    poll_interval=settings.scheduler_poll_interval,
+    aging_seconds=settings.scheduler_aging_seconds,
+    default_duration=settings.scheduler_default_scan_duration,
+)
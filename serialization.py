@@ -0,0 +1,102 @@
+# serialization.py
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from tracing import Span
+
+try:
+    import msgpack
+except ImportError:  # format binaire optionnel : pip install msgpack
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(obj):
+    # Types que orjson ne connaît pas (modèles pydantic, ensembles...) : encodeur de FastAPI
+    return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """JSON compact en UTF-8 (orjson)."""
+    return orjson.dumps(content, default=_default)
+
+
+loads = orjson.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encodée par orjson. Renvoyée directement, elle évite aussi le parcours de jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        with Span("serialize"):
+            return dumps(content)
+
+
+class MsgPackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        with Span("serialize"):
+            return msgpack.packb(content, use_bin_type=True, default=_default)
+
+
+def parse_accept(header: str) -> Dict[str, float]:
+    """En-tête Accept / Accept-Encoding -> {valeur: q}, ex : "gzip, zstd;q=0.5" -> {"gzip": 1.0, "zstd": 0.5}."""
+    values = {}
+    for part in header.split(","):
+        value, *params = part.split(";")
+        value = value.strip().lower()
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, number = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        values[value] = quality
+    return values
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Le client demande MessagePack (Accept) et le module est installé."""
+    if msgpack is None:
+        return False
+    accepted = parse_accept(request.headers.get("accept", ""))
+    return any(accepted.get(media_type, 0) > 0 for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def negotiated_response(request: Request, content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """MessagePack si le client l'accepte, JSON (orjson) sinon."""
+    headers = {**(headers or {}), "Vary": "Accept"} if msgpack is not None else headers
+    if wants_msgpack(request):
+        return MsgPackResponse(content, headers=headers)
+    return FastJSONResponse(content, headers=headers)
+
+
+def envelope_response(
+    request: Request,
+    envelope: Dict[str, Any],
+    raw_data: bytes,
+    data: Optional[list] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Réponse {**envelope, "data": ...} dont le tableau est déjà encodé en JSON (export SpiderFoot
+    ou fichier du cache) : les octets sont recopiés tels quels, sans décodage ni réencodage.
+    Le tableau n'est décodé que pour MessagePack.
+    """
+    if wants_msgpack(request):
+        return negotiated_response(request, {**envelope, "data": data if data is not None else loads(raw_data)}, headers)
+    with Span("serialize"):
+        body = dumps(envelope)[:-1] + (b',"data":' if envelope else b'"data":') + raw_data + b"}"
+    if msgpack is not None:
+        headers = {**(headers or {}), "Vary": "Accept"}
+    return Response(body, media_type="application/json", headers=headers)
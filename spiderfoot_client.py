@@ -0,0 +1,195 @@
+# spiderfoot_client.py
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+from metrics import UPSTREAM_HEDGES, UPSTREAM_RETRIES, UpstreamTimer, track_breaker
+from resilience import RETRYABLE_STATUSES, CircuitBreaker, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# Statuts à partir desquels les résultats d'un scan ne changent plus
+TERMINAL_STATUSES = {"FINISHED", "ABORTED", "ERROR-FAILED"}
+# Statuts d'un scan en cours (qui occupe l'instance)
+ACTIVE_STATUSES = {"CREATED", "STARTING", "STARTED", "RUNNING", "ABORT-REQUESTED"}
+
+# Lectures sans effet de bord, qui peuvent être réessayées
+IDEMPOTENT_PATHS = {"/scanstatus", "/scanlist", "/scanexportjsonmulti"}
+# Lectures courtes pour lesquelles une requête de couverture (hedging) peut être envoyée
+HEDGED_PATHS = {"/scanstatus"}
+
+
+def scan_state(status_payload) -> Optional[str]:
+    """
+    Extrait le statut d'une réponse /scanstatus de SpiderFoot
+    ([nom, cible, créé, démarré, terminé, statut, risques]).
+    """
+    if isinstance(status_payload, list) and len(status_payload) > 5 and isinstance(status_payload[5], str):
+        return status_payload[5]
+    return None
+
+
+class SpiderFootClient:
+    """
+    Client HTTP asynchrone partagé par tous les endpoints pour parler à SpiderFoot.
+    Les connexions sont gardées ouvertes (keep-alive) dans un pool, et le challenge
+    Digest est mis en cache par httpx.DigestAuth : seules les premières requêtes
+    paient l'aller-retour 401 supplémentaire.
+    Chaque appel passe par un disjoncteur ; les lectures idempotentes sont réessayées
+    (backoff avec gigue) et /scanstatus peut être doublé si hedge_delay > 0.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_delay: float = 0.0,
+        name: Optional[str] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.name = name or self.base_url
+        self._auth = httpx.DigestAuth(username, password)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.retry = retry or RetryPolicy(attempts=1, base_delay=0.0, max_delay=0.0)
+        self.breaker = breaker or CircuitBreaker(self.name, failure_threshold=0, recovery_time=0.0)
+        self.hedge_delay = hedge_delay
+        track_breaker(self.name, self.breaker)
+
+    @classmethod
+    def from_settings(cls, s, base_url: str, username: str, password: str, name: Optional[str] = None) -> "SpiderFootClient":
+        """Client d'une instance SpiderFoot, avec les réglages de pool et de résilience communs."""
+        name = name or base_url.rstrip("/")
+        return cls(
+            base_url=base_url,
+            username=username,
+            password=password,
+            max_connections=s.spiderfoot_max_connections,
+            max_keepalive_connections=s.spiderfoot_max_keepalive,
+            timeout=s.spiderfoot_timeout,
+            connect_timeout=s.spiderfoot_connect_timeout,
+            retry=RetryPolicy(s.spiderfoot_retry_attempts, s.spiderfoot_retry_base_delay, s.spiderfoot_retry_max_delay),
+            breaker=CircuitBreaker(name, s.circuit_failure_threshold, s.circuit_recovery_time),
+            hedge_delay=s.spiderfoot_hedge_delay,
+            name=name,
+        )
+
+    async def start(self):
+        """Ouvre le pool de connexions (appelé au démarrage de l'application)."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=self._auth,
+                limits=self._limits,
+                timeout=self._timeout,
+            )
+            logger.info(f"spiderfoot client started ({self.name}: {self.base_url})")
+
+    async def close(self):
+        """Ferme proprement toutes les connexions du pool (arrêt de l'application)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info(f"spiderfoot client closed ({self.name})")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("SpiderFootClient non démarré : appeler start() dans le lifespan")
+        return self._client
+
+    async def _send_once(self, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """Un seul envoi, soumis au disjoncteur et mesuré."""
+        probe = self.breaker.before_call()
+        try:
+            with UpstreamTimer(self.name, method, path) as timer:
+                request = self.client.build_request(method, path, **kwargs)
+                response = await self.client.send(request, stream=stream)
+                timer.status = str(response.status_code)
+        except httpx.TransportError as e:
+            self.breaker.after_call(probe, f"{type(e).__name__}: {e}")
+            raise
+        except BaseException:
+            # Annulation (requête de couverture perdante...) : ni succès ni échec
+            self.breaker.release(probe)
+            raise
+        self.breaker.after_call(probe, f"HTTP {response.status_code}" if response.status_code in RETRYABLE_STATUSES else None)
+        return response
+
+    async def _send_hedged(self, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """
+        Envoie la requête ; sans réponse après hedge_delay, en envoie une seconde identique
+        et garde la première réponse obtenue (l'autre est annulée).
+        """
+        first = asyncio.ensure_future(self._send_once(method, path, stream, **kwargs))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if done:
+                return first.result()
+            second = asyncio.ensure_future(self._send_once(method, path, stream, **kwargs))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded or not pending:
+                    # Une réponse valide ; sinon, les deux ont échoué : on relaie l'erreur
+                    task = succeeded[0] if succeeded else done.pop()
+                    UPSTREAM_HEDGES.inc((path, "primary" if task is first else "hedge"))
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def request(self, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """
+        Requête vers SpiderFoot. Les lectures idempotentes (IDEMPOTENT_PATHS) sont réessayées
+        sur erreur réseau ou 502/503/504 ; disjoncteur ouvert : CircuitOpenError, sans réessai.
+        """
+        idempotent = method == "GET" and path in IDEMPOTENT_PATHS
+        attempts = self.retry.attempts if idempotent else 1
+        hedged = self.hedge_delay > 0 and not stream and method == "GET" and path in HEDGED_PATHS
+        send = self._send_hedged if hedged else self._send_once
+
+        for attempt in range(attempts):
+            last = attempt + 1 >= attempts
+            try:
+                response = await send(method, path, stream, **kwargs)
+            except httpx.TransportError as e:
+                if last:
+                    raise
+                logger.warning(f"spiderfoot {method} {path}: {type(e).__name__}, retry {attempt + 1}/{attempts - 1}")
+            else:
+                if last or response.status_code not in RETRYABLE_STATUSES:
+                    return response
+                logger.warning(f"spiderfoot {method} {path}: HTTP {response.status_code}, retry {attempt + 1}/{attempts - 1}")
+                if stream:
+                    await response.aclose()
+            UPSTREAM_RETRIES.inc((self.name, method, path))
+            await asyncio.sleep(self.retry.delay(attempt))
+
+    async def stream(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Envoie la requête sans lire le corps : l'appelant consomme response.aiter_bytes()
+        et doit fermer la réponse avec aclose(). Seul l'envoi (jusqu'aux en-têtes) est réessayé.
+        """
+        return await self.request(method, path, stream=True, **kwargs)
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
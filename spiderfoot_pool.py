@@ -0,0 +1,317 @@
+# spiderfoot_pool.py
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from api_keys import hold_upstream_slot, upstream_slot
+from config.config import settings, SpiderFootBackend
+from export_stream import JSONArraySplitter
+from resilience import CircuitBreaker
+from spiderfoot_client import ACTIVE_STATUSES, TERMINAL_STATUSES, SpiderFootClient
+from tracing import Span
+
+logger = logging.getLogger(__name__)
+
+
+class MergedExportStream(httpx.AsyncByteStream):
+    """
+    Concatène en flux les exports (tableaux JSON) de plusieurs instances en un seul tableau.
+    Les instances sont lues l'une après l'autre ; la réponse suivante n'est ouverte qu'une fois
+    la précédente consommée et fermée.
+    """
+
+    def __init__(self, first: httpx.Response, openers: list):
+        self._current: Optional[httpx.Response] = first
+        self._openers = list(openers)
+
+    async def __aiter__(self):
+        yield b"["
+        emitted = False
+        while self._current is not None:
+            response = self._current
+            splitter = JSONArraySplitter()
+            try:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise httpx.HTTPStatusError(
+                        f"Erreur SpiderFoot {response.status_code}: {response.text}",
+                        request=response.request,
+                        response=response,
+                    )
+                async for chunk in response.aiter_bytes():
+                    items = splitter.feed(chunk)
+                    if items:
+                        yield (b"," if emitted else b"") + b",".join(items)
+                        emitted = True
+            finally:
+                await response.aclose()
+            self._current = None
+            if self._openers:
+                self._current = await self._openers.pop(0)()
+        yield b"]"
+
+    async def aclose(self):
+        if self._current is not None:
+            await self._current.aclose()
+            self._current = None
+
+
+class SlotStream(httpx.AsyncByteStream):
+    """Corps d'une réponse SpiderFoot lue en flux, qui rend le créneau d'appel de la clé API à sa fermeture."""
+
+    def __init__(self, stream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class SpiderFootPool:
+    """
+    Ensemble d'instances SpiderFoot vu comme une seule (même interface que SpiderFootClient).
+    Les appels sont routés selon l'API SpiderFoot :
+    - /startscan : instance la moins chargée (scans en cours), parmi celles dont le circuit n'est pas ouvert ;
+    - /scanstatus, /stopscan (paramètre id) : instance propriétaire du scan ;
+    - /scanlist : toutes les instances, listes fusionnées ;
+    - /scanexportjsonmulti (paramètre ids) : instances propriétaires, exports concaténés.
+    Le propriétaire de chaque scan est mémorisé au lancement et retrouvé via /scanlist après un redémarrage.
+    """
+
+    def __init__(self, backends: List[SpiderFootClient], load_refresh: float = 30.0):
+        if not backends:
+            raise ValueError("SpiderFootPool: au moins une instance est nécessaire")
+        self.backends = backends
+        self.load_refresh = load_refresh
+        self._by_name = {client.name: client for client in backends}
+        self._owners: Dict[str, str] = {}
+        self._active: Dict[str, Set[str]] = {client.name: set() for client in backends}
+        self._pending: Dict[str, int] = {client.name: 0 for client in backends}
+        self._routed: Dict[str, int] = {client.name: 0 for client in backends}
+        self._refreshed_at = float("-inf")
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def from_settings(cls, s) -> "SpiderFootPool":
+        backends = s.spiderfoot_backends or [
+            SpiderFootBackend(base_url=s.spiderfoot_base_url, user_name=s.user_name, password=s.password)
+        ]
+        clients = [
+            SpiderFootClient.from_settings(s, backend.base_url, backend.user_name, backend.password, backend.name)
+            for backend in backends
+        ]
+        return cls(clients, load_refresh=s.spiderfoot_load_refresh)
+
+    @property
+    def multi(self) -> bool:
+        return len(self.backends) > 1
+
+    @property
+    def available(self) -> bool:
+        """Au moins une instance accepte des appels (circuit non ouvert)."""
+        return any(client.breaker.state != CircuitBreaker.OPEN for client in self.backends)
+
+    async def start(self):
+        self._refresh_lock = asyncio.Lock()
+        for client in self.backends:
+            await client.start()
+        if self.multi:
+            await self.refresh()
+
+    async def close(self):
+        for client in self.backends:
+            await client.close()
+
+    # Propriétaires et charge
+
+    def load(self, name: str) -> int:
+        return len(self._active[name]) + self._pending[name]
+
+    def on_scan_status(self, scan_id: str, state: Optional[str]):
+        """Écouteur du moniteur de statuts : un scan terminé libère son instance."""
+        if state in TERMINAL_STATUSES:
+            name = self._owners.get(scan_id)
+            if name is not None:
+                self._active[name].discard(scan_id)
+
+    async def _fetch_lists(self) -> List[Tuple[SpiderFootClient, object]]:
+        """/scanlist de chaque instance ; met à jour propriétaires et scans en cours."""
+        results = await asyncio.gather(
+            *(client.get("/scanlist", headers={"Accept": "application/json"}) for client in self.backends),
+            return_exceptions=True,
+        )
+        for client, result in zip(self.backends, results):
+            if isinstance(result, httpx.Response) and result.status_code == 200:
+                rows = result.json()
+                active = set()
+                for row in rows:
+                    # /scanlist : [id, nom, cible, créé, démarré, terminé, statut, ...]
+                    self._owners[row[0]] = client.name
+                    if len(row) > 6 and row[6] in ACTIVE_STATUSES:
+                        active.add(row[0])
+                self._active[client.name] = active
+            elif isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+            else:
+                logger.warning(f"spiderfoot pool: scan list of {client.name} unavailable ({_describe(result)})")
+        self._refreshed_at = time.monotonic()
+        return list(zip(self.backends, results))
+
+    async def refresh(self):
+        """
+        Relit /scanlist sur toutes les instances. Les appels simultanés partagent une seule
+        relecture : celui qui attend le verrou se contente de celle terminée entre-temps.
+        """
+        requested = time.monotonic()
+        async with self._refresh_lock:
+            if self._refreshed_at < requested:
+                await self._fetch_lists()
+
+    async def owner(self, scan_id: Optional[str]) -> SpiderFootClient:
+        if not self.multi or not scan_id:
+            return self.backends[0]
+        name = self._owners.get(scan_id)
+        if name is None:
+            # Scan lancé avant un redémarrage ou par un autre client : on relit les listes
+            await self.refresh()
+            name = self._owners.get(scan_id)
+        # Inconnu partout : la première instance répondra elle-même que le scan n'existe pas
+        return self._by_name.get(name, self.backends[0])
+
+    async def _group_by_owner(self, ids: List[str]) -> List[Tuple[SpiderFootClient, List[str]]]:
+        groups: Dict[str, List[str]] = {}
+        for scan_id in ids:
+            client = await self.owner(scan_id)
+            groups.setdefault(client.name, []).append(scan_id)
+        return [(self._by_name[name], group) for name, group in groups.items()]
+
+    # Routage
+
+    async def request(self, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        # Quota d'appels simultanés de la clé API de la requête en cours (jusqu'à la fermeture pour un flux)
+        with Span("upstream"):
+            if not stream:
+                async with upstream_slot():
+                    return await self._route(method, path, stream, **kwargs)
+            release = await hold_upstream_slot()
+            try:
+                response = await self._route(method, path, stream, **kwargs)
+            except BaseException:
+                release()
+                raise
+            response.stream = SlotStream(response.stream, release)
+            return response
+
+    async def _route(self, method: str, path: str, stream: bool, **kwargs) -> httpx.Response:
+        if not self.multi:
+            return await self.backends[0].request(method, path, stream=stream, **kwargs)
+        if path == "/startscan":
+            return await self._start_scan(method, path, **kwargs)
+        if path == "/scanlist":
+            return await self._scan_list()
+        if path == "/scanexportjsonmulti":
+            return await self._export(method, path, stream, **kwargs)
+        client = await self.owner((kwargs.get("params") or {}).get("id"))
+        return await client.request(method, path, stream=stream, **kwargs)
+
+    async def stream(self, method: str, path: str, **kwargs) -> httpx.Response:
+        return await self.request(method, path, stream=True, **kwargs)
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def _start_scan(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if time.monotonic() - self._refreshed_at > self.load_refresh:
+            await self.refresh()
+        candidates = [client for client in self.backends if client.breaker.state != CircuitBreaker.OPEN] or self.backends
+        # Moins de scans en cours (y compris les lancements en vol), puis moins de scans déjà routés
+        client = min(candidates, key=lambda c: (self.load(c.name), self._routed[c.name]))
+        self._pending[client.name] += 1
+        try:
+            response = await client.request(method, path, **kwargs)
+        finally:
+            self._pending[client.name] -= 1
+        if response.status_code == 200:
+            payload = response.json()
+            if isinstance(payload, list) and len(payload) > 1 and payload[0] == "SUCCESS":
+                self._owners[payload[1]] = client.name
+                self._active[client.name].add(payload[1])
+                self._routed[client.name] += 1
+                logger.info(f"spiderfoot pool: scan {payload[1]} routed to {client.name} (load {self.load(client.name)})")
+        return response
+
+    async def _scan_list(self) -> httpx.Response:
+        rows, failures = [], []
+        for client, result in await self._fetch_lists():
+            if isinstance(result, httpx.Response) and result.status_code == 200:
+                rows.extend(result.json())
+            else:
+                failures.append(result)
+        if len(failures) == len(self.backends):
+            # Aucune instance n'a répondu : on relaie la première erreur
+            if isinstance(failures[0], Exception):
+                raise failures[0]
+            return failures[0]
+        return httpx.Response(200, json=rows)
+
+    async def _export(self, method: str, path: str, stream: bool, params=None, **kwargs) -> httpx.Response:
+        params = dict(params or {})
+        ids = [scan_id for scan_id in str(params.get("ids", "")).split(",") if scan_id]
+        groups = await self._group_by_owner(ids)
+        if len(groups) <= 1:
+            client = groups[0][0] if groups else self.backends[0]
+            return await client.request(method, path, stream=stream, params=params, **kwargs)
+
+        def send(client: SpiderFootClient, group: List[str], streamed: bool):
+            return client.request(method, path, stream=streamed, params={**params, "ids": ",".join(group)}, **kwargs)
+
+        if not stream:
+            responses = await asyncio.gather(*(send(client, group, False) for client, group in groups))
+            for response in responses:
+                if response.status_code != 200:
+                    return response
+            bodies = [response.content.strip()[1:-1].strip() for response in responses]
+            return httpx.Response(
+                200,
+                content=b"[" + b",".join(body for body in bodies if body) + b"]",
+                headers={"Content-Type": "application/json"},
+            )
+
+        first = await send(groups[0][0], groups[0][1], True)
+        if first.status_code != 200:
+            return first
+        openers = [lambda client=client, group=group: send(client, group, True) for client, group in groups[1:]]
+        return httpx.Response(200, headers={"Content-Type": "application/json"}, stream=MergedExportStream(first, openers))
+
+    def to_dict(self) -> List[dict]:
+        return [
+            {
+                "name": client.name,
+                "running_scans": self.load(client.name) if self.multi else None,
+                "circuit": client.breaker.to_dict(),
+            }
+            for client in self.backends
+        ]
+
+
+def _describe(result) -> str:
+    if isinstance(result, httpx.Response):
+        return f"HTTP {result.status_code}"
+    return f"{type(result).__name__}: {result}"
+
+
+# Instance globale partagée par les endpoints
+spiderfoot = SpiderFootPool.from_settings(settings)
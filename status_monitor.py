@@ -0,0 +1,175 @@
+# status_monitor.py
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from config.config import settings
+from spiderfoot_client import TERMINAL_STATUSES, scan_state
+from spiderfoot_pool import SpiderFootPool, spiderfoot
+
+logger = logging.getLogger(__name__)
+
+
+class ScanStatusMonitor:
+    """
+    Surveille en tâche de fond le statut des scans suivis par au moins un client.
+    Chaque scan actif est interrogé une seule fois par intervalle, quel que soit le nombre
+    d'abonnés ; les changements d'état sont poussés dans la file de chaque abonné.
+    Les scans FINISHED/ABORTED ne sont plus interrogés.
+    """
+
+    def __init__(self, client: SpiderFootPool, interval: float, max_known: int = 10000):
+        self._client = client
+        self.interval = interval
+        self.max_known = max_known
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._listeners: List[Callable[[str, Optional[str]], None]] = []
+        # scan_id -> (date de la dernière observation, réponse /scanstatus)
+        self._known: "OrderedDict[str, Tuple[float, list]]" = OrderedDict()
+        # Lectures /scanstatus en cours : une seule requête SpiderFoot par scan à la fois
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"status monitor started (interval {self.interval}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            # wait_for (Python < 3.12) peut avaler l'annulation : la boucle vérifie aussi ce drapeau
+            self._stopping = True
+            self._wakeup.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("status monitor stopped")
+
+    def is_terminal(self, scan_id: str) -> bool:
+        item = self._known.get(scan_id)
+        return item is not None and scan_state(item[1]) in TERMINAL_STATUSES
+
+    def fresh(self, scan_id: str) -> Optional[list]:
+        """Dernier statut connu s'il est encore valable (définitif, ou observé il y a moins d'un intervalle)."""
+        item = self._known.get(scan_id)
+        if item is None:
+            return None
+        observed_at, payload = item
+        if scan_state(payload) in TERMINAL_STATUSES or time.monotonic() - observed_at < self.interval:
+            return payload
+        return None
+
+    def observe(self, scan_id: str, payload: list):
+        """Enregistre un statut lu sur SpiderFoot et notifie les abonnés s'il a changé."""
+        previous = self._known.get(scan_id)
+        self._known[scan_id] = (time.monotonic(), payload)
+        self._known.move_to_end(scan_id)
+        while len(self._known) > self.max_known:
+            self._known.popitem(last=False)
+        if previous is None or scan_state(previous[1]) != scan_state(payload):
+            self._publish(scan_id, payload)
+
+    def add_listener(self, callback: Callable[[str, Optional[str]], None]):
+        """callback(scan_id, statut) est appelé à chaque changement d'état observé."""
+        self._listeners.append(callback)
+
+    def _publish(self, scan_id: str, payload: list):
+        event = {"scan_id": scan_id, "status": scan_state(payload), "spiderfoot_response": payload}
+        for queue in self._subscribers.get(scan_id, ()):
+            queue.put_nowait(event)
+        for callback in self._listeners:
+            try:
+                callback(scan_id, event["status"])
+            except Exception as e:
+                logger.error(f"status monitor: listener failed ({e})")
+
+    async def status(self, scan_id: str) -> Optional[list]:
+        """
+        Réponse /scanstatus du scan : depuis la mémoire si elle est fraîche, sinon lue sur SpiderFoot.
+        Les appels simultanés pour un même scan (clients, scheduler, moniteur) partagent la même lecture.
+        """
+        payload = self.fresh(scan_id)
+        if payload is not None:
+            return payload
+        task = self._inflight.get(scan_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(scan_id))
+            self._inflight[scan_id] = task
+            task.add_done_callback(lambda done: self._inflight.pop(scan_id, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, scan_id: str) -> Optional[list]:
+        response = await self._client.get("/scanstatus", params={"id": scan_id}, headers={"Accept": "application/json"})
+        if response.status_code != 200:
+            return None
+        payload = response.json()
+        self.observe(scan_id, payload)
+        return payload
+
+    def subscribe(self, scan_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(scan_id, set()).add(queue)
+        item = self._known.get(scan_id)
+        if item is not None:
+            payload = item[1]
+            queue.put_nowait({"scan_id": scan_id, "status": scan_state(payload), "spiderfoot_response": payload})
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return queue
+
+    def unsubscribe(self, scan_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(scan_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[scan_id]
+
+    async def _poll(self, scan_id: str):
+        try:
+            if await self.status(scan_id) is None:
+                logger.warning(f"status monitor: scan {scan_id} -> no status")
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"status monitor: scan {scan_id} -> {e}")
+
+    async def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            active = [scan_id for scan_id in self._subscribers if not self.is_terminal(scan_id)]
+            if active:
+                await asyncio.gather(*(self._poll(scan_id) for scan_id in active))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def events(self, scan_id: str, heartbeat: float) -> AsyncIterator[bytes]:
+        """Flux Server-Sent Events des changements d'état d'un scan, fermé quand le scan est terminé."""
+        queue = self.subscribe(scan_id)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+                if event["status"] in TERMINAL_STATUSES:
+                    break
+        finally:
+            self.unsubscribe(scan_id, queue)
+
+
+# Instance globale partagée par les endpoints
+status_monitor = ScanStatusMonitor(spiderfoot, settings.status_poll_interval)
@@ -0,0 +1,67 @@
+# swr_cache.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache mémoire d'une seule valeur chargée de façon asynchrone :
+    - valeur fraîche (< ttl) : servie directement ;
+    - valeur périmée (< ttl + stale_ttl) : servie telle quelle, rechargement lancé en tâche de fond ;
+    - sinon : chargement, partagé entre toutes les requêtes concurrentes (single-flight).
+    invalidate() force le prochain get() à recharger.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float, name: str = "cache"):
+        self._loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self._value: Any = None
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._inflight: Optional[asyncio.Task] = None
+        self._inflight_generation = -1
+
+    def invalidate(self):
+        self._generation += 1
+        self._value = None
+        self._loaded_at = None
+
+    async def get(self) -> Tuple[Any, str]:
+        """Retourne (valeur, état) avec état parmi HIT, STALE, MISS."""
+        if self._loaded_at is not None:
+            age = time.monotonic() - self._loaded_at
+            if age < self.ttl:
+                return self._value, "HIT"
+            if age < self.ttl + self.stale_ttl:
+                self._refresh()
+                return self._value, "STALE"
+        return await asyncio.shield(self._refresh()), "MISS"
+
+    def _refresh(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight_generation != self._generation:
+            self._inflight_generation = self._generation
+            self._inflight = asyncio.ensure_future(self._load(self._generation))
+            # L'erreur d'un rechargement de fond est déjà loguée dans _load
+            self._inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._inflight
+
+    async def _load(self, generation: int) -> Any:
+        try:
+            value = await self._loader()
+        except Exception as e:
+            logger.warning(f"{self.name}: reload failed ({e})")
+            raise
+        finally:
+            if self._inflight_generation == generation:
+                self._inflight = None
+        # Un invalidate() survenu pendant le chargement rend ce résultat obsolète
+        if generation == self._generation:
+            self._value = value
+            self._loaded_at = time.monotonic()
+        return value
@@ -0,0 +1,125 @@
+# tracing.py
+import logging
+import secrets
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Phases d'une requête : nom -> [durée cumulée en secondes, nombre de passages]."""
+
+    __slots__ = ("spans", "started", "finished")
+
+    def __init__(self):
+        self.spans: Dict[str, list] = {}
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def add(self, name: str, duration: float):
+        # Une tâche de fond lancée pendant la requête hérite de sa trace : ignorée une fois la requête finie
+        if self.finished:
+            return
+        item = self.spans.get(name)
+        if item is None:
+            self.spans[name] = [duration, 1]
+        else:
+            item[0] += duration
+            item[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        """En-tête Server-Timing (W3C) : une entrée par phase, plus total (jusqu'aux en-têtes)."""
+        parts = [f"{name};dur={duration * 1e3:.2f}" for name, (duration, _) in self.spans.items()]
+        parts.append(f"total;dur={total * 1e3:.2f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, dict]:
+        return {name: {"ms": round(duration * 1e3, 3), "count": count} for name, (duration, count) in self.spans.items()}
+
+
+# Trace de la requête en cours (None hors requête : tâches de fond, démarrage)
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class Span:
+    """
+    with Span("upstream"): ... ajoute la durée du bloc à la trace de la requête en cours.
+    Sans trace (hors requête, traçage désactivé), un seul ContextVar.get : coût négligeable.
+    Les phases de même nom s'additionnent (ex : appels SpiderFoot en parallèle d'un batch).
+    """
+
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "Span":
+        self.trace = current_trace.get()
+        if self.trace is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            self.trace.add(self.name, time.perf_counter() - self.started)
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI : trace de chaque requête (phases mesurées par Span), renvoyée dans l'en-tête
+    Server-Timing et journalisée en JSON au-delà de log_min_ms ; profil CPU si profiler
+    (voir profiling.py) le demande pour cette requête (en-tête X-Profile-Id).
+    Les phases terminées après l'envoi des en-têtes (corps en flux) ne figurent que dans le journal.
+    """
+
+    def __init__(self, app, profiler, log_min_ms: float):
+        self.app = app
+        self.profiler = profiler
+        self.log_min_ms = log_min_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = current_trace.set(trace)
+        status = [500]
+
+        profiler = profile_id = None
+        if self.profiler.max_profiles > 0 and not self.profiler.busy and self.profiler.wanted(scope):
+            profiler = self.profiler.start()
+            profile_id = secrets.token_hex(8) if profiler is not None else None
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing(time.perf_counter() - trace.started).encode("latin-1")))
+                if profile_id is not None:
+                    headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total = time.perf_counter() - trace.started
+            trace.finished = True
+            current_trace.reset(token)
+            if total * 1e3 >= self.log_min_ms or profiler is not None:
+                record = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status[0],
+                    "total_ms": round(total * 1e3, 3),
+                }
+                if profiler is not None:
+                    self.profiler.stop(profiler, profile_id, dict(record))
+                    record["profile_id"] = profile_id
+                record["spans"] = trace.to_dict()
+                logger.info(f"trace {orjson.dumps(record).decode()}")
@@ -1,7 +1,14 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, model_validator, validator
 from enum import Enum
+from functools import lru_cache
+from typing import Dict, List, Optional
+import logging
 import re
 
+from tracing import Span
+
+logger = logging.getLogger(__name__)
+
 class ScanType(str, Enum):
     """Types de scan disponibles"""
     PASSIVE = "passive"
@@ -14,28 +21,50 @@ class Priority(str, Enum):
     NORMAL = "normal" 
     HIGH = "high"
 
+class PlanMode(str, Enum):
+    """Choix des modules quand la requête n'en fournit pas"""
+    FULL = "full"  # tous les types d'événements (TYPESLIST) : graphe complet des modules SpiderFoot
+    AUTO = "auto"  # modules et types déduits du type de cible (TARGET_MODULES, TYPE_CATEGORIES)
+
+# Motifs de détection, dans l'ordre de priorité : le premier qui correspond l'emporte
+# (domain passe avant subdomain et hostname, comme dans la version d'origine)
+TARGET_PATTERNS = {
+    "ip_address": r"^(?:\d{1,3}\.){3}\d{1,3}$",
+    "cidr": r"^(?:\d{1,3}\.){3}\d{1,3}/\d{1,2}$",
+    "domain": r"^(?!http)(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}$",
+    "subdomain": r"^(?!http)(?:[a-zA-Z0-9-]+\.){2,}[a-zA-Z]{2,}$",
+    "email": r"^[\w\.-]+@[\w\.-]+\.\w+$",
+    "phone_number": r"^\+?\d{7,15}$",
+    "asn": r"^AS\d+$",
+    "bitcoin_address": r"^[13][a-km-zA-HJ-NP-Z1-9]{25,34}$",
+    "username": r"^@?[a-zA-Z0-9_]{3,30}$",
+    "person_name": r"^[A-ZÀ-Ý][a-zà-ÿ']+(?:[\s'-][A-ZÀ-Ý][a-zà-ÿ']+)+$", #r"^[A-Z][a-z]+(?:\s[A-Z][a-z]+)+$",
+    "hostname": r"^(?!http)(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}$"
+}
+
+# Une seule alternance compilée : chaque branche est ancrée, donc la première branche
+# qui correspond (dans l'ordre de TARGET_PATTERNS) est celle retenue par re.match
+_TARGET_REGEX = re.compile(
+    "|".join(f"(?P<{target_type}>{pattern})" for target_type, pattern in TARGET_PATTERNS.items())
+)
+
+
+@lru_cache(maxsize=4096)
+def classify_target(input_str: str) -> str:
+    """Type de la cible (ip_address, domain, email...) ou "unknown"."""
+    match = _TARGET_REGEX.match(input_str)
+    return match.lastgroup if match else "unknown"
+
+
 def detect_target_type(req: str):
-        input_str = req
-
-        patterns = {
-            "ip_address": r"^(?:\d{1,3}\.){3}\d{1,3}$",
-            "cidr": r"^(?:\d{1,3}\.){3}\d{1,3}/\d{1,2}$",
-            "domain": r"^(?!http)(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}$",
-            "subdomain": r"^(?!http)(?:[a-zA-Z0-9-]+\.){2,}[a-zA-Z]{2,}$",
-            "email": r"^[\w\.-]+@[\w\.-]+\.\w+$",
-            "phone_number": r"^\+?\d{7,15}$",
-            "asn": r"^AS\d+$",
-            "bitcoin_address": r"^[13][a-km-zA-HJ-NP-Z1-9]{25,34}$",
-            "username": r"^@?[a-zA-Z0-9_]{3,30}$",
-            "person_name": r"^[A-ZÀ-Ý][a-zà-ÿ']+(?:[\s'-][A-ZÀ-Ý][a-zà-ÿ']+)+$", #r"^[A-Z][a-z]+(?:\s[A-Z][a-z]+)+$",
-            "hostname": r"^(?!http)(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}$"
-        }
+    return {"target_type": classify_target(req), "input": req}
+
+
+def classify_many(targets: List[str]) -> List[dict]:
+    """Classe une liste de cibles en une passe (même résultat que detect_target_type)."""
+    return [{"target_type": classify_target(target), "input": target} for target in targets]
 
-        for target_type, pattern in patterns.items():
-            if re.match(pattern, input_str):
-                return {"target_type": target_type, "input": input_str}
 
-        return {"target_type": "unknown", "input": input_str}
 class ScanRequest(BaseModel):
     # Paramètres de base
     scan_name: str = Field(..., description="Nom du scan", min_length=1, max_length=100)
@@ -56,15 +85,19 @@ class ScanRequest(BaseModel):
     
     # Configuration du scan
     #scan_type: ScanType = Field(default=ScanType.PASSIVE, description="Type de scan")
-    #priority: Priority = Field(default=Priority.NORMAL, description="Priorité du scan")
+    priority: Priority = Field(default=Priority.NORMAL, description="Priorité du scan dans la file d'attente")
+    plan: PlanMode = Field(
+        default=PlanMode.FULL,
+        description="Sans modules : full = tous les types, auto = modules et types adaptés au type de cible"
+    )
     
     # Paramètres temporels
-    #max_scan_time: Optional[int] = Field(
-    #    default=3600, 
-    #    description="Durée maximale du scan en secondes",
-    #    ge=60,
-    #    le=86400
-    #)
+    max_scan_time: Optional[int] = Field(
+        default=None,
+        description="Durée maximale du scan en secondes (le scan est arrêté au-delà, aucune limite par défaut)",
+        ge=60,
+        le=86400
+    )
     
     # Paramètres de profondeur
     #max_depth: Optional[int] = Field(
@@ -102,6 +135,13 @@ class ScanRequest(BaseModel):
     
     
     
+    @model_validator(mode="wrap")
+    @classmethod
+    def timed_validation(cls, values, handler):
+        """Durée de la validation complète de la requête (phase validation de Server-Timing)"""
+        with Span("validation"):
+            return handler(values)
+
     @validator('use_case')
     def validate_modules(cls, v):
         """Validation de use_case """
@@ -117,15 +157,41 @@ class ScanRequest(BaseModel):
         if not v or len(v_strip) < 3:
             raise ValueError("La cible doit contenir au moins 3 caractères")
         #v_strip_type = "+".join(v_strip.split())
-        type_detect = detect_target_type(v_strip)
-        print("type_detect //// ", type_detect)
-        if type_detect['target_type'] in ['person_name','username']:
+        with Span("classify_target"):
+            target_type = classify_target(v_strip)
+        if target_type in ['person_name','username']:
             v_strip = f'"{v_strip}"'
-            print(f"v_stript  {v_strip}")
-        print(f"v_strip  {v_strip}")
+        logger.debug(f"target {v_strip} detected as {target_type}")
         return v_strip
-    
-    
+
+
+class ExportRequest(BaseModel):
+    """Export en tâche de fond (POST /exports)"""
+    ids: List[str] = Field(..., description="IDs des scans à exporter", min_length=1, max_length=100)
+
+    @validator('ids')
+    def validate_ids(cls, v):
+        """IDs non vides, sans doublon (ordre conservé)"""
+        ids = list(dict.fromkeys(scan_id.strip() for scan_id in v if scan_id.strip()))
+        if not ids:
+            raise ValueError("Au moins un ID de scan est requis")
+        return ids
+
+
+class ProfilingSettings(BaseModel):
+    """Profilage CPU tiré au sort (PUT /debug/profiling)"""
+    sample_rate: float = Field(..., description="Part des requêtes profilées (0 = seulement l'en-tête X-Profile)", ge=0.0, le=1.0)
+
+
+class StatusBatchRequest(ExportRequest):
+    """Statuts de plusieurs scans en une requête (POST /scanstatus/batch)"""
+    ids: List[str] = Field(..., description="IDs des scans (doublons ignorés)", min_length=1, max_length=1000)
+    cached: bool = Field(
+        default=True,
+        description="Statuts déjà connus (scan terminé, ou lu depuis moins d'un intervalle de polling) servis depuis la mémoire"
+    )
+
+
 
 # Modules SpiderFoot populaires organisés par catégorie
 SPIDERFOOT_MODULES = {
@@ -256,4 +322,59 @@ TYPE_CATEGORIES = {
     ]
 }
 
-TYPESLIST = "type_ACCOUNT_EXTERNAL_OWNED,type_AFFILIATE_COMPANY_NAME,type_AFFILIATE_DOMAIN_NAME,type_AFFILIATE_DOMAIN_UNREGISTERED,type_AFFILIATE_DOMAIN_WHOIS,type_AFFILIATE_EMAILADDR,type_AFFILIATE_IPADDR,type_AFFILIATE_IPV6_ADDRESS,type_AFFILIATE_INTERNET_NAME,type_AFFILIATE_INTERNET_NAME_UNRESOLVED,type_AFFILIATE_INTERNET_NAME_HIJACKABLE,type_AFFILIATE_WEB_CONTENT,type_AFFILIATE_DESCRIPTION_ABSTRACT,type_AFFILIATE_DESCRIPTION_CATEGORY,type_APPSTORE_ENTRY,type_BGP_AS_MEMBER,type_BGP_AS_OWNER,type_BASE64_DATA,type_BITCOIN_ADDRESS,type_BITCOIN_BALANCE,type_BLACKLISTED_AFFILIATE_IPADDR,type_BLACKLISTED_AFFILIATE_INTERNET_NAME,type_BLACKLISTED_COHOST,type_BLACKLISTED_IPADDR,type_BLACKLISTED_NETBLOCK,type_BLACKLISTED_SUBNET,type_BLACKLISTED_INTERNET_NAME,type_CLOUD_STORAGE_BUCKET,type_CLOUD_STORAGE_BUCKET_OPEN,type_CO_HOSTED_SITE,type_CO_HOSTED_SITE_DOMAIN,type_CO_HOSTED_SITE_DOMAIN_WHOIS,type_COMPANY_NAME,type_PASSWORD_COMPROMISED,type_HASH_COMPROMISED,type_TARGET_WEB_COOKIE,type_COUNTRY_NAME,type_CREDIT_CARD_NUMBER,type_DNS_SPF,type_DNS_SRV,type_DNS_TEXT,type_DARKNET_MENTION_URL,type_DARKNET_MENTION_CONTENT,type_DATE_HUMAN_DOB,type_DEFACED_INTERNET_NAME,type_DEFACED_AFFILIATE_INTERNET_NAME,type_DEFACED_AFFILIATE_IPADDR,type_DEFACED_COHOST,type_DEFACED_IPADDR,type_EMAILADDR_DELIVERABLE,type_DESCRIPTION_ABSTRACT,type_DESCRIPTION_CATEGORY,type_DEVICE_TYPE,type_EMAILADDR_DISPOSABLE,type_DOMAIN_NAME,type_DOMAIN_NAME_PARENT,type_DOMAIN_REGISTRAR,type_DOMAIN_WHOIS,type_EMAILADDR,type_EMAILADDR_GENERIC,type_PROVIDER_MAIL,type_ERROR_MESSAGE,type_ETHEREUM_ADDRESS,type_ETHEREUM_BALANCE,type_PROVIDER_JAVASCRIPT,type_WEBSERVER_HTTPHEADERS,type_HTTP_CODE,type_ACCOUNT_EXTERNAL_OWNED_COMPROMISED,type_EMAILADDR_COMPROMISED,type_ACCOUNT_EXTERNAL_USER_SHARED_COMPROMISED,type_HASH,type_INTERESTING_FILE_HISTORIC,type_URL_PASSWORD_HISTORIC,type_URL_UPLOAD_HISTORIC,type_URL_FORM_HISTORIC,type_URL_STATIC_HISTORIC,type_URL_FLASH_HISTORIC,type_URL_JAVA_APPLET_HISTORIC,type_URL_JAVASCRIPT_HISTORIC,type_URL_WEB_FRAMEWORK_HISTORIC,type_PROVIDER_HOSTING,type_HUMAN_NAME,type_IBAN_NUMBER,type_IP_ADDRESS,type_INTERNAL_IP_ADDRESS,type_IPV6_ADDRESS,type_INTERESTING_FILE,type_ROOT,type_INTERNET_NAME,type_INTERNET_NAME_UNRESOLVED,type_JOB_TITLE,type_JUNK_FILE,type_LEAKSITE_CONTENT,type_LEAKSITE_URL,type_LEI,type_LINKED_URL_EXTERNAL,type_LINKED_URL_INTERNAL,type_MALICIOUS_ASN,type_MALICIOUS_AFFILIATE_INTERNET_NAME,type_MALICIOUS_AFFILIATE_IPADDR,type_MALICIOUS_BITCOIN_ADDRESS,type_MALICIOUS_COHOST,type_MALICIOUS_EMAILADDR,type_MALICIOUS_IPADDR,type_MALICIOUS_NETBLOCK,type_MALICIOUS_SUBNET,type_MALICIOUS_INTERNET_NAME,type_MALICIOUS_PHONE_NUMBER,type_PROVIDER_DNS,type_NETBLOCKV6_MEMBER,type_NETBLOCKV6_OWNER,type_NETBLOCK_MEMBER,type_NETBLOCK_OWNER,type_NETBLOCK_WHOIS,type_WEBSERVER_STRANGEHEADER,type_TCP_PORT_OPEN,type_TCP_PORT_OPEN_BANNER,type_UDP_PORT_OPEN,type_UDP_PORT_OPEN_INFO,type_OPERATING_SYSTEM,type_PGP_KEY,type_PHONE_NUMBER,type_PHONE_NUMBER_COMPROMISED,type_PHONE_NUMBER_TYPE,type_PHYSICAL_ADDRESS,type_PHYSICAL_COORDINATES,type_GEOINFO,type_PROXY_HOST,type_PUBLIC_CODE_REPO,type_RAW_DNS_RECORDS,type_RAW_RIR_DATA,type_RAW_FILE_META_DATA,type_SSL_CERTIFICATE_ISSUER,type_SSL_CERTIFICATE_ISSUED,type_SSL_CERTIFICATE_RAW,type_SSL_CERTIFICATE_EXPIRED,type_SSL_CERTIFICATE_EXPIRING,type_SSL_CERTIFICATE_MISMATCH,type_SEARCH_ENGINE_WEB_CONTENT,type_SIMILAR_ACCOUNT_EXTERNAL,type_SIMILARDOMAIN,type_SIMILARDOMAIN_WHOIS,type_SOCIAL_MEDIA,type_SOFTWARE_USED,type_TOR_EXIT_NODE,type_PROVIDER_TELCO,type_URL_PASSWORD,type_URL_UPLOAD,type_URL_ADBLOCKED_EXTERNAL,type_URL_ADBLOCKED_INTERNAL,type_URL_FORM,type_URL_STATIC,type_URL_FLASH,type_URL_JAVA_APPLET,type_URL_JAVASCRIPT,type_URL_WEB_FRAMEWORK,type_EMAILADDR_UNDELIVERABLE,type_USERNAME,type_VPN_HOST,type_VULNERABILITY_CVE_CRITICAL,type_VULNERABILITY_CVE_HIGH,type_VULNERABILITY_CVE_LOW,type_VULNERABILITY_CVE_MEDIUM,type_VULNERABILITY_GENERAL,type_VULNERABILITY_DISCLOSURE,type_WEB_ANALYTICS_ID,type_TARGET_WEB_CONTENT,type_TARGET_WEB_CONTENT_TYPE,type_WEBSERVER_BANNER,type_WEBSERVER_TECHNOLOGY,type_WIFI_ACCESS_POINT,type_WIKIPEDIA_PAGE_EDIT,"
\ No newline at end of file
+TYPESLIST = "type_ACCOUNT_EXTERNAL_OWNED,type_AFFILIATE_COMPANY_NAME,type_AFFILIATE_DOMAIN_NAME,type_AFFILIATE_DOMAIN_UNREGISTERED,type_AFFILIATE_DOMAIN_WHOIS,type_AFFILIATE_EMAILADDR,type_AFFILIATE_IPADDR,type_AFFILIATE_IPV6_ADDRESS,type_AFFILIATE_INTERNET_NAME,type_AFFILIATE_INTERNET_NAME_UNRESOLVED,type_AFFILIATE_INTERNET_NAME_HIJACKABLE,type_AFFILIATE_WEB_CONTENT,type_AFFILIATE_DESCRIPTION_ABSTRACT,type_AFFILIATE_DESCRIPTION_CATEGORY,type_APPSTORE_ENTRY,type_BGP_AS_MEMBER,type_BGP_AS_OWNER,type_BASE64_DATA,type_BITCOIN_ADDRESS,type_BITCOIN_BALANCE,type_BLACKLISTED_AFFILIATE_IPADDR,type_BLACKLISTED_AFFILIATE_INTERNET_NAME,type_BLACKLISTED_COHOST,type_BLACKLISTED_IPADDR,type_BLACKLISTED_NETBLOCK,type_BLACKLISTED_SUBNET,type_BLACKLISTED_INTERNET_NAME,type_CLOUD_STORAGE_BUCKET,type_CLOUD_STORAGE_BUCKET_OPEN,type_CO_HOSTED_SITE,type_CO_HOSTED_SITE_DOMAIN,type_CO_HOSTED_SITE_DOMAIN_WHOIS,type_COMPANY_NAME,type_PASSWORD_COMPROMISED,type_HASH_COMPROMISED,type_TARGET_WEB_COOKIE,type_COUNTRY_NAME,type_CREDIT_CARD_NUMBER,type_DNS_SPF,type_DNS_SRV,type_DNS_TEXT,type_DARKNET_MENTION_URL,type_DARKNET_MENTION_CONTENT,type_DATE_HUMAN_DOB,type_DEFACED_INTERNET_NAME,type_DEFACED_AFFILIATE_INTERNET_NAME,type_DEFACED_AFFILIATE_IPADDR,type_DEFACED_COHOST,type_DEFACED_IPADDR,type_EMAILADDR_DELIVERABLE,type_DESCRIPTION_ABSTRACT,type_DESCRIPTION_CATEGORY,type_DEVICE_TYPE,type_EMAILADDR_DISPOSABLE,type_DOMAIN_NAME,type_DOMAIN_NAME_PARENT,type_DOMAIN_REGISTRAR,type_DOMAIN_WHOIS,type_EMAILADDR,type_EMAILADDR_GENERIC,type_PROVIDER_MAIL,type_ERROR_MESSAGE,type_ETHEREUM_ADDRESS,type_ETHEREUM_BALANCE,type_PROVIDER_JAVASCRIPT,type_WEBSERVER_HTTPHEADERS,type_HTTP_CODE,type_ACCOUNT_EXTERNAL_OWNED_COMPROMISED,type_EMAILADDR_COMPROMISED,type_ACCOUNT_EXTERNAL_USER_SHARED_COMPROMISED,type_HASH,type_INTERESTING_FILE_HISTORIC,type_URL_PASSWORD_HISTORIC,type_URL_UPLOAD_HISTORIC,type_URL_FORM_HISTORIC,type_URL_STATIC_HISTORIC,type_URL_FLASH_HISTORIC,type_URL_JAVA_APPLET_HISTORIC,type_URL_JAVASCRIPT_HISTORIC,type_URL_WEB_FRAMEWORK_HISTORIC,type_PROVIDER_HOSTING,type_HUMAN_NAME,type_IBAN_NUMBER,type_IP_ADDRESS,type_INTERNAL_IP_ADDRESS,type_IPV6_ADDRESS,type_INTERESTING_FILE,type_ROOT,type_INTERNET_NAME,type_INTERNET_NAME_UNRESOLVED,type_JOB_TITLE,type_JUNK_FILE,type_LEAKSITE_CONTENT,type_LEAKSITE_URL,type_LEI,type_LINKED_URL_EXTERNAL,type_LINKED_URL_INTERNAL,type_MALICIOUS_ASN,type_MALICIOUS_AFFILIATE_INTERNET_NAME,type_MALICIOUS_AFFILIATE_IPADDR,type_MALICIOUS_BITCOIN_ADDRESS,type_MALICIOUS_COHOST,type_MALICIOUS_EMAILADDR,type_MALICIOUS_IPADDR,type_MALICIOUS_NETBLOCK,type_MALICIOUS_SUBNET,type_MALICIOUS_INTERNET_NAME,type_MALICIOUS_PHONE_NUMBER,type_PROVIDER_DNS,type_NETBLOCKV6_MEMBER,type_NETBLOCKV6_OWNER,type_NETBLOCK_MEMBER,type_NETBLOCK_OWNER,type_NETBLOCK_WHOIS,type_WEBSERVER_STRANGEHEADER,type_TCP_PORT_OPEN,type_TCP_PORT_OPEN_BANNER,type_UDP_PORT_OPEN,type_UDP_PORT_OPEN_INFO,type_OPERATING_SYSTEM,type_PGP_KEY,type_PHONE_NUMBER,type_PHONE_NUMBER_COMPROMISED,type_PHONE_NUMBER_TYPE,type_PHYSICAL_ADDRESS,type_PHYSICAL_COORDINATES,type_GEOINFO,type_PROXY_HOST,type_PUBLIC_CODE_REPO,type_RAW_DNS_RECORDS,type_RAW_RIR_DATA,type_RAW_FILE_META_DATA,type_SSL_CERTIFICATE_ISSUER,type_SSL_CERTIFICATE_ISSUED,type_SSL_CERTIFICATE_RAW,type_SSL_CERTIFICATE_EXPIRED,type_SSL_CERTIFICATE_EXPIRING,type_SSL_CERTIFICATE_MISMATCH,type_SEARCH_ENGINE_WEB_CONTENT,type_SIMILAR_ACCOUNT_EXTERNAL,type_SIMILARDOMAIN,type_SIMILARDOMAIN_WHOIS,type_SOCIAL_MEDIA,type_SOFTWARE_USED,type_TOR_EXIT_NODE,type_PROVIDER_TELCO,type_URL_PASSWORD,type_URL_UPLOAD,type_URL_ADBLOCKED_EXTERNAL,type_URL_ADBLOCKED_INTERNAL,type_URL_FORM,type_URL_STATIC,type_URL_FLASH,type_URL_JAVA_APPLET,type_URL_JAVASCRIPT,type_URL_WEB_FRAMEWORK,type_EMAILADDR_UNDELIVERABLE,type_USERNAME,type_VPN_HOST,type_VULNERABILITY_CVE_CRITICAL,type_VULNERABILITY_CVE_HIGH,type_VULNERABILITY_CVE_LOW,type_VULNERABILITY_CVE_MEDIUM,type_VULNERABILITY_GENERAL,type_VULNERABILITY_DISCLOSURE,type_WEB_ANALYTICS_ID,type_TARGET_WEB_CONTENT,type_TARGET_WEB_CONTENT_TYPE,type_WEBSERVER_BANNER,type_WEBSERVER_TECHNOLOGY,type_WIFI_ACCESS_POINT,type_WIKIPEDIA_PAGE_EDIT,"
+
+
+# Catégorie de TYPE_CATEGORIES utilisée pour les types de cible qui n'en ont pas
+PLAN_TYPE_CATEGORY = {
+    "hostname": "subdomain",
+}
+
+
+class ScanPlan:
+    """Modules et types envoyés à /startscan pour un scan (SpiderFoot ignore typelist si modulelist est fourni)."""
+
+    __slots__ = ("mode", "target_type", "modules", "types", "modulelist", "typelist")
+
+    def __init__(self, mode: str, target_type: str, modules: List[str], types: List[str]):
+        self.mode = mode
+        self.target_type = target_type
+        self.modules = tuple(modules)
+        self.types = tuple(types)
+        self.modulelist = ",".join(self.modules)
+        self.typelist = TYPESLIST if mode == PlanMode.FULL.value else ",".join(self.types)
+
+    def to_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "target_type": self.target_type,
+            "modules": list(self.modules),
+            "types": "all" if self.mode == PlanMode.FULL.value else list(self.types),
+        }
+
+
+def _build_plans() -> Dict[tuple, ScanPlan]:
+    plans = {}
+    for target_type in [*TARGET_PATTERNS, "unknown"]:
+        plans[(PlanMode.FULL, target_type)] = ScanPlan(PlanMode.FULL.value, target_type, [], [])
+        modules = TARGET_MODULES.get(target_type)
+        types = TYPE_CATEGORIES.get(PLAN_TYPE_CATEGORY.get(target_type, target_type), [])
+        # Type de cible sans modules connus : on retombe sur le plan complet
+        plans[(PlanMode.AUTO, target_type)] = (
+            ScanPlan(PlanMode.AUTO.value, target_type, modules, types) if modules
+            else plans[(PlanMode.FULL, target_type)]
+        )
+    return plans
+
+
+# Plans calculés une fois par (mode, type de cible) : planifier un scan n'est qu'une recherche
+SCAN_PLANS = _build_plans()
+
+
+def plan_scan(target: str, modules: List[str], mode: PlanMode = PlanMode.FULL) -> ScanPlan:
+    """Plan d'un scan : modules explicites s'il y en a, sinon plan précalculé du mode pour le type de cible."""
+    # Les noms et pseudos sont mis entre guillemets par validate_target
+    target_type = classify_target(target.strip('"'))
+    if modules:
+        return ScanPlan("manual", target_type, modules, [])
+    return SCAN_PLANS[(PlanMode(mode), target_type)]